@@ -1,10 +1,50 @@
 from django.contrib import admin
+from django.db import transaction
 
+from tms_web import stats
+from .models import Player, Team, MatchPlayer, Match, Coach, ApiToken
+
+
+class StatsAdmin(admin.ModelAdmin):
+    """
+    Rebuilds the stats of the remaining teams and players whose recorded scores are deleted along with the
+    deleted objects, as the stats are running totals which the cascade deletes do not update.
+    """
+
+    def get_stats_ids(self, queryset):
+        raise NotImplementedError
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            team_ids, player_ids = self.get_stats_ids(queryset)
+            super().delete_queryset(request, queryset)
+            stats.rebuild_stats(team_ids, player_ids)
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, type(obj).objects.filter(id=obj.id))
+
+
+class TeamAdmin(StatsAdmin):
+
+    def get_stats_ids(self, queryset):
+        return stats.get_team_stats_ids(queryset)
+
+
+class MatchAdmin(StatsAdmin):
+
+    def get_stats_ids(self, queryset):
+        return stats.get_match_stats_ids(queryset)
+
+
+class MatchPlayerAdmin(StatsAdmin):
+
+    def get_stats_ids(self, queryset):
+        return set(), set(queryset.values_list('player', flat=True))
 
-from .models import Player, Team, MatchPlayer, Match, Coach
 
 admin.site.register(Player)
 admin.site.register(Coach)
-admin.site.register(Team)
-admin.site.register(MatchPlayer)
-admin.site.register(Match)
+admin.site.register(Team, TeamAdmin)
+admin.site.register(MatchPlayer, MatchPlayerAdmin)
+admin.site.register(Match, MatchAdmin)
+admin.site.register(ApiToken)
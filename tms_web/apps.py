@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TmsWebConfig(AppConfig):
     name = 'tms_web'
+
+    def ready(self):
+        import tms_web.signals  # noqa: F401
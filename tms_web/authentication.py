@@ -0,0 +1,109 @@
+"""
+
+This module implements the authentication schemes of the REST APIs, besides the session authentication.
+
+The token authentication verifies an API token ('Authorization: Token <token>' header) with a SHA-256 digest
+and a single indexed query, as a token is a long random secret. The basic authentication verifies the password
+of every request with the password hasher (ex: PBKDF2 with many iterations), which dominates the cost of the
+cheap APIs. When the TMS_WEB_BASIC_AUTH_CACHE_TIMEOUT setting is set, the verified credentials are kept in
+memory for that many seconds, keyed by a digest salted with a secret of the process (the passwords are not
+kept), and a repeated request only checks that the user is still active and its password unchanged.
+
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework import authentication, exceptions
+
+from tms_web.models import ApiToken
+
+_CREDENTIALS_SALT = os.urandom(32)
+_MAX_CREDENTIALS = 1024
+
+_credentials_lock = threading.Lock()
+# The verified credentials, by salted digest: the user id, its password hash and the expiry time
+_credentials = OrderedDict()
+
+
+class TokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticates the requests with an API token of a user, ex: 'Authorization: Token <token>'.
+    """
+    keyword = 'Token'
+
+    def authenticate(self, request):
+        auth = authentication.get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            key = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        token = ApiToken.objects.select_related('user').filter(digest=ApiToken.get_digest(key)).first()
+        if token is None or not token.user.is_active:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return token.user, token
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+def _get_credentials_key(userid, password):
+    return hmac.new(_CREDENTIALS_SALT, '{}\0{}'.format(userid, password).encode(), hashlib.sha256).digest()
+
+
+def _get_cached_user(key):
+    with _credentials_lock:
+        entry = _credentials.get(key)
+    if entry is None:
+        return None
+    user_id, password, expires = entry
+    if expires > time.monotonic():
+        user = get_user_model().objects.filter(pk=user_id).first()
+        # The credentials of a deactivated user or of a changed password are verified again
+        if user is not None and user.is_active and user.password == password:
+            return user
+    with _credentials_lock:
+        _credentials.pop(key, None)
+    return None
+
+
+def _cache_user(key, user, timeout):
+    with _credentials_lock:
+        _credentials[key] = (user.pk, user.password, time.monotonic() + timeout)
+        _credentials.move_to_end(key)
+        while len(_credentials) > _MAX_CREDENTIALS:
+            _credentials.popitem(last=False)
+
+
+def clear_credentials():
+    with _credentials_lock:
+        _credentials.clear()
+
+
+class CachedBasicAuthentication(authentication.BasicAuthentication):
+    """
+    Authenticates the requests with the basic authentication, and keeps the verified credentials in memory for
+    TMS_WEB_BASIC_AUTH_CACHE_TIMEOUT seconds when the setting is set (see the module documentation).
+    """
+
+    def authenticate_credentials(self, userid, password, request=None):
+        timeout = getattr(settings, 'TMS_WEB_BASIC_AUTH_CACHE_TIMEOUT', 0)
+        if not timeout:
+            return super().authenticate_credentials(userid, password, request)
+        key = _get_credentials_key(userid, password)
+        user = _get_cached_user(key)
+        if user is not None:
+            return user, None
+        user, auth = super().authenticate_credentials(userid, password, request)
+        _cache_user(key, user, timeout)
+        return user, auth
@@ -0,0 +1,215 @@
+"""
+
+This module implements the conditional requests (ETag) of the APIs and the server side response cache of
+the read heavy APIs.
+
+Every resource and collection is a namespace with a version, a random token. The write paths invalidate a
+namespace by replacing its version, and the responses are identified by the request and the current versions
+of the namespaces they are built from. Thus, a request can be answered with '304 Not Modified' or from the
+response cache without querying the resources.
+
+The versions are kept in the default cache, thus the writes of a process only invalidate the responses of
+the other processes sharing that cache (ex: TMS_WEB_CACHE_BACKEND=file), and both the conditional requests
+(TMS_WEB_CONDITIONAL_REQUESTS setting) and the response cache (TMS_WEB_RESPONSE_CACHE setting) are disabled
+by default.
+
+"""
+
+import functools
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+COACHES = 'coaches'
+PLAYERS = 'players'
+PLAYER_NAMES = 'player-names'
+TEAMS = 'teams'
+TEAM_NAMES = 'team-names'
+MATCHES = 'matches'
+_COACH = 'coach:{}'
+_PLAYER = 'player:{}'
+_TEAM = 'team:{}'
+_TEAM_PLAYERS = 'team-players:{}'
+_MATCH = 'match:{}'
+_MATCH_PLAYERS = 'match-players:{}'
+
+_VERSION_KEY = 'tms_web:version-token:{}'
+_RESPONSE_KEY = 'tms_web:response:{}'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def coach(coach_id):
+    return _COACH.format(coach_id)
+
+
+def player(player_id):
+    return _PLAYER.format(player_id)
+
+
+def team(team_id):
+    return _TEAM.format(team_id)
+
+
+def team_players(team_id):
+    return _TEAM_PLAYERS.format(team_id)
+
+
+def match(match_id):
+    return _MATCH.format(match_id)
+
+
+def match_players(match_id):
+    return _MATCH_PLAYERS.format(match_id)
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+"""
+This method returns the current versions (random tokens) of the given namespaces.
+"""
+
+
+def get_versions(namespaces):
+    keys = [_VERSION_KEY.format(namespace) for namespace in namespaces]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+"""
+This method invalidates the cached responses of the given namespaces. The namespaces are invalidated
+again when the current transaction commits, so that responses cached from the data before the commit
+are not served afterwards.
+"""
+
+
+def invalidate(*namespaces):
+    def bump_versions():
+        cache.set_many({_VERSION_KEY.format(namespace): _new_version() for namespace in namespaces}, None)
+    bump_versions()
+    transaction.on_commit(bump_versions)
+
+
+"""
+This method returns the hit and miss counters of the response cache of this process.
+"""
+
+
+def get_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(counter):
+    with _stats_lock:
+        _stats[counter] += 1
+
+
+def _get_etag(request, versions):
+    parts = [request.get_full_path(), request.accepted_media_type or ''] + versions
+    return '"{}"'.format(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+
+def _parse_etags(header):
+    return {etag.strip().replace('W/', '', 1) for etag in header.split(',')}
+
+
+def _is_not_modified(request, etag):
+    # If-Modified-Since is not honoured, a date in seconds can't tell the versions of the same second apart
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is None:
+        return False
+    etags = _parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+
+def _is_conditional():
+    return getattr(settings, 'TMS_WEB_CONDITIONAL_REQUESTS', False)
+
+
+"""
+Serves the ETag header of the responses of a view method, and answers the matching If-None-Match requests
+with '304 Not Modified' without executing the view method, when TMS_WEB_CONDITIONAL_REQUESTS setting is
+enabled. The namespaces of a response are formatted with the keyword arguments of the view (ex: 'player:{pk}').
+When cache_response is True and TMS_WEB_RESPONSE_CACHE setting is enabled, the successful responses are
+cached as well.
+"""
+
+
+def versioned_response(*namespaces, cache_response=False):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            conditional = _is_conditional()
+            cached = cache_response and getattr(settings, 'TMS_WEB_RESPONSE_CACHE', False)
+            if not conditional and not cached:
+                return method(view, request, *args, **kwargs)
+            etag = _get_etag(request, get_versions([namespace.format(**kwargs) for namespace in namespaces]))
+            if conditional and _is_not_modified(request, etag):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                response['ETag'] = etag
+                return response
+            if cached:
+                response = _get_cached_response(method, view, request, etag, *args, **kwargs)
+            else:
+                response = method(view, request, *args, **kwargs)
+            if conditional and response.status_code == status.HTTP_200_OK:
+                response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
+
+
+def _get_cached_response(method, view, request, etag, *args, **kwargs):
+    key = _RESPONSE_KEY.format(etag.strip('"'))
+    data = cache.get(key)
+    if data is not None:
+        _count('hits')
+        return Response(data)
+    _count('misses')
+    response = method(view, request, *args, **kwargs)
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, getattr(settings, 'TMS_WEB_RESPONSE_CACHE_TIMEOUT', 300))
+    return response
+
+
+"""
+Honours the If-Match header of the update (PUT and PATCH) requests of a resource, which must match the
+current ETag of the resource (see versioned_response), otherwise the request is rejected with
+'412 Precondition Failed'. The ETag of the updated resource is served with the response. The If-Match
+header is ignored, as no ETag is served, when TMS_WEB_CONDITIONAL_REQUESTS setting is disabled.
+"""
+
+
+def conditional_update(*namespaces):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if not _is_conditional():
+                return method(view, request, *args, **kwargs)
+            resource_namespaces = [namespace.format(**kwargs) for namespace in namespaces]
+            if_match = request.META.get('HTTP_IF_MATCH')
+            if if_match is not None:
+                etags = _parse_etags(if_match)
+                if '*' not in etags and _get_etag(request, get_versions(resource_namespaces)) not in etags:
+                    return Response({'detail': 'The resource has been modified.'},
+                                    status=status.HTTP_412_PRECONDITION_FAILED)
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                response['ETag'] = _get_etag(request, get_versions(resource_namespaces))
+            return response
+        return wrapper
+    return decorator
@@ -14,4 +14,13 @@ MATCH_TEAMS_URL_NAME = 'match-teams'
 MATCH_PLAYERS_URL_NAME = 'match-players'
 TOP_PLAYERS_URL_SUFFIX = 'top-players'
 TEAM_PLAYERS_URL_SUFFIX = 'players'
-
+BULK_URL_SUFFIX = 'bulk'
+TOP_PLAYER_PERCENTILE = 90
+TOP_PLAYERS_URL_NAME = 'top-players'
+EXPORT_URL_NAME = 'export'
+IMPORT_URL_NAME = 'import'
+LEADERBOARD_URL_NAME = 'leaderboard'
+PLAYER_RANK_URL_NAME = 'player-rank'
+STATS_FLUSH_URL_NAME = 'stats-flush'
+TOKENS_URL_NAME = 'tokens'
+TOKEN_URL_NAME = 'token'
@@ -0,0 +1,74 @@
+"""
+
+This module implements the exports of the players, matches and match players as CSV or NDJSON (a JSON
+object per line).
+
+The rows of an export are read with values_list() over a chunked iteration of the database cursor and
+encoded a batch of lines at a time, without model instances or serializers, thus the memory of an export
+stays flat whatever the size of the table. The exports are streamed by the export API and the export command.
+
+"""
+
+import csv
+import io
+import json
+from itertools import islice
+
+from tms_web.models import Player, Match, MatchPlayer
+
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+# The exported tables, the names of their columns and their rows (foreign keys are exported as ids)
+EXPORTS = {
+    'players': (['id', 'name', 'height', 'team', 'average_score', 'total_score', 'matches'],
+                Player.objects.order_by('id')),
+    'matches': (['id', 'scheduled_date', 'stadium', 'round', 'team1', 'team2', 'team1_score', 'team2_score'],
+                Match.objects.order_by('id')),
+    'match-players': (['id', 'match', 'player', 'score'], MatchPlayer.objects.order_by('id')),
+}
+
+
+def csv_encoder(fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def encode(rows):
+        writer.writerows(rows)
+        lines = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return lines
+
+    return encode([fields]), encode
+
+
+def ndjson_encoder(fields):
+    def encode(rows):
+        return ''.join(json.dumps(dict(zip(fields, row)), default=str, separators=(',', ':')) + '\n'
+                       for row in rows)
+
+    return '', encode
+
+
+ENCODERS = {
+    'csv': csv_encoder,
+    'ndjson': ndjson_encoder,
+}
+
+"""
+This method returns a generator of the lines of a given export (see EXPORTS) in a given format (see
+CONTENT_TYPES), a batch of lines (a string) for each chunk of rows.
+"""
+
+
+def stream(name, export_format):
+    fields, queryset = EXPORTS[name]
+    header, encode = ENCODERS[export_format](fields)
+    if header:
+        yield header
+    rows = queryset.values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+    for chunk in iter(lambda: list(islice(rows, CHUNK_SIZE)), []):
+        yield encode(chunk)
@@ -0,0 +1,116 @@
+"""
+
+This module implements the ASGI request handler of the tournament management system.
+
+Django 3.0 runs the synchronous views of an ASGI application through sync_to_async, which (depending on
+the asgiref version) serializes them on a single thread or runs them on the unbounded default executor
+of the event loop. The handler serves the read only APIs (team list and detail, players, top-players and
+match list) on a bounded pool of threads instead, so that concurrent reads are served in parallel while
+the number of threads, and thus database connections, stays fixed. The other requests are handled as
+by the default Django handler.
+
+Django 3.0 also iterates the content of a streaming response in the event loop, where the database can not
+be queried. The handler iterates it on a thread instead (ex: the streamed exports).
+
+"""
+
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+
+import tms_web.constants as constants
+
+READ_METHODS = ('GET', 'HEAD')
+READ_URL_NAMES = {
+    constants.TEAMS_URL_NAME + '-list',
+    constants.TEAMS_URL_NAME + '-detail',
+    constants.TEAMS_URL_NAME + '-' + constants.TOP_PLAYERS_URL_SUFFIX,
+    constants.PLAYERS_URL_NAME,
+    constants.PLAYER_URL_NAME,
+    constants.TOP_PLAYERS_URL_NAME,
+    constants.MATCHES_URL_NAME + '-list',
+}
+
+
+class ConcurrentReadASGIHandler(ASGIHandler):
+    """
+    ASGI handler which serves the read only APIs on a bounded thread pool.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.read_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'TMS_WEB_ASGI_READ_THREADS', 8),
+                                                thread_name_prefix='tms-web-read')
+
+    """
+    This method returns the response of a request. It is a coroutine function, thus ASGIHandler awaits it
+    instead of running it through sync_to_async.
+    """
+
+    async def get_response(self, request):
+        if not self.is_concurrent_read(request):
+            return await sync_to_async(super().get_response)(request)
+        # Run the request in the context of the current task (ex: the database routing of the request)
+        context = contextvars.copy_context()
+        return await asyncio.get_event_loop().run_in_executor(self.read_executor, context.run,
+                                                              self.get_read_response, request)
+
+    def get_read_response(self, request):
+        # The request_started and request_finished signals are not sent on the pool threads, thus the
+        # database connections of the thread are maintained here (see CONN_MAX_AGE).
+        close_old_connections()
+        try:
+            return super().get_response(request)
+        finally:
+            close_old_connections()
+
+    """
+    This method sends a response. The parts of a streaming response are produced on a thread, a part at a
+    time, since producing them may query the database (ex: the streamed exports).
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        # The headers and cookies, as sent by the default implementation
+        headers = [(str(header).encode('ascii'), str(value).encode('latin1')) for header, value in response.items()]
+        headers += [(b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+                    for cookie in response.cookies.values()]
+        await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+        parts = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        try:
+            part = await next_part(parts, None)
+            while part is not None:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                part = await next_part(parts, None)
+            await send({'type': 'http.response.body'})
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+    def is_concurrent_read(self, request):
+        if request.method not in READ_METHODS:
+            return False
+        try:
+            return resolve(request.path_info).url_name in READ_URL_NAMES
+        except Resolver404:
+            return False
+
+
+"""
+This method returns the ASGI application of the tournament management system, the equivalent of
+django.core.asgi.get_asgi_application.
+"""
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return ConcurrentReadASGIHandler()
@@ -0,0 +1,268 @@
+"""
+
+This module implements the imports of a league (teams, coaches, players, matches and the scores of their
+players) from CSV or NDJSON (a JSON object per line) rows.
+
+The rows refer to the teams, players and matches by name (a match by its scheduled date and team names),
+which are resolved to ids with lookup tables loaded once per import and extended with the imported objects,
+instead of queries for each row. The valid rows are inserted in batches with bulk inserts, their primary
+keys being assigned up front, while the invalid rows are rejected and reported by their line number. The
+stats of the teams and players are rebuilt once at the end of an import of results, with grouped aggregate
+updates (see tms_web.stats).
+
+"""
+
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.management.color import no_style
+from django.db import connection, models
+from django.db.models import Max
+
+from tms_web import caching, leaderboard, stats
+from tms_web.models import Player, Coach, Team, Match, MatchPlayer, MatchTeam
+
+# The kinds of rows of a league, in the order of their dependencies
+KINDS = ['teams', 'coaches', 'players', 'matches', 'match-players']
+FORMATS = ['csv', 'ndjson']
+BATCH_SIZE = 1000
+MODELS = [Team, Coach, Player, Match, MatchTeam, MatchPlayer]
+# Marks an ambiguous name of a lookup table
+AMBIGUOUS = object()
+DATE_FIELD = models.DateField()
+
+"""
+This method returns a generator of the line numbers and rows of CSV or NDJSON lines. A row is a dict, or
+None when an NDJSON line is not a JSON object.
+"""
+
+
+def read_rows(lines, import_format):
+    if import_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def add_lookup(lookup, key, value):
+    lookup[key] = AMBIGUOUS if key in lookup else value
+
+
+class LeagueImport:
+    """
+    Imports the rows of a league, a kind of rows at a time, within the transaction of the caller.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE):
+        self.batch_size = batch_size
+        self.created = {kind: 0 for kind in KINDS}
+        self.rejected = {kind: [] for kind in KINDS}
+        self.pending = {}
+        self.next_ids = {}
+        self.lookups = {}
+        # The players recorded for each referenced match
+        self.recorded = {}
+        self.namespaces = set()
+        # The imported players, ranked in the leaderboard, and their teams, whose top-player cut-offs change
+        self.player_ids = []
+        self.player_teams = set()
+        self.results = False
+
+    """
+    This method locks a table for the writes until the transaction of the import commits, as its ids are allocated
+    from its greatest id, thus a concurrent insert would take an allocated id. SQLite locks the whole database
+    on the first write statement of a transaction.
+    """
+
+    def lock_table(self, model):
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('UPDATE {} SET id = id WHERE 0 = 1'.format(table))
+            elif connection.vendor == 'postgresql':
+                cursor.execute('LOCK TABLE {} IN EXCLUSIVE MODE'.format(table))
+
+    def allocate_id(self, model):
+        next_id = self.next_ids.get(model)
+        if next_id is None:
+            self.lock_table(model)
+            next_id = (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+        self.next_ids[model] = next_id + 1
+        return next_id
+
+    """
+    This method returns a lookup table of the import, loading it on first use.
+    """
+
+    def get_lookup(self, name):
+        if name not in self.lookups:
+            lookup = {}
+            if name == 'teams':
+                for team_id, team_name in Team.objects.values_list('id', 'name'):
+                    add_lookup(lookup, team_name, team_id)
+            elif name == 'players':
+                for player_id, team_id, player_name in Player.objects.values_list('id', 'team', 'name'):
+                    add_lookup(lookup, (team_id, player_name), player_id)
+            elif name == 'matches':
+                for match_id, *key in Match.objects.values_list('id', 'scheduled_date', 'team1', 'team2'):
+                    add_lookup(lookup, tuple(key), match_id)
+            elif name == 'coached-teams':
+                lookup = set(Coach.objects.values_list('team', flat=True))
+            self.lookups[name] = lookup
+        return self.lookups[name]
+
+    def resolve(self, lookup, key, field, description):
+        value = self.get_lookup(lookup).get(key)
+        if value is None:
+            raise ValidationError({field: ['Unknown {}.'.format(description)]})
+        if value is AMBIGUOUS:
+            raise ValidationError({field: ['Ambiguous {}.'.format(description)]})
+        return value
+
+    def get_team(self, row, field):
+        if not row.get(field):
+            raise ValidationError({field: ['This field is required.']})
+        return self.resolve('teams', row[field], field, 'team "{}"'.format(row[field]))
+
+    """
+    This method builds a model object of the given fields of a row (the model default of a missing field
+    applies), with the given resolved foreign keys, and validates its fields.
+    """
+
+    def build(self, model, row, fields, **foreign_keys):
+        values = {field: row[field] for field in fields if row.get(field) not in (None, '')}
+        obj = model(**values, **foreign_keys)
+        obj.clean_fields(exclude=[field.name for field in model._meta.fields if field.is_relation])
+        obj.id = self.allocate_id(model)
+        return obj
+
+    def parse_teams(self, row):
+        team = Team(name=row.get('name') or '')
+        team.clean_fields()
+        if team.name in self.get_lookup('teams'):
+            raise ValidationError({'name': ['A team with this name already exists.']})
+        team.id = self.allocate_id(Team)
+        self.get_lookup('teams')[team.name] = team.id
+        self.namespaces.update([caching.TEAMS, caching.TEAM_NAMES])
+        return [team]
+
+    def parse_coaches(self, row):
+        team_id = self.get_team(row, 'team')
+        if team_id in self.get_lookup('coached-teams'):
+            raise ValidationError({'team': ['The team already has a coach.']})
+        coach = self.build(Coach, row, ['name'], team_id=team_id)
+        self.get_lookup('coached-teams').add(team_id)
+        self.namespaces.add(caching.COACHES)
+        return [coach]
+
+    def parse_players(self, row):
+        team_id = self.get_team(row, 'team')
+        player = self.build(Player, row, ['name', 'height'], team_id=team_id)
+        if 'players' in self.lookups:
+            add_lookup(self.lookups['players'], (team_id, player.name), player.id)
+        self.namespaces.update([caching.PLAYERS, caching.team_players(team_id)])
+        self.player_ids.append(player.id)
+        self.player_teams.add(team_id)
+        return [player]
+
+    def parse_matches(self, row):
+        team1, team2 = self.get_team(row, 'team1'), self.get_team(row, 'team2')
+        if team1 == team2:
+            raise ValidationError({'team2': ['The teams of a match must differ.']})
+        match = self.build(Match, row, ['scheduled_date', 'stadium', 'round', 'team1_score', 'team2_score'],
+                           team1_id=team1, team2_id=team2)
+        add_lookup(self.get_lookup('matches'), (match.scheduled_date, team1, team2), match.id)
+        # A new match has no recorded players
+        self.recorded[match.id] = set()
+        self.namespaces.update([caching.MATCHES, caching.TEAMS, caching.team(team1), caching.team(team2)])
+        self.results = True
+        return [match] + [MatchTeam(id=self.allocate_id(MatchTeam), match=match, team_id=team_id, score=score)
+                          for team_id, score in ((team1, match.team1_score), (team2, match.team2_score))]
+
+    def parse_match_players(self, row):
+        try:
+            scheduled_date = DATE_FIELD.to_python(row.get('scheduled_date'))
+        except ValidationError as e:
+            raise ValidationError({'scheduled_date': e.messages})
+        team1, team2, team_id = self.get_team(row, 'team1'), self.get_team(row, 'team2'), self.get_team(row, 'team')
+        match_id = self.resolve('matches', (scheduled_date, team1, team2), 'scheduled_date',
+                                'match of {} between "{}" and "{}"'.format(scheduled_date, row['team1'], row['team2']))
+        if team_id not in (team1, team2):
+            raise ValidationError({'team': ['The team did not play the match.']})
+        player_id = self.resolve('players', (team_id, row.get('player')), 'player',
+                                 'player "{}" of the team'.format(row.get('player')))
+        if match_id not in self.recorded:
+            self.recorded[match_id] = set(MatchPlayer.objects.filter(match=match_id).values_list('player', flat=True))
+        if player_id in self.recorded[match_id]:
+            raise ValidationError({'player': ['The player is already recorded for the match.']})
+        match_player = self.build(MatchPlayer, row, ['score'], match_id=match_id, player_id=player_id)
+        self.recorded[match_id].add(player_id)
+        self.namespaces.update([caching.PLAYERS, caching.player(player_id), caching.team_players(team_id),
+                                caching.match_players(match_id)])
+        self.results = True
+        return [match_player]
+
+    def reject(self, kind, line, errors):
+        self.rejected[kind].append({'line': line, 'errors': errors})
+
+    """
+    This method imports rows of a given kind, given by their line numbers.
+    """
+
+    def import_rows(self, kind, rows):
+        parse = getattr(self, 'parse_' + kind.replace('-', '_'))
+        for line, row in rows:
+            if row is None:
+                self.reject(kind, line, {'non_field_errors': ['The line is not a JSON object.']})
+                continue
+            try:
+                objects = parse(row)
+            except ValidationError as e:
+                errors = e.message_dict if hasattr(e, 'error_dict') else {'non_field_errors': e.messages}
+                self.reject(kind, line, errors)
+                continue
+            for obj in objects:
+                self.pending.setdefault(type(obj), []).append(obj)
+            self.created[kind] += 1
+            if sum(len(objects) for objects in self.pending.values()) >= self.batch_size:
+                self.flush()
+        self.flush()
+
+    def flush(self):
+        # The parents are inserted before their children
+        for model in MODELS:
+            objects = self.pending.pop(model, [])
+            if objects:
+                model.objects.bulk_create(objects)
+
+    """
+    This method completes the import: it resets the primary key sequences, rebuilds the stats of all the teams
+    and players when results were imported, and invalidates the affected cached responses and top-player
+    cut-offs, and ranks the imported players in the leaderboard (the players are bulk inserted, without their
+    post_save signal).
+    """
+
+    def finish(self):
+        self.flush()
+        with connection.cursor() as cursor:
+            for statement in connection.ops.sequence_reset_sql(no_style(), MODELS):
+                cursor.execute(statement)
+        if self.results:
+            stats.rebuild_team_stats()
+            stats.rebuild_player_stats()
+        stats.invalidate_top_player_cutoffs(self.player_teams)
+        leaderboard.refresh(self.player_ids)
+        caching.invalidate(*self.namespaces)
+
+    def has_rejected(self):
+        return any(self.rejected.values())
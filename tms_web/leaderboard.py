@@ -0,0 +1,221 @@
+"""
+
+This module maintains the in-process leaderboard of the players, league-wide and per team, ranked by average
+score (the players with the same average score share their rank, and are ordered by id).
+
+The leaderboard is a sorted list of integer keys encoding the descending average score and the id of each
+player, with a sorted list per team, thus the rank of a player is a binary search and a page of the
+leaderboard is a slice, without sorting the players on each request. It is loaded from the database on first
+use, then the changed players are moved in place by the next read after their writes commit (see refresh).
+
+The processes serving the APIs share a leaderboard version through the cache: a process applying a change
+writes a new random version token, and a process finding a version other than the one it loaded or wrote
+loads its leaderboard again. The tokens are only compared for equality, as the increments of the file based
+cache are not atomic: two processes incrementing the same version would both take the result as their own.
+Thus the cache must be shared by all of the processes writing the players (the servers, and the commands such
+as import_league, generate_data or snapshot restore), ex: TMS_WEB_CACHE_BACKEND=file, as the version of the
+default local memory cache is only seen by its own process. The bulk writes of players, which bypass the
+post_save signal, refresh or invalidate the leaderboard explicitly.
+
+"""
+
+import random
+import threading
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.db import transaction
+
+from tms_web.models import Player
+
+_VERSION_KEY = 'tms_web:leaderboard-version'
+_ID_BITS = 32
+_ID_MASK = (1 << _ID_BITS) - 1
+# Beyond this number of changed players, the leaderboard is loaded again instead
+_REFRESH_LIMIT = 1000
+
+
+def _score_key(cents):
+    return -cents << _ID_BITS
+
+
+def _get_key(player_id, average_score):
+    return _score_key(int(round(average_score * 100))) | player_id
+
+
+def _get_cents(key):
+    return -(key >> _ID_BITS)
+
+
+def _get_version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        # A first version, which differs from the version of any loaded leaderboard
+        cache.add(_VERSION_KEY, random.getrandbits(64), None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def _new_version():
+    version = random.getrandbits(64)
+    cache.set(_VERSION_KEY, version, None)
+    return version
+
+
+class Leaderboard:
+    """
+    Ranks the players by average score, league-wide and per team.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.keys = []
+        self.team_keys = {}
+        # The key and team of each ranked player
+        self.players = {}
+        # The changed players, moved by the next read
+        self.pending = set()
+
+    def load(self):
+        rows = Player.objects.values_list('id', 'team', 'average_score')
+        self.players = {player_id: (_get_key(player_id, score), team_id) for player_id, team_id, score in rows}
+        self.keys = sorted(key for key, _ in self.players.values())
+        self.team_keys = {}
+        for key in self.keys:
+            self.team_keys.setdefault(self.players[key & _ID_MASK][1], []).append(key)
+        self.pending = set()
+
+    """
+    This method loads the leaderboard again when the shared version is not the one it loaded or wrote, or else
+    moves the changed players to their current average score and team, and removes the deleted players.
+    """
+
+    def sync(self):
+        version = _get_version()
+        if version != self.version:
+            self.load()
+            self.version = version
+        elif self.pending:
+            rows = list(Player.objects.filter(id__in=self.pending).values_list('id', 'team', 'average_score'))
+            for player_id in self.pending:
+                if player_id in self.players:
+                    self.remove(player_id)
+            for player_id, team_id, average_score in rows:
+                self.add(player_id, team_id, average_score)
+            self.pending = set()
+
+    def remove(self, player_id):
+        key, team_id = self.players.pop(player_id)
+        for keys in (self.keys, self.team_keys[team_id]):
+            del keys[bisect_left(keys, key)]
+        if not self.team_keys[team_id]:
+            del self.team_keys[team_id]
+
+    def add(self, player_id, team_id, average_score):
+        key = _get_key(player_id, average_score)
+        self.players[player_id] = (key, team_id)
+        insort(self.keys, key)
+        insort(self.team_keys.setdefault(team_id, []), key)
+
+    """
+    This method marks the given players as changed once their writes commit, without reading the database, and
+    writes a new version for the other processes. The players are moved by the next read, unless the version
+    was changed by another process since this one was synced, in which case the leaderboard is loaded again.
+    """
+
+    def refresh(self, player_ids):
+        with self.lock:
+            current = self.version is not None and cache.get(_VERSION_KEY) == self.version
+            version = _new_version()
+            if current:
+                self.pending.update(player_ids)
+                self.version = version
+            else:
+                self.version = None
+
+    """
+    This method returns the league and team ranks of a given player, with the numbers of ranked players, or
+    None when the player is not ranked.
+    """
+
+    def get_rank(self, player_id):
+        with self.lock:
+            self.sync()
+            if player_id not in self.players:
+                return None
+            key, team_id = self.players[player_id]
+            score_key = _score_key(_get_cents(key))
+            team_keys = self.team_keys[team_id]
+            return {
+                'player': player_id, 'team': team_id, 'average_score': '{:.2f}'.format(_get_cents(key) / 100),
+                'rank': bisect_left(self.keys, score_key) + 1, 'players': len(self.keys),
+                'team_rank': bisect_left(team_keys, score_key) + 1, 'team_players': len(team_keys),
+            }
+
+    def count(self, team_id=None):
+        with self.lock:
+            self.sync()
+            return len(self.keys if team_id is None else self.team_keys.get(team_id, []))
+
+    """
+    This method returns the (rank, player id) entries of a slice of the leaderboard (of a given team), by
+    position.
+    """
+
+    def get_entries(self, start, stop, team_id=None):
+        with self.lock:
+            self.sync()
+            keys = self.keys if team_id is None else self.team_keys.get(team_id, [])
+            entries = []
+            for key in keys[start:stop]:
+                cents = _get_cents(key)
+                if not entries or cents != _get_cents(entries[-1][1]):
+                    rank = bisect_left(keys, _score_key(cents)) + 1
+                entries.append((rank, key))
+            return [(rank, key & _ID_MASK) for rank, key in entries]
+
+
+class LeaderboardPage:
+    """
+    A sequence of the (rank, player id) entries of the leaderboard (of a given team), paginated by rank.
+    """
+
+    def __init__(self, team_id=None):
+        self.team_id = team_id
+
+    def __len__(self):
+        return _leaderboard.count(self.team_id)
+
+    def __getitem__(self, index):
+        return _leaderboard.get_entries(index.start or 0, index.stop, self.team_id)
+
+
+_leaderboard = Leaderboard()
+
+
+def get_rank(player_id):
+    return _leaderboard.get_rank(player_id)
+
+
+"""
+This method updates the leaderboard with the current average scores and teams of the given players (created,
+updated or deleted) when the current transaction commits.
+"""
+
+
+def refresh(player_ids):
+    player_ids = list(player_ids)
+    if len(player_ids) > _REFRESH_LIMIT:
+        return invalidate()
+    transaction.on_commit(lambda: _leaderboard.refresh(player_ids))
+
+
+"""
+This method reloads the leaderboards of all the processes when the current transaction commits, after the
+average scores of many players have changed (ex: a rebuild of the stats).
+"""
+
+
+def invalidate():
+    transaction.on_commit(_new_version)
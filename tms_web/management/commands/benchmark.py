@@ -0,0 +1,257 @@
+"""
+
+Management command implementation to benchmark the APIs of the tournament management system.
+
+For each data set size, a league is generated (see generate_data command) and every API is requested in
+process with the test client, the reads as well as the create, update and delete flows. The latency, the
+number of SQL queries and the SQL time of the requests are reported for each API as a JSON document, which
+can be saved and given as the baseline of a later run to compare the releases.
+
+The data sets are generated in a transaction which is rolled back at the end of each run, thus the data of
+the configured database is left unchanged (it is hidden from the benchmark within the transaction). As a
+consequence, the latency of the writes does not include the commit of their transaction.
+
+"""
+
+import json
+import logging
+import math
+import time
+
+import django
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tms_web.management.commands.generate_data import LEAGUE_ADMIN_USER
+from tms_web.management.commands.snapshot import MODELS
+from tms_web.models import Player, Coach, Team, Match, MatchPlayer, StatsMarker, ApiToken
+import tms_web.constants as constants
+
+logger = logging.getLogger('django.tms_web.BenchmarkLogger')
+FORMAT = 'tms-benchmark'
+VERSION = 1
+PERCENTILES = [50, 95, 99]
+
+
+def percentile(values, rank):
+    """
+    Returns the nearest rank percentile of sorted values.
+    """
+    return values[max(0, math.ceil(rank / 100 * len(values)) - 1)]
+
+
+class QueryTimer:
+    """
+    Counts and times the SQL queries executed on a database connection.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.elapsed += time.perf_counter() - started
+
+
+def endpoint(name, method, path, data=None, created=None):
+    return {'name': name, 'method': method, 'path': path, 'data': data, 'created': created}
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the latency and SQL queries of the APIs on generated data sets of several sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='16,128,1024',
+                            help='Comma separated numbers of teams of the generated data sets')
+        parser.add_argument('--players-per-team', type=int, default=14, help='Number of players of each team')
+        parser.add_argument('--seasons', type=int, default=2, help='Number of seasons of the generated data sets')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the generated data sets')
+        parser.add_argument('--iterations', type=int, default=50, help='Number of requests of each API')
+        parser.add_argument('--warmup', type=int, default=2,
+                            help='Number of requests of each read API before the measured requests')
+        parser.add_argument('--output', help='Path of the JSON report, the standard output by default')
+        parser.add_argument('--baseline', help='Path of the JSON report of a previous run to compare to')
+
+    def get_sizes(self, value):
+        try:
+            sizes = [int(size) for size in value.split(',')]
+        except ValueError:
+            raise CommandError('The sizes must be comma separated numbers of teams.')
+        if any(size < 2 for size in sizes):
+            raise CommandError('A data set requires at least 2 teams.')
+        return sizes
+
+    """
+    This method returns the benchmarked APIs. The path and data of a request are computed from its index, the
+    write flows use the objects created by the previous flows (ex: the players are created in new teams).
+    """
+
+    def get_endpoints(self):
+        team = Team.objects.order_by('id').first()
+        coach = Coach.objects.order_by('id').first()
+        player = Player.objects.order_by('id').first()
+        match = Match.objects.order_by('id').first()
+        created = self.created = {'teams': [], 'coaches': [], 'players': [], 'matches': []}
+        teams_url = reverse(constants.TEAMS_URL_NAME + '-list')
+        matches_url = reverse(constants.MATCHES_URL_NAME + '-list')
+        match_players_name = constants.MATCHES_URL_NAME + '-' + constants.MATCH_PLAYERS_URL_NAME
+
+        def match_player_data(i, score):
+            return {'match': created['matches'][i], 'player': created['players'][i], 'score': score}
+
+        return [
+            endpoint('coaches list', 'GET', lambda i: reverse(constants.COACHES_URL_NAME)),
+            endpoint('coach detail', 'GET', lambda i: reverse(constants.COACH_URL_NAME, args=[coach.id])),
+            endpoint('players list', 'GET', lambda i: reverse(constants.PLAYERS_URL_NAME)),
+            endpoint('player detail', 'GET', lambda i: reverse(constants.PLAYER_URL_NAME, args=[player.id])),
+            endpoint('top players', 'GET', lambda i: reverse(constants.TOP_PLAYERS_URL_NAME)),
+            endpoint('teams list', 'GET', lambda i: teams_url),
+            endpoint('team detail', 'GET', lambda i: reverse(constants.TEAMS_URL_NAME + '-detail', args=[team.id])),
+            endpoint('team players', 'GET', lambda i: reverse(
+                constants.TEAMS_URL_NAME + '-' + constants.TEAM_PLAYERS_URL_SUFFIX, args=[team.id])),
+            endpoint('team top players', 'GET', lambda i: reverse(
+                constants.TEAMS_URL_NAME + '-' + constants.TOP_PLAYERS_URL_SUFFIX, args=[team.id])),
+            endpoint('matches list', 'GET', lambda i: matches_url),
+            endpoint('match detail', 'GET', lambda i: reverse(constants.MATCHES_URL_NAME + '-detail',
+                                                              args=[match.id])),
+            endpoint('match players', 'GET', lambda i: reverse(match_players_name, args=[match.id])),
+            endpoint('team create', 'POST', lambda i: teams_url, data=lambda i: {'name': 'Benchmark {}'.format(i)},
+                     created='teams'),
+            endpoint('coach create', 'POST', lambda i: reverse(constants.COACHES_URL_NAME),
+                     data=lambda i: {'name': 'Coach {}'.format(i), 'team': created['teams'][i]}, created='coaches'),
+            endpoint('player create', 'POST', lambda i: reverse(constants.PLAYERS_URL_NAME),
+                     data=lambda i: {'name': 'Player {}'.format(i), 'height': 185, 'team': created['teams'][i]},
+                     created='players'),
+            endpoint('player update', 'PUT', lambda i: reverse(constants.PLAYER_URL_NAME,
+                                                               args=[created['players'][i]]),
+                     data=lambda i: {'name': 'Player {}'.format(i), 'height': 190, 'team': created['teams'][i]}),
+            endpoint('match create', 'POST', lambda i: matches_url,
+                     data=lambda i: {'scheduled_date': '2020-09-01', 'stadium': 'Benchmark',
+                                     'round': Match.QUALIFYING, 'team1': created['teams'][i], 'team2': team.id,
+                                     'team1_score': 40, 'team2_score': 30},
+                     created='matches'),
+            endpoint('match player create', 'POST',
+                     lambda i: reverse(match_players_name, args=[created['matches'][i]]),
+                     data=lambda i: match_player_data(i, 10)),
+            endpoint('match player update', 'PUT', lambda i: reverse(match_players_name, args=[created['matches'][i]]),
+                     data=lambda i: match_player_data(i, 12)),
+            endpoint('match delete', 'DELETE', lambda i: reverse(constants.MATCHES_URL_NAME + '-detail',
+                                                                 args=[created['matches'][i]])),
+            endpoint('player delete', 'DELETE', lambda i: reverse(constants.PLAYER_URL_NAME,
+                                                                  args=[created['players'][i]])),
+            endpoint('coach delete', 'DELETE', lambda i: reverse(constants.COACH_URL_NAME,
+                                                                 args=[created['coaches'][i]])),
+            endpoint('team delete', 'DELETE', lambda i: reverse(constants.TEAMS_URL_NAME + '-detail',
+                                                                args=[created['teams'][i]])),
+        ]
+
+    def request(self, client, api, i):
+        path = api['path'](i)
+        data = api['data'](i) if api['data'] is not None else None
+        kwargs = {'data': json.dumps(data), 'content_type': 'application/json'} if data is not None else {}
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = getattr(client, api['method'].lower())(path, **kwargs)
+            latency = (time.perf_counter() - started) * 1000
+        if response.status_code >= 300:
+            raise CommandError('{} {} failed with the status {}: {}'.format(
+                api['method'], path, response.status_code, response.content[:200]))
+        if api['created'] is not None:
+            self.created[api['created']].append(response.json()['id'])
+        return path, latency, timer.count, timer.elapsed * 1000
+
+    def measure(self, client, api, options):
+        if api['method'] == 'GET':
+            for i in range(options['warmup']):
+                self.request(client, api, i)
+        samples = [self.request(client, api, i) for i in range(options['iterations'])]
+        latencies = sorted(latency for _, latency, _, _ in samples)
+        query_counts = [count for _, _, count, _ in samples]
+        sql_times = sorted(sql_time for _, _, _, sql_time in samples)
+        result = {'name': api['name'], 'method': api['method'], 'path': samples[0][0], 'requests': len(samples),
+                  'latency_ms': {'mean': round(sum(latencies) / len(latencies), 3),
+                                 'max': round(latencies[-1], 3)},
+                  'queries': {'mean': round(sum(query_counts) / len(query_counts), 2), 'max': max(query_counts)},
+                  'sql_ms': {'mean': round(sum(sql_times) / len(sql_times), 3)}}
+        for rank in PERCENTILES:
+            result['latency_ms']['p{}'.format(rank)] = round(percentile(latencies, rank), 3)
+        result['sql_ms']['p95'] = round(percentile(sql_times, 95), 3)
+        return result
+
+    def clear_data(self):
+        with connection.cursor() as cursor:
+            for model in [LogEntry, StatsMarker, ApiToken] + MODELS[::-1]:
+                cursor.execute('DELETE FROM {}'.format(connection.ops.quote_name(model._meta.db_table)))
+
+    def benchmark_size(self, teams, options):
+        logger.info('Benchmarking the data set of %s teams', teams)
+        cache.clear()
+        try:
+            with transaction.atomic():
+                self.clear_data()
+                call_command('generate_data', teams=teams, players_per_team=options['players_per_team'],
+                             seasons=options['seasons'], seed=options['seed'], shared_password=True)
+                rows = {model._meta.model_name: model.objects.count()
+                        for model in [Team, Coach, Player, Match, MatchPlayer]}
+                client = Client()
+                client.force_login(User.objects.get(username=LEAGUE_ADMIN_USER))
+                results = [self.measure(client, api, options) for api in self.get_endpoints()]
+                transaction.set_rollback(True)
+        finally:
+            # The cached responses and stats refer to the rolled back data
+            cache.clear()
+        return {'teams': teams, 'rows': rows, 'endpoints': results}
+
+    def compare(self, report, path):
+        try:
+            with open(path) as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as e:
+            raise CommandError('The baseline report can not be read: {}'.format(e))
+        previous = {(dataset['teams'], result['name']): result for dataset in baseline.get('datasets', [])
+                    for result in dataset['endpoints']}
+        for dataset in report['datasets']:
+            for result in dataset['endpoints']:
+                before = previous.get((dataset['teams'], result['name']))
+                if before is not None:
+                    result['baseline'] = {'p95_ms': before['latency_ms']['p95'],
+                                          'queries': before['queries']['mean'],
+                                          'p95_change': round(result['latency_ms']['p95'] /
+                                                              max(before['latency_ms']['p95'], 0.001), 3)}
+
+    def handle(self, *args, **options):
+        logger.info("Executing the benchmark command")
+        sizes = self.get_sizes(options['sizes'])
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('At least one iteration and a non negative warmup are required.')
+        report = {'format': FORMAT, 'version': VERSION, 'created': timezone.now().isoformat(),
+                  'django': django.get_version(), 'database': connection.vendor,
+                  'options': {key: options[key] for key in ['players_per_team', 'seasons', 'seed', 'iterations',
+                                                            'warmup']}}
+        # Allows the requests of the test client
+        with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']):
+            report['datasets'] = [self.benchmark_size(teams, options) for teams in sizes]
+        if options['baseline']:
+            self.compare(report, options['baseline'])
+        document = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(document)
+        else:
+            self.stdout.write(document)
+        logger.info('Benchmark has successfully completed')
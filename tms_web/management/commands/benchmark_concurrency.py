@@ -0,0 +1,136 @@
+"""
+
+Management command implementation to compare the throughput of the read only APIs when served by the WSGI
+handler, the default ASGI handler and the ASGI handler of the tournament management system.
+
+The handlers are driven in process, without a network server: the WSGI handler by a pool of threads (as
+a threaded WSGI server) and the ASGI handlers by concurrent tasks of an event loop (as an ASGI server).
+The APIs are queried with the data of the configured database (see generate_data command).
+
+"""
+
+import asyncio
+import io
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+
+from tms_web.handlers import ConcurrentReadASGIHandler
+from tms_web.models import Team
+
+logger = logging.getLogger('django.tms_web.BenchmarkConcurrencyLogger')
+BENCHMARK_USER = 'tms_benchmark'
+HOST = 'localhost'
+HANDLERS = ['wsgi', 'asgi', 'asgi-pool']
+
+
+class Command(BaseCommand):
+    help = 'Compares the throughput of the read only APIs under the WSGI and ASGI handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Number of requests of each handler')
+        parser.add_argument('--concurrency', type=int, default=16, help='Number of concurrent requests')
+        parser.add_argument('--handler', action='append', choices=HANDLERS,
+                            help='Handler to benchmark, all the handlers by default')
+
+    def get_paths(self):
+        team = Team.objects.order_by('id').first()
+        if team is None:
+            raise CommandError('The database is empty, populate it with the generate_data command first.')
+        prefix = '/tms_web/'
+        return [prefix + 'teams/', prefix + 'teams/{}/'.format(team.id), prefix + 'players/',
+                prefix + 'players/top/', prefix + 'teams/{}/top-players/'.format(team.id), prefix + 'matches/']
+
+    def create_session(self):
+        user, _ = User.objects.get_or_create(username=BENCHMARK_USER)
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return user, session
+
+    def benchmark_wsgi(self, paths, cookie, options):
+        handler = WSGIHandler()
+
+        def request(path):
+            environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': HOST,
+                       'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'HTTP_COOKIE': cookie, 'wsgi.url_scheme': 'http',
+                       'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO()}
+            statuses = []
+            started = time.perf_counter()
+            body = handler(environ, lambda status, headers: statuses.append(status))
+            b''.join(body)
+            body.close()
+            return int(statuses[0].split()[0]), time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            started = time.perf_counter()
+            results = list(executor.map(request, [paths[i % len(paths)] for i in range(options['requests'])]))
+            return results, time.perf_counter() - started
+
+    def benchmark_asgi(self, handler, paths, cookie, options):
+        async def request(path, semaphore):
+            scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                     'scheme': 'http', 'path': path, 'root_path': '', 'query_string': b'',
+                     'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+                     'server': (HOST, 80), 'client': ('127.0.0.1', 0)}
+            statuses = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b''}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return statuses[0], time.perf_counter() - started
+
+        async def run():
+            semaphore = asyncio.Semaphore(options['concurrency'])
+            started = time.perf_counter()
+            results = await asyncio.gather(*[request(paths[i % len(paths)], semaphore)
+                                             for i in range(options['requests'])])
+            return results, time.perf_counter() - started
+
+        return asyncio.run(run())
+
+    def report(self, name, results, elapsed):
+        latencies = sorted(latency * 1000 for _, latency in results)
+        errors = sum(1 for status, _ in results if status != 200)
+        self.stdout.write('{:<10} {:>8} requests {:>6} errors {:>9.1f} req/s  p50 {:>8.2f} ms  p95 {:>8.2f} ms'.format(
+            name, len(results), errors, len(results) / elapsed, statistics.median(latencies),
+            latencies[int(0.95 * (len(latencies) - 1))]))
+
+    def handle(self, *args, **options):
+        logger.info("Executing the benchmark_concurrency command")
+        paths = self.get_paths()
+        user, session = self.create_session()
+        cookie = '{}={}'.format(settings.SESSION_COOKIE_NAME, session.session_key)
+        try:
+            for name in options['handler'] or HANDLERS:
+                if name == 'wsgi':
+                    results, elapsed = self.benchmark_wsgi(paths, cookie, options)
+                elif name == 'asgi':
+                    results, elapsed = self.benchmark_asgi(ASGIHandler(), paths, cookie, options)
+                else:
+                    handler = ConcurrentReadASGIHandler()
+                    results, elapsed = self.benchmark_asgi(handler, paths, cookie, options)
+                    handler.read_executor.shutdown()
+                self.report(name, results, elapsed)
+        finally:
+            session.delete()
+            user.delete()
+        logger.info('Concurrency benchmark has successfully completed')
@@ -0,0 +1,162 @@
+"""
+
+Management command implementation to benchmark the hot access paths of the APIs before and after the
+hot path indexes migration.
+
+A temporary SQLite database is migrated up to the migration preceding the indexes and populated with a
+synthetic league. The query plans and timings of the hot queries are measured, the database is migrated
+forward to the indexes migration and the same queries are measured again on the same data.
+
+"""
+
+import datetime
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Count, Sum
+
+from tms_web.models import Player, Team, Match, MatchPlayer, MatchTeam
+
+logger = logging.getLogger('django.tms_web.BenchmarkIndexesLogger')
+DATABASE_ALIAS = 'benchmark_indexes'
+MIGRATION_BEFORE = '0003_player_score_totals'
+MIGRATION_AFTER = '0004_hot_path_indexes'
+ROUNDS = [choice for choice, _ in Match.ROUND_CHOICES]
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the query plans and timings of the hot access paths before and after the indexes migration'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=64, help='Number of teams')
+        parser.add_argument('--players', type=int, default=15, help='Number of players of each team')
+        parser.add_argument('--matches', type=int, default=10000, help='Number of matches')
+        parser.add_argument('--match-players', type=int, default=10,
+                            help='Number of players of each team recorded for a match')
+        parser.add_argument('--repeat', type=int, default=100, help='Number of executions of each query')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data')
+
+    def setup_database(self):
+        directory = tempfile.mkdtemp(prefix='tms_benchmark_')
+        connections.databases[DATABASE_ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(directory, 'benchmark.sqlite3'),
+        }
+        connections.ensure_defaults(DATABASE_ALIAS)
+        connections.prepare_test_settings(DATABASE_ALIAS)
+        return directory
+
+    def teardown_database(self, directory):
+        connections[DATABASE_ALIAS].close()
+        del connections[DATABASE_ALIAS]
+        del connections.databases[DATABASE_ALIAS]
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def migrate(self, migration):
+        call_command('migrate', 'tms_web', migration, database=DATABASE_ALIAS, verbosity=0)
+        self.analyze()
+
+    def analyze(self):
+        with connections[DATABASE_ALIAS].cursor() as cursor:
+            # Refresh the statistics of the query planner
+            cursor.execute('ANALYZE')
+
+    def generate_league(self, options):
+        rng = random.Random(options['seed'])
+        teams = [Team(id=i, name='Team {}'.format(i)) for i in range(1, options['teams'] + 1)]
+        rosters = {team.id: [] for team in teams}
+        players = []
+        for team in teams:
+            for _ in range(options['players']):
+                player = Player(id=len(players) + 1, name='Player {}'.format(len(players) + 1), height=185,
+                                average_score=rng.randrange(1000) / 100, team_id=team.id)
+                rosters[team.id].append(player.id)
+                players.append(player)
+        first_day = datetime.date(2020, 1, 1)
+        matches, match_teams, match_players = [], [], []
+        for match_id in range(1, options['matches'] + 1):
+            team1, team2 = rng.sample(sorted(rosters), 2)
+            scores = {team1: rng.randrange(120), team2: rng.randrange(120)}
+            matches.append(Match(id=match_id, scheduled_date=first_day + datetime.timedelta(days=rng.randrange(365)),
+                                 stadium='Stadium', round=rng.choice(ROUNDS), team1_id=team1, team2_id=team2,
+                                 team1_score=scores[team1], team2_score=scores[team2]))
+            for team_id, score in scores.items():
+                match_teams.append(MatchTeam(id=len(match_teams) + 1, match_id=match_id, team_id=team_id, score=score))
+                for player_id in rng.sample(rosters[team_id], min(options['match_players'], options['players'])):
+                    match_players.append(MatchPlayer(id=len(match_players) + 1, match_id=match_id,
+                                                     player_id=player_id, score=rng.randrange(30)))
+        for model, objects in [(Team, teams), (Player, players), (Match, matches), (MatchTeam, match_teams),
+                               (MatchPlayer, match_players)]:
+            # The batch size is left to the database backend, which knows the limits of a single insert
+            model.objects.using(DATABASE_ALIAS).bulk_create(objects)
+        return rng, players, matches
+
+    """
+    This method returns the hot queries of the APIs, along with the queried (random) objects.
+    """
+
+    def get_queries(self, rng, players, matches):
+        db = DATABASE_ALIAS
+        player = rng.choice(players)
+        match = rng.choice(matches)
+        match_player = MatchPlayer.objects.using(db).filter(match=match.id).first()
+        return [
+            ('Match players of a match', MatchPlayer.objects.using(db).filter(match=match.id)),
+            ('MatchPlayer of a match and player',
+             MatchPlayer.objects.using(db).filter(match=match_player.match_id, player=match_player.player_id)),
+            ('Score aggregates of players',
+             MatchPlayer.objects.using(db).filter(player__in=[p.id for p in rng.sample(players, 20)])
+             .values('player').annotate(total=Sum('score'), matches=Count('id')).order_by()),
+            ('Top players of a team',
+             Player.objects.using(db).filter(team=player.team_id, average_score__gte=5).order_by('-average_score')),
+            ('Score aggregates of a team',
+             MatchTeam.objects.using(db).filter(team=player.team_id).values('team')
+             .annotate(total=Sum('score'), matches=Count('id')).order_by()),
+            ('Matches of a scheduled date', Match.objects.using(db).filter(scheduled_date=match.scheduled_date)),
+            ('Matches of a round', Match.objects.using(db).filter(round=Match.FINAL)),
+        ]
+
+    """
+    This method returns the query plan and the mean execution time (in milliseconds) of each query. The
+    SQL statements are executed directly, so that the timings are not dominated by building model objects.
+    """
+
+    def measure(self, queries, repeat):
+        results = []
+        with connections[DATABASE_ALIAS].cursor() as cursor:
+            for name, queryset in queries:
+                sql, params = queryset.query.sql_with_params()
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+                results.append((name, queryset.explain(), (time.perf_counter() - started) * 1000 / repeat))
+        return results
+
+    def handle(self, *args, **options):
+        logger.info("Executing the benchmark_indexes command")
+        directory = self.setup_database()
+        try:
+            self.migrate(MIGRATION_BEFORE)
+            rng, players, matches = self.generate_league(options)
+            self.analyze()
+            queries = self.get_queries(rng, players, matches)
+            before = self.measure(queries, options['repeat'])
+            self.migrate(MIGRATION_AFTER)
+            after = self.measure(queries, options['repeat'])
+        finally:
+            self.teardown_database(directory)
+        for (name, plan_before, time_before), (_, plan_after, time_after) in zip(before, after):
+            self.stdout.write(name)
+            self.stdout.write('  before: {:.3f} ms'.format(time_before))
+            self.stdout.write('    ' + plan_before.replace('\n', '\n    '))
+            self.stdout.write('  after:  {:.3f} ms ({:.1f}x)'.format(time_after, time_before / max(time_after, 1e-9)))
+            self.stdout.write('    ' + plan_after.replace('\n', '\n    '))
+        logger.info('Index benchmark has successfully completed')
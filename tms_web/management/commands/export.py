@@ -0,0 +1,41 @@
+"""
+
+Management command implementation to export the players, matches or match players of the tournament
+management system as CSV or NDJSON (see tms_web.exports).
+
+"""
+
+import logging
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tms_web import exports
+
+logger = logging.getLogger('django.tms_web.ExportLogger')
+
+
+class Command(BaseCommand):
+    help = 'Exports the players, matches or match players as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', dest='export_format', choices=sorted(exports.CONTENT_TYPES), default='csv',
+                            help='Format of the export')
+        parser.add_argument('--output', help='Path of the exported file, the standard output by default')
+
+    def write(self, output, options):
+        for lines in exports.stream(options['name'], options['export_format']):
+            output.write(lines)
+
+    def handle(self, *args, **options):
+        logger.info("Executing the export command, export: %s, format: %s", options['name'], options['export_format'])
+        if options['output'] is None:
+            self.write(self.stdout, options)
+        else:
+            try:
+                with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                    self.write(output, options)
+            except OSError as e:
+                raise CommandError('Export file error: {}'.format(e))
+        logger.info('Export has successfully completed')
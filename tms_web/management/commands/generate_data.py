@@ -2,18 +2,34 @@
 
 Management command implementation to populate the database and create required users and groups.
 
+The size of the generated league is configurable: the number of teams, the players of each team and the
+number of seasons, each season being a knockout tournament of all the teams. The rows are generated in
+independent chunks (of teams, or of the matches of a round) by a pool of worker processes, and streamed to
+the database by the main process with batched inserts, a transaction for each batch. The stats of the teams
+and players are computed at the end with grouped aggregate queries.
+
+Each chunk has its own random generator, seeded by the seed of the command and the position of the chunk,
+so that the generated data only depends on the seed, not on the number of workers.
+
 """
 
+import datetime
 import logging
+import math
+import multiprocessing
 import random
 import string
-from decimal import Decimal
-from random import randrange
 
+import django
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import Group, User
-from django.core.management.base import BaseCommand
-from django.db.models import Avg
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
 
+from tms_web import leaderboard, stats
 from tms_web.models import Player, Coach, Team, Match, MatchPlayer, MatchTeam
 
 logger = logging.getLogger('django.tms_web.GenerateDataLogger')
@@ -21,174 +37,279 @@ GROUPS = ['league_admin', 'coach', 'player']
 MODELS = ['Team', 'Match', 'Player', 'Coach', 'Match Player', 'Match Team']
 LEAGUE_ADMIN_USER = 'eric_matific'
 DEFAULT_PASSWORD = 'pwd'
+TEAM_NAMES = ['Brazil', 'Argentina', 'France', 'Spain', 'Japan', 'Australia', 'China', 'New Zealand', 'USA',
+              'Chile', 'Mexico', 'Korea', 'Singapore', 'England', 'Italy', 'Norway']
+STADIUMS = ['Rangers Stadium', 'Fixes Stadium', 'Groove Stadium', 'Clair Stadium']
+# Rounds of a tournament, from the last one
+LAST_ROUNDS = [Match.FINAL, Match.SEMI_FINAL, Match.QUARTER_FINAL]
+PLAYERS_PER_MATCH = 10
+# The inserted fields of each model, in the order of the generated rows
+TEAM_FIELDS = ['id', 'name', 'average_score', 'total_score', 'matches']
+COACH_FIELDS = ['id', 'name', 'team']
+PLAYER_FIELDS = ['id', 'name', 'height', 'average_score', 'total_score', 'matches', 'team']
+USER_FIELDS = ['id', 'username', 'email', 'password', 'is_staff', 'is_superuser', 'is_active', 'first_name',
+               'last_name', 'date_joined']
+USER_GROUP_FIELDS = ['user', 'group']
+MATCH_FIELDS = ['id', 'scheduled_date', 'stadium', 'round', 'team1', 'team2', 'team1_score', 'team2_score']
+MATCH_TEAM_FIELDS = ['id', 'team', 'match', 'score']
+MATCH_PLAYER_FIELDS = ['id', 'player', 'match', 'score']
+
+
+def generate_random_name(rng):
+    names = ['John', 'Ronaldo', 'Macy', 'Christine', 'Sam', 'Tom', 'Graham', 'Ramsy', 'Alex', 'Tim']
+    surnames = ['Peterson', 'Bolton', 'James', 'Cook', 'Cruze', 'Bell', 'Molder', 'Johanson', 'Dennis', 'William']
+    random_string = ''.join(rng.choice(string.ascii_lowercase) for i in range(12))
+    return "{} {} {}".format(rng.choice(names), rng.choice(surnames), random_string)
+
+
+def generate_user(name, password):
+    user_name = name.replace(" ", "_")
+    return user_name, user_name + '@tms.com', password or make_password(DEFAULT_PASSWORD)
+
+
+"""
+This method generates the coaches, players and users of a chunk of teams. It runs in the worker processes,
+and returns the rows without the coach and user primary keys, which are assigned by the main process.
+"""
+
+
+def generate_team_chunk(task):
+    seed, team_ids, first_player_id, players_per_team, password = task
+    rng = random.Random(seed)
+    coaches, players, coach_users, player_users = [], [], [], []
+    for team_idx, team_id in enumerate(team_ids):
+        name = generate_random_name(rng)
+        coaches.append((name, team_id))
+        coach_users.append(generate_user(name, password))
+        for player_idx in range(players_per_team):
+            name = generate_random_name(rng)
+            player_id = first_player_id + team_idx * players_per_team + player_idx
+            players.append((player_id, name, rng.randrange(170, 200), 0, 0, 0, team_id))
+            player_users.append(generate_user(name, password))
+    return coaches, players, coach_users, player_users
+
+
+"""
+This method generates the matches of a chunk of pairs of teams of a round, along with their MatchTeam and
+MatchPlayer records. It runs in the worker processes, and returns the rows (the MatchTeam and MatchPlayer
+rows without their primary keys) and the winners of the matches.
+"""
+
+
+def generate_round_chunk(task):
+    seed, pairs, first_match_id, round_name, scheduled_date, rosters = task
+    rng = random.Random(seed)
+    matches, match_teams, match_players, winners = [], [], [], []
+    for match_id, (team1, team2) in enumerate(pairs, first_match_id):
+        scores = [rng.randrange(10), rng.randrange(10)]
+        if scores[0] == scores[1]:
+            scores[1] += 1
+        winners.append(team1 if scores[0] > scores[1] else team2)
+        matches.append((match_id, scheduled_date, rng.choice(STADIUMS), round_name, team1, team2,
+                        scores[0], scores[1]))
+        for team_id, score in zip((team1, team2), scores):
+            match_teams.append((team_id, match_id, score))
+            first_player_id, players = rosters[team_id]
+            for player_id in rng.sample(range(first_player_id, first_player_id + players),
+                                        min(PLAYERS_PER_MATCH, players)):
+                match_players.append((player_id, match_id, rng.randrange(2)))
+    return matches, match_teams, match_players, winners
 
 
 class Command(BaseCommand):
     help = 'Generates dummy Tournament data to test the system'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=16, help='Number of teams')
+        parser.add_argument('--players-per-team', type=int, default=14, help='Number of players of each team')
+        parser.add_argument('--seasons', type=int, default=1,
+                            help='Number of seasons, each season is a knockout tournament of all the teams')
+        parser.add_argument('--seed', type=int, default=None, help='Seed of the random data')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of rows inserted in a single transaction')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of teams (or matches) generated by a worker at once')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker processes generating the data')
+        parser.add_argument('--shared-password', action='store_true',
+                            help='Hash the default password once and share the hash among the generated users')
+
     def create_groups_and_permissions(self):
         for g in GROUPS:
             Group.objects.get_or_create(name=g)
         logger.info('Successfully added groups')
 
-    def get_random_string(self):
-        letters = string.ascii_lowercase
-        return ''.join(random.choice(letters) for i in range(12))
+    """
+    This method reserves the primary keys of a number of new objects of a given model. The primary keys are
+    assigned before the inserts, since bulk inserts do not return them on every database.
+    """
 
-    def generate_random_name(self):
-        names = ['John', 'Ronaldo', 'Macy', 'Christine', 'Sam', 'Tom', 'Graham', 'Ramsy', 'Alex', 'Tim']
-        surnames = ['Peterson', 'Bolton', 'James', 'Cook', 'Cruze', 'Bell', 'Molder', 'Johanson', 'Dennis', 'William']
-        return "{} {} {}".format(names[randrange(9)], surnames[randrange(9)], self.get_random_string())
+    def allocate_ids(self, model, count):
+        first_id = self.next_ids.get(model)
+        if first_id is None:
+            first_id = (model.objects.aggregate(max_id=Max('id'))['max_id'] or 0) + 1
+        self.next_ids[model] = first_id + count
+        return range(first_id, first_id + count)
+
+    """
+    This method inserts rows (tuples of values of the given fields) of a model with batched statements,
+    committing a transaction for each batch of rows.
+    """
+
+    def insert_rows(self, model, fields, rows):
+        columns = [model._meta.get_field(field).column for field in fields]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(column) for column in columns), ', '.join(['%s'] * len(columns)))
+        batch_size = self.options['batch_size']
+        for start in range(0, len(rows), batch_size):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, rows[start:start + batch_size])
+
+    def insert_users(self, users, group=None):
+        date_joined = connection.ops.adapt_datetimefield_value(timezone.now())
+        user_ids = self.allocate_ids(User, len(users))
+        self.insert_rows(User, USER_FIELDS, [(user_id, username, email, password, False, False, True, '', '',
+                                              date_joined)
+                                             for user_id, (username, email, password) in zip(user_ids, users)])
+        if group is not None:
+            self.insert_rows(User.groups.through, USER_GROUP_FIELDS, [(user_id, group.id) for user_id in user_ids])
+
+    def reset_sequences(self):
+        statements = connection.ops.sequence_reset_sql(no_style(), [User, Team, Coach, Player, Match, MatchTeam,
+                                                                    MatchPlayer])
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def get_chunk_seed(self, *position):
+        return ':'.join(str(value) for value in (self.seed,) + position)
+
+    def get_chunks(self, items):
+        chunk_size = self.options['chunk_size']
+        return [items[start:start + chunk_size] for start in range(0, len(items), chunk_size)]
+
+    """
+    This method runs a worker function on each of the given tasks, returning the results in the order of
+    the tasks.
+    """
+
+    def run_tasks(self, function, tasks):
+        if self.pool is None:
+            return map(function, tasks)
+        return self.pool.imap(function, tasks)
 
     def generate_team_data(self):
-        for i in range(16):
-            team_names = ['Brazil', 'Argentina', 'France', 'Spain', 'Japan', 'Australia', 'China', 'New Zealand', 'USA',
-                          'Chile', 'Mexico', 'Korea', 'Singapore', 'England', 'Italy', 'Norway']
-            team = Team(name=team_names[i], average_score=randrange(12))
-            team.save()
-            # Group.objects.get_or_create(name=team_names[i])
-        logger.info('Successfully added 16 Teams and associated groups')
-
-    def generate_user(self, name, is_staff=False):
-        user_name = name.replace(" ", "_")
-        email = user_name + '@tms.com'
-        return User.objects.create_user(username=user_name, email=email, password=DEFAULT_PASSWORD, is_staff=is_staff)
-
-    def generate_coach_data_and_users(self):
-        teams = Team.objects.all()
-        for t in list(teams):
-            name = self.generate_random_name()
-            coach = Coach(name=name, team=t)
-            coach.save()
-            user = self.generate_user(name=name)
-            coach_group = Group.objects.get(name=GROUPS[1])
-            coach_group.user_set.add(user)
-            # team_group = Group.objects.get(name=t.name)
-            # team_group.user_set.add(user)
-        logger.info('Successfully added 16 Coaches and associated users')
-
-    def generate_player_data_and_users(self):
-        teams = Team.objects.all()
-        for t in list(teams):
-            for i in range(14):
-                name = self.generate_random_name()
-                player = Player(name=name, height=randrange(170, 200), average_score=randrange(6), team=t)
-                player.save()
-                user = self.generate_user(name=name)
-                # player_group = Group.objects.get(name=GROUPS[2])
-                # player_group.user_set.add(user)
-        logger.info('Successfully created players and associated users')
-
-    def generate_match_data(self):
-        teams = Team.objects.all()
-        teams = list(teams)
-        team_idx = 0
-        # Insert data for qualifying round
-        for i in range(8):
-            match = Match(scheduled_date='2020-01-02', stadium="Rangers Stadium", round=Match.QUALIFYING,
-                          team1=teams[team_idx], team2=teams[team_idx + 1], team1_score=1, team2_score=3)
-            match.save()
-            match_team1 = MatchTeam(team=teams[team_idx], match=match, score=1)
-            match_team2 = MatchTeam(team=teams[team_idx + 1], match=match, score=3)
-            match_team1.save()
-            match_team2.save()
-            team_idx = team_idx + 2
-
-        # Insert data for quarter final round
-        team_idx = 1
-        for i in range(4):
-            match = Match(scheduled_date='2020-01-05', stadium="Fixes Stadium", round=Match.QUARTER_FINAL,
-                          team1=teams[team_idx], team2=teams[team_idx + 2], team1_score=3, team2_score=5)
-            match.save()
-            match_team1 = MatchTeam(team=teams[team_idx], match=match, score=3)
-            match_team2 = MatchTeam(team=teams[team_idx + 2], match=match, score=5)
-            match_team1.save()
-            match_team2.save()
-            team_idx = team_idx + 4
-
-        # Insert data for semi final round
-        team_idx = 3
-        for i in range(2):
-            match = Match(scheduled_date='2020-01-15', stadium="Groove Stadium", round=Match.SEMI_FINAL,
-                          team1=teams[team_idx], team2=teams[team_idx + 4], team1_score=4, team2_score=6)
-            match.save()
-            match_team1 = MatchTeam(team=teams[team_idx], match=match, score=4)
-            match_team2 = MatchTeam(team=teams[team_idx + 4], match=match, score=6)
-            match_team1.save()
-            match_team2.save()
-            team_idx = team_idx + 8
-
-        # Insert data for final round
-        match = Match(scheduled_date='2020-01-31', stadium="Clair Stadium", round=Match.FINAL,
-                      team1=teams[7], team2=teams[15], team1_score=4, team2_score=7)
-        match.save()
-        match_team1 = MatchTeam(team=teams[7], match=match, score=4)
-        match_team2 = MatchTeam(team=teams[15], match=match, score=7)
-        match_team1.save()
-        match_team2.save()
-        logger.info('Successfully added matches')
-
-    def get_player_average(self, player_id):
-        score = MatchPlayer.objects.filter(player=player_id).aggregate(avg=Avg('score'))
-        if score['avg'] is not None:
-            return Decimal(score['avg'])
-        else:
-            return 0
-
-    def get_team_average(self, team_id):
-        score = MatchTeam.objects.filter(team=team_id).aggregate(avg=Avg('score'))
-        if score['avg'] is not None:
-            return Decimal(score['avg'])
-        else:
-            return 0
-
-    def generate_match_players(self):
-        matches = MatchTeam.objects.all()
-        matches = list(matches)
-        match_idx = 0
-        for m in matches:
-            team_players = Player.objects.all().filter(team=m.team)
-            team_players = list(team_players)
-            for i in range(10):
-                m_player = MatchPlayer(player=team_players[i], match=matches[match_idx].match, score=randrange(2))
-                m_player.save()
-            match_idx = match_idx + 1
-        # Update no of matches and average scores of players
-        team_players = Player.objects.all()
-        team_players = list(team_players)
-        for p in team_players:
-            p.matches = MatchPlayer.objects.filter(player=p.id).count()
-            p.average_score = self.get_player_average(p.id)
-            p.save()
-
-        logger.info('Successfully added players for matches')
-
-    def update_team_averages(self):
-        teams = Team.objects.all()
-        for t in list(teams):
-            t.average_score = self.get_team_average(team_id=t.id)
-            t.save()
-
-        logger.info('Successfully updated team averages')
+        count = self.options['teams']
+        names = [TEAM_NAMES[i] if i < len(TEAM_NAMES) else 'Team {}'.format(i + 1) for i in range(count)]
+        team_ids = list(self.allocate_ids(Team, count))
+        self.insert_rows(Team, TEAM_FIELDS, [(team_id, name, 0, 0, 0) for team_id, name in zip(team_ids, names)])
+        logger.info('Successfully added %s Teams', count)
+        return team_ids
 
-    def handle(self, *args, **options):
-        logger.info("Executing the generate_data command to populate database, create groups and necessary roles")
+    def generate_coach_and_player_data_and_users(self, team_ids):
+        players_per_team = self.options['players_per_team']
+        first_player_id = self.allocate_ids(Player, players_per_team * len(team_ids))[0]
+        coach_group = Group.objects.get(name=GROUPS[1])
+        tasks = [(self.get_chunk_seed('teams', chunk_idx), chunk,
+                  first_player_id + chunk_idx * self.options['chunk_size'] * players_per_team, players_per_team,
+                  self.password)
+                 for chunk_idx, chunk in enumerate(self.get_chunks(team_ids))]
+        for coaches, players, coach_users, player_users in self.run_tasks(generate_team_chunk, tasks):
+            coach_ids = self.allocate_ids(Coach, len(coaches))
+            self.insert_rows(Coach, COACH_FIELDS, [(coach_id,) + coach for coach_id, coach in zip(coach_ids, coaches)])
+            self.insert_users(coach_users, group=coach_group)
+            self.insert_rows(Player, PLAYER_FIELDS, players)
+            self.insert_users(player_users)
+        logger.info('Successfully added %s Coaches, %s players and associated users', len(team_ids),
+                    players_per_team * len(team_ids))
+        return {team_id: (first_player_id + team_idx * players_per_team, players_per_team)
+                for team_idx, team_id in enumerate(team_ids)}
+
+    def get_round(self, rounds_left):
+        return LAST_ROUNDS[rounds_left - 1] if rounds_left <= len(LAST_ROUNDS) else Match.QUALIFYING
+
+    """
+    This method generates a knockout tournament of the given teams: each round pairs the remaining teams,
+    and the winners of a round play the next one.
+    """
+
+    def generate_season(self, season, team_ids, rosters):
+        remaining = list(team_ids)
+        self.random.shuffle(remaining)
+        rounds = math.ceil(math.log2(len(remaining)))
+        first_day = datetime.date(2020 + season, 1, 2)
+        match_count = match_player_count = 0
+        for round_idx in range(rounds):
+            pairs = [(remaining[i], remaining[i + 1]) for i in range(0, len(remaining) - 1, 2)]
+            # A team without an opponent advances to the next round
+            winners = remaining[len(pairs) * 2:]
+            match_ids = self.allocate_ids(Match, len(pairs))
+            scheduled_date = str(first_day + datetime.timedelta(days=7 * round_idx))
+            tasks = [(self.get_chunk_seed('season', season, round_idx, chunk_idx), chunk,
+                      match_ids[chunk_idx * self.options['chunk_size']], self.get_round(rounds - round_idx),
+                      scheduled_date, {team_id: rosters[team_id] for pair in chunk for team_id in pair})
+                     for chunk_idx, chunk in enumerate(self.get_chunks(pairs))]
+            for matches, match_teams, match_players, chunk_winners in self.run_tasks(generate_round_chunk, tasks):
+                self.insert_rows(Match, MATCH_FIELDS, matches)
+                match_team_ids = self.allocate_ids(MatchTeam, len(match_teams))
+                self.insert_rows(MatchTeam, MATCH_TEAM_FIELDS,
+                                 [(row_id,) + row for row_id, row in zip(match_team_ids, match_teams)])
+                match_player_ids = self.allocate_ids(MatchPlayer, len(match_players))
+                self.insert_rows(MatchPlayer, MATCH_PLAYER_FIELDS,
+                                 [(row_id,) + row for row_id, row in zip(match_player_ids, match_players)])
+                winners.extend(chunk_winners)
+                match_count += len(matches)
+                match_player_count += len(match_players)
+            remaining = winners
+        logger.info('Successfully added %s matches and %s match players of season %s',
+                    match_count, match_player_count, season + 1)
+
+    def update_averages(self):
+        stats.rebuild_team_stats()
+        stats.rebuild_player_stats()
+        logger.info('Successfully updated team and player averages')
+
+    def generate(self, options):
         # Add user groups
         self.create_groups_and_permissions()
         # create league_admin user and set league_admin role
-        user = self.generate_user(name=LEAGUE_ADMIN_USER, is_staff=True)
+        user = User.objects.create_user(username=LEAGUE_ADMIN_USER, email=LEAGUE_ADMIN_USER + '@tms.com',
+                                        password=DEFAULT_PASSWORD, is_staff=True)
         admin_group = Group.objects.get(name=GROUPS[0])
         admin_group.user_set.add(user)
         # Add teams
-        self.generate_team_data()
-        # Add coaches
-        self.generate_coach_data_and_users()
-        # Add players
-        self.generate_player_data_and_users()
-        # Add matches
-        self.generate_match_data()
-        # Add players to matches
-        self.generate_match_players()
-        # Update team averages
-        self.update_team_averages()
+        team_ids = self.generate_team_data()
+        # Add coaches and players
+        rosters = self.generate_coach_and_player_data_and_users(team_ids)
+        # Add matches and players to matches
+        for season in range(options['seasons']):
+            self.generate_season(season, team_ids, rosters)
+        self.reset_sequences()
+        # Update team and player averages
+        self.update_averages()
+        # The players are inserted without their post_save signal, the leaderboards are loaded again
+        leaderboard.invalidate()
+
+    def handle(self, *args, **options):
+        logger.info("Executing the generate_data command to populate database, create groups and necessary roles")
+        if options['teams'] < 2 or options['players_per_team'] < 1 or options['seasons'] < 0:
+            raise CommandError('At least 2 teams with a player each and a non negative number of seasons are required.')
+        if options['workers'] < 1 or options['chunk_size'] < 1 or options['batch_size'] < 1:
+            raise CommandError('The number of workers, the chunk size and the batch size must be positive.')
+        self.options = options
+        self.random = random.Random(options['seed'])
+        self.seed = options['seed'] if options['seed'] is not None else self.random.getrandbits(64)
+        self.next_ids = {}
+        self.password = make_password(DEFAULT_PASSWORD) if options['shared_password'] else None
+        self.pool = None
+        if options['workers'] > 1:
+            # The workers do not access the database, and must not share the connections of this process
+            connections.close_all()
+            self.pool = multiprocessing.Pool(options['workers'], initializer=django.setup)
+        try:
+            self.generate(options)
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
         logger.info('Dummy data insertion has successfully completed')
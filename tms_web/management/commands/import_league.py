@@ -0,0 +1,87 @@
+"""
+
+Management command implementation to import a league (teams, coaches, players, matches and match players)
+from CSV or NDJSON files (see tms_web.imports).
+
+The columns of the files are:
+    teams: name
+    coaches: name, team (name)
+    players: name, height, team (name)
+    matches: scheduled_date, stadium, round, team1, team2 (names), team1_score, team2_score
+    match players: scheduled_date, team1, team2 (names of the teams of the match), player (name), team (name
+    of the team of the player), score
+
+The files are imported in a single transaction. By default the whole import is rolled back if any row is
+rejected, unless --allow-partial is given, in which case the valid rows are imported.
+
+"""
+
+import logging
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tms_web import imports
+
+logger = logging.getLogger('django.tms_web.ImportLeagueLogger')
+EXTENSIONS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+class Command(BaseCommand):
+    help = 'Imports the teams, coaches, players, matches and match players of a league from CSV or NDJSON files'
+
+    def add_arguments(self, parser):
+        for kind in imports.KINDS:
+            parser.add_argument('--' + kind, dest=kind, help='Path of the {} file'.format(kind.replace('-', ' ')))
+        parser.add_argument('--format', dest='import_format', choices=imports.FORMATS,
+                            help='Format of the files, by default given by their extension (.csv, .ndjson or .jsonl)')
+        parser.add_argument('--batch-size', type=int, default=imports.BATCH_SIZE,
+                            help='Number of rows inserted by each bulk insert')
+        parser.add_argument('--allow-partial', action='store_true',
+                            help='Import the valid rows when some rows are rejected')
+
+    def get_format(self, path, options):
+        import_format = options['import_format'] or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if import_format is None:
+            raise CommandError('The format of {} is unknown, use the --format option.'.format(path))
+        return import_format
+
+    def import_file(self, league_import, kind, path, options):
+        import_format = self.get_format(path, options)
+        try:
+            with open(path, newline='', encoding='utf-8') as rows:
+                league_import.import_rows(kind, imports.read_rows(rows, import_format))
+        except (OSError, UnicodeDecodeError) as e:
+            raise CommandError('Import file error: {}'.format(e))
+        logger.info('Imported %s %s, rejected %s rows', league_import.created[kind], kind.replace('-', ' '),
+                    len(league_import.rejected[kind]))
+
+    def report_rejected(self, league_import):
+        for kind in imports.KINDS:
+            for rejected in league_import.rejected[kind]:
+                self.stderr.write('Rejected {} line {}: {}'.format(kind.replace('-', ' '), rejected['line'],
+                                                                   rejected['errors']))
+
+    def report(self, league_import):
+        self.report_rejected(league_import)
+        self.stdout.write(', '.join('{} {}'.format(league_import.created[kind], kind.replace('-', ' '))
+                                    for kind in imports.KINDS) + ' imported')
+
+    def handle(self, *args, **options):
+        logger.info("Executing the import_league command")
+        kinds = [kind for kind in imports.KINDS if options[kind]]
+        if not kinds:
+            raise CommandError('At least one file to import is required, ex: --teams teams.csv.')
+        if options['batch_size'] < 1:
+            raise CommandError('The batch size must be positive.')
+        league_import = imports.LeagueImport(batch_size=options['batch_size'])
+        with transaction.atomic():
+            for kind in kinds:
+                self.import_file(league_import, kind, options[kind], options)
+            if league_import.has_rejected() and not options['allow_partial']:
+                self.report_rejected(league_import)
+                raise CommandError('Some rows are rejected, nothing is imported (see --allow-partial).')
+            league_import.finish()
+        self.report(league_import)
+        logger.info('League import has successfully completed')
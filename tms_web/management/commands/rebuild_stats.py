@@ -0,0 +1,79 @@
+"""
+
+Management command implementation to repair the stats (score total, match count and average score) of the teams
+and players from their recorded match scores.
+
+The drifted teams and players are found with a single query per table, which aggregates the MatchTeam and
+MatchPlayer scores of every row with correlated subqueries (range scans of the (team, score) and (player, score)
+indexes) and compares them with the stored stats. Only the drifted rows are then rebuilt, with a grouped
+aggregate query of the scores of each batch of ids written back by batched UPDATE statements, each batch in
+its own transaction so that the write lock of the database is held briefly. With --check, the drifted rows are
+reported without writing, and the command fails if there are any (ex: for a periodic consistency check).
+
+"""
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tms_web import stats
+
+logger = logging.getLogger('django.tms_web.RebuildStatsLogger')
+BATCH_SIZE = 1000
+FIELDS = ['id', 'total_score', 'matches', 'average_score', 'expected_total_score', 'expected_matches',
+          'expected_average_score']
+# The tables of the stats, their stale rows and their rebuild
+TABLES = [
+    ('teams', stats.stale_team_stats, stats.rebuild_team_stats, 'team_ids'),
+    ('players', stats.stale_player_stats, stats.rebuild_player_stats, 'player_ids'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the stats of the teams and players which drifted from their recorded match scores'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Report the drifted teams and players without rebuilding their stats')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='Number of teams or players rebuilt by each transaction')
+
+    def report_drifted(self, name, row):
+        self.stdout.write('{} {}: total score {}, matches {}, average score {:.2f}, expected {}, {}, {:.2f}'.format(
+            name[:-1].capitalize(), *row))
+
+    def rebuild(self, rebuild, keyword, ids, batch_size):
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            with transaction.atomic():
+                rebuild(batch)
+                stats.invalidate_stats(**{keyword: batch})
+
+    def handle(self, *args, **options):
+        logger.info("Executing the rebuild_stats command")
+        if options['batch_size'] < 1:
+            raise CommandError('The batch size must be positive.')
+        drifted = {}
+        for name, stale, rebuild, keyword in TABLES:
+            ids = []
+            for row in stale().order_by('id').values_list(*FIELDS).iterator():
+                ids.append(row[0])
+                if options['check'] or options['verbosity'] > 1:
+                    self.report_drifted(name, row)
+            drifted[name] = len(ids)
+            if not options['check']:
+                self.rebuild(rebuild, keyword, ids, options['batch_size'])
+            logger.info('Found %s %s with drifted stats', len(ids), name)
+        pending = stats.get_pending_stats()
+        if any(pending.values()):
+            self.stdout.write('{} teams and {} players are pending in the deferred stats mode'.format(
+                pending['team'], pending['player']))
+        summary = '{} teams and {} players with drifted stats'.format(drifted['teams'], drifted['players'])
+        if options['check']:
+            if any(drifted.values()):
+                raise CommandError('Found ' + summary + '.')
+            self.stdout.write('The stats of the teams and players match their recorded scores')
+        else:
+            self.stdout.write('Rebuilt ' + summary)
+        logger.info('Stats rebuild has successfully completed')
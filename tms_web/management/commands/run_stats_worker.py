@@ -0,0 +1,57 @@
+"""
+
+Management command implementation of the stats worker of the deferred stats mode (see tms_web.stats).
+
+The worker rebuilds the stats of the teams and players marked as stale by the match and score writes, a batch
+of markers at a time, and waits for new markers when there are none left. A batch which fails on the database
+lock (ex: SQLite under concurrent writes) is rolled back and retried after the interval.
+
+"""
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+
+from tms_web import stats
+
+logger = logging.getLogger('django.tms_web.StatsWorkerLogger')
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the stats of the teams and players marked as stale by the writes of the deferred stats mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=stats.STATS_BATCH_SIZE,
+                            help='Number of stats markers processed by each batch')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Seconds to wait for new stats markers when there are none left')
+        parser.add_argument('--once', action='store_true',
+                            help='Process the current stats markers and exit, instead of waiting for new ones')
+
+    def handle(self, *args, **options):
+        logger.info("Executing the run_stats_worker command")
+        if options['batch_size'] < 1:
+            raise CommandError('The batch size must be positive.')
+        teams = players = 0
+        try:
+            while True:
+                try:
+                    batch_teams, batch_players = stats.process_stats_markers(options['batch_size'])
+                except OperationalError:
+                    logger.exception('Stats batch failed, retrying in %s s', options['interval'])
+                    time.sleep(options['interval'])
+                    continue
+                if batch_teams or batch_players:
+                    logger.info('Rebuilt the stats of %s teams and %s players', batch_teams, batch_players)
+                    teams += batch_teams
+                    players += batch_players
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write('Rebuilt the stats of {} teams and {} players'.format(teams, players))
+        logger.info('Stats worker has successfully completed')
@@ -0,0 +1,141 @@
+"""
+
+Management command implementation to save the data set of the tournament management system (ex: a generated
+benchmark league) to a snapshot file, and to restore it.
+
+A snapshot is a gzip compressed file of JSON lines: a header, then for each table a line with its columns
+and number of rows followed by the batches of rows, a line (a JSON array of rows) for each batch. The rows
+are read and written with raw batched statements, without foreign key checks on restore (and on SQLite, the
+secondary indexes of a table are created again after its rows are loaded), thus a snapshot restores much
+faster than regenerating the data or loading a JSON fixture (loaddata), which saves the objects one by one.
+
+Restoring a snapshot replaces the users, groups and the tournament data, and clears the admin log, the stats
+markers of the deferred stats mode and the API tokens (which are not saved).
+
+"""
+
+import gzip
+import json
+import logging
+
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from tms_web import leaderboard
+from tms_web.models import Player, Coach, Team, Match, MatchPlayer, MatchTeam, StatsMarker, ApiToken
+
+logger = logging.getLogger('django.tms_web.SnapshotLogger')
+FORMAT = 'tms-snapshot'
+VERSION = 1
+BATCH_SIZE = 10000
+# The tables of a snapshot, parents first
+MODELS = [Group, Group.permissions.through, User, User.groups.through, User.user_permissions.through, Team, Coach,
+          Player, Match, MatchTeam, MatchPlayer]
+
+
+class Command(BaseCommand):
+    help = 'Saves the users and tournament data to a snapshot file (dump), or restores them from a snapshot (restore)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['dump', 'restore'])
+        parser.add_argument('path', help='Path of the snapshot file')
+
+    def get_columns(self, model):
+        return [field.column for field in model._meta.concrete_fields]
+
+    def write_line(self, snapshot, value):
+        snapshot.write(json.dumps(value, default=str, separators=(',', ':')))
+        snapshot.write('\n')
+
+    def dump(self, path):
+        quote_name = connection.ops.quote_name
+        with gzip.open(path, 'wt', compresslevel=1, encoding='utf-8') as snapshot, transaction.atomic():
+            self.write_line(snapshot, {'format': FORMAT, 'version': VERSION, 'created': timezone.now()})
+            for model in MODELS:
+                columns = self.get_columns(model)
+                self.write_line(snapshot, {'table': model._meta.db_table, 'columns': columns,
+                                           'rows': model.objects.count()})
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT {} FROM {} ORDER BY {}'.format(
+                        ', '.join(quote_name(column) for column in columns), quote_name(model._meta.db_table),
+                        quote_name(model._meta.pk.column)))
+                    for rows in iter(lambda: cursor.fetchmany(BATCH_SIZE), []):
+                        self.write_line(snapshot, rows)
+                logger.info('Saved the table %s', model._meta.db_table)
+
+    def read_header(self, snapshot):
+        try:
+            header = json.loads(snapshot.readline())
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or header.get('format') != FORMAT or header.get('version') != VERSION:
+            raise CommandError('The file is not a snapshot of version {}.'.format(VERSION))
+
+    """
+    This method drops the secondary indexes of a SQLite table, and returns the statements creating them.
+    The indexes of the UNIQUE constraints of the table definition are kept.
+    """
+
+    def drop_indexes(self, cursor, table):
+        if connection.vendor != 'sqlite':
+            return []
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s "
+                       "AND sql IS NOT NULL", [table])
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute('DROP INDEX {}'.format(connection.ops.quote_name(name)))
+        return [sql for _, sql in indexes]
+
+    def restore_table(self, snapshot, model):
+        table = json.loads(snapshot.readline())
+        columns = self.get_columns(model)
+        if table['table'] != model._meta.db_table or table['columns'] != columns:
+            raise CommandError('The snapshot table {} does not match the database schema, migrate the database to '
+                               'the migrations of the snapshot.'.format(table['table']))
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(column) for column in columns), ', '.join(['%s'] * len(columns)))
+        remaining = table['rows']
+        with connection.cursor() as cursor:
+            create_indexes = self.drop_indexes(cursor, model._meta.db_table)
+            while remaining > 0:
+                rows = json.loads(snapshot.readline())
+                cursor.executemany(sql, rows)
+                remaining -= len(rows)
+            for statement in create_indexes:
+                cursor.execute(statement)
+        logger.info('Restored %s rows of the table %s', table['rows'], table['table'])
+
+    def restore(self, path):
+        # A snapshot is consistent, the foreign key checks of the database (if any) are disabled while the
+        # rows are replaced, outside of the transaction as SQLite requires
+        with gzip.open(path, 'rt', encoding='utf-8') as snapshot, connection.constraint_checks_disabled(), \
+                transaction.atomic():
+            self.read_header(snapshot)
+            with connection.cursor() as cursor:
+                for model in [LogEntry, StatsMarker, ApiToken] + MODELS[::-1]:
+                    cursor.execute('DELETE FROM {}'.format(connection.ops.quote_name(model._meta.db_table)))
+            for model in MODELS:
+                self.restore_table(snapshot, model)
+            with connection.cursor() as cursor:
+                for statement in connection.ops.sequence_reset_sql(no_style(), MODELS):
+                    cursor.execute(statement)
+            leaderboard.invalidate()
+        # The cached responses and stats refer to the replaced data
+        cache.clear()
+
+    def handle(self, *args, **options):
+        logger.info("Executing the snapshot command, action: %s, path: %s", options['action'], options['path'])
+        try:
+            if options['action'] == 'dump':
+                self.dump(options['path'])
+            else:
+                self.restore(options['path'])
+        except OSError as e:
+            raise CommandError('Snapshot file error: {}'.format(e))
+        logger.info('Snapshot %s has successfully completed', options['action'])
@@ -0,0 +1,286 @@
+"""
+
+Management command implementation to stress the score ingestion APIs with concurrent writes.
+
+A number of scorers, the threads of one or more worker processes, create matches between dedicated stress
+teams and record the box scores of their players (match player creates and score corrections) through the
+APIs, as the scorers of a live tournament do. The throughput of the writes, the retries of the writes which
+failed on the database lock and the time lost waiting for the lock are reported. At the end, the stats of
+the stress teams and players are verified against the recorded match scores.
+
+The writes are committed to the configured database, which must be shared by the worker processes (ex: a
+SQLite database file). The stress teams, with their players and matches, are deleted at the end unless
+--keep is given.
+
+"""
+
+import contextlib
+import logging
+import multiprocessing
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.base import UpdateError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction, OperationalError
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from tms_web import caching, stats
+from tms_web.models import Player, Team, Match
+import tms_web.constants as constants
+
+logger = logging.getLogger('django.tms_web.StressWritesLogger')
+STRESS_USER = 'tms_stress'
+MAX_BACKOFF = 0.5
+
+
+def is_lock_error(error):
+    return 'locked' in str(error) or 'deadlock' in str(error)
+
+
+class LockTimer:
+    """
+    Times the write statements executed on a database connection, and records the statements which failed on
+    the database lock. A write statement waits for the write lock of the database (ex: within the busy timeout
+    of SQLite), which dominates its time under contention.
+    """
+
+    def __init__(self):
+        self.elapsed = 0
+        self.locked = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        except OperationalError as e:
+            self.locked = self.locked or is_lock_error(e)
+            raise
+        # The failed statements are accounted with their failed attempt
+        if sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            self.elapsed += time.perf_counter() - started
+        return result
+
+
+"""
+This method calls a given function, and calls it again while it fails on the database lock, either with an
+error or with a server error response of a request whose statement failed on the lock (the transaction of the
+request is rolled back, thus it can be retried). It returns the result, the number of retries and the time
+lost to the lock: the time of the failed attempts and of the backoff before their retries.
+"""
+
+
+def retry_on_lock(rng, timer, func):
+    retries = 0
+    lock_wait = 0
+    while True:
+        timer.locked = False
+        started = time.perf_counter()
+        try:
+            result = func()
+        except OperationalError as e:
+            if not is_lock_error(e):
+                raise
+        except UpdateError:
+            # The session of a login is not saved when its statement failed on the lock
+            if not timer.locked:
+                raise
+        else:
+            if not timer.locked or getattr(result, 'status_code', None) != 500:
+                return result, retries, lock_wait
+        time.sleep(rng.uniform(0, min(MAX_BACKOFF, 0.005 * 2 ** retries)))
+        retries += 1
+        lock_wait += time.perf_counter() - started
+
+
+class LockErrorFilter(logging.Filter):
+    """
+    Drops the log records of the requests which failed on the database lock, which are retried.
+    """
+
+    def filter(self, record):
+        error = record.exc_info[1] if record.exc_info else None
+        return not (isinstance(error, OperationalError) and is_lock_error(error))
+
+
+"""
+This method silences the server errors of the requests which failed on the database lock (see retry_on_lock),
+which django.request logs with their traceback, while the other server errors are still logged.
+"""
+
+
+@contextlib.contextmanager
+def ignore_lock_errors():
+    request_logger = logging.getLogger('django.request')
+    lock_error_filter = LockErrorFilter()
+    request_logger.addFilter(lock_error_filter)
+    try:
+        yield
+    finally:
+        request_logger.removeFilter(lock_error_filter)
+
+
+def send_write(client, rng, timer, method, path, data):
+    response, retries, lock_wait = retry_on_lock(
+        rng, timer, lambda: getattr(client, method)(path, data, content_type='application/json'))
+    if response.status_code >= 300:
+        raise CommandError('{} {} failed with the status {}: {}'.format(
+            method.upper(), path, response.status_code, response.content[:200]))
+    return response, retries, lock_wait
+
+
+"""
+This method runs a scorer: it creates matches between random stress teams, records the scores of random
+players of both teams, and corrects one of the scores of each match.
+"""
+
+
+def run_scorer(task):
+    scorer, options, rosters, user_id = task
+    rng = random.Random('{}-{}'.format(options['seed'], scorer))
+    result = {'writes': 0, 'retries': 0, 'lock_wait': 0, 'latencies': []}
+    timer = LockTimer()
+
+    def write(method, path, data):
+        started = time.perf_counter()
+        response, retries, lock_wait = send_write(client, rng, timer, method, path, data)
+        result['latencies'].append(time.perf_counter() - started)
+        result['writes'] += 1
+        result['retries'] += retries
+        result['lock_wait'] += lock_wait
+        return response
+
+    try:
+        # The exceptions of the requests are signaled to the clients of all the threads, thus the failed requests
+        # are reported by their response (a server error) instead
+        client = Client(raise_request_exception=False)
+        user = User.objects.get(id=user_id)
+        match_players_name = constants.MATCHES_URL_NAME + '-' + constants.MATCH_PLAYERS_URL_NAME
+        with connection.execute_wrapper(timer):
+            _, retries, lock_wait = retry_on_lock(rng, timer, lambda: client.force_login(user))
+            result['retries'] += retries
+            result['lock_wait'] += lock_wait
+            for _ in range(options['matches']):
+                team1, team2 = rng.sample(sorted(rosters), 2)
+                match = write('post', reverse(constants.MATCHES_URL_NAME + '-list'), {
+                    'scheduled_date': '2020-09-01', 'stadium': 'Stress', 'round': Match.QUALIFYING, 'team1': team1,
+                    'team2': team2, 'team1_score': rng.randrange(10), 'team2_score': rng.randrange(10)}).json()
+                path = reverse(match_players_name, args=[match['id']])
+                recorded = []
+                for team in (team1, team2):
+                    for player in rng.sample(rosters[team], min(options['match_players'], len(rosters[team]))):
+                        write('post', path, {'match': match['id'], 'player': player, 'score': rng.randrange(5)})
+                        recorded.append(player)
+                write('put', path, {'match': match['id'], 'player': rng.choice(recorded),
+                                    'score': rng.randrange(5)})
+    finally:
+        connection.close()
+    result['lock_wait'] += timer.elapsed
+    return result
+
+
+"""
+This method runs the scorers of a worker process on a pool of threads, each thread having its own
+database connection.
+"""
+
+
+def run_scorers(tasks):
+    with override_settings(ALLOWED_HOSTS=list(settings.ALLOWED_HOSTS) + ['testserver']), ignore_lock_errors(), \
+            ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        return list(executor.map(run_scorer, tasks))
+
+
+class Command(BaseCommand):
+    help = 'Stresses the match and score ingestion APIs with concurrent writes, and verifies the stats afterwards'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=8, help='Number of stress teams')
+        parser.add_argument('--players-per-team', type=int, default=12, help='Number of players of each team')
+        parser.add_argument('--processes', type=int, default=1, help='Number of worker processes')
+        parser.add_argument('--threads', type=int, default=8, help='Number of scorer threads of each process')
+        parser.add_argument('--matches', type=int, default=10, help='Number of matches created by each scorer')
+        parser.add_argument('--match-players', type=int, default=5,
+                            help='Number of players of each team recorded for a match')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random writes')
+        parser.add_argument('--keep', action='store_true', help='Keep the stress teams, players and matches')
+
+    def create_teams(self, options):
+        rosters = {}
+        with transaction.atomic():
+            for i in range(options['teams']):
+                team = Team.objects.create(name='Stress team {}'.format(i + 1))
+                rosters[team.id] = [Player.objects.create(name='Stress player {}'.format(j + 1), height=185,
+                                                          team=team).id
+                                    for j in range(options['players_per_team'])]
+        return rosters
+
+    def delete_teams(self, rosters):
+        Team.objects.filter(id__in=rosters).delete()
+        caching.invalidate(caching.TEAMS, caching.TEAM_NAMES, caching.PLAYERS, caching.PLAYER_NAMES, caching.MATCHES)
+
+    def run(self, options, rosters, user):
+        tasks = [(scorer, options, rosters, user.id) for scorer in range(options['processes'] * options['threads'])]
+        chunks = [tasks[i::options['processes']] for i in range(options['processes'])]
+        started = time.perf_counter()
+        if options['processes'] == 1:
+            results = run_scorers(chunks[0])
+        else:
+            # The worker processes must not share the connections of this process
+            connections.close_all()
+            with multiprocessing.Pool(options['processes'], initializer=django.setup) as pool:
+                results = [result for chunk in pool.map(run_scorers, chunks) for result in chunk]
+        return results, time.perf_counter() - started
+
+    def report(self, results, elapsed):
+        writes = sum(result['writes'] for result in results)
+        latencies = sorted(latency * 1000 for result in results for latency in result['latencies'])
+        self.stdout.write('{} writes in {:.2f} s: {:.1f} writes/s, p50 {:.2f} ms, p95 {:.2f} ms'.format(
+            writes, elapsed, writes / elapsed, statistics.median(latencies),
+            latencies[int(0.95 * (len(latencies) - 1))]))
+        retries = sum(result['retries'] for result in results)
+        lock_wait = sum(result['lock_wait'] for result in results)
+        self.stdout.write('{} retries on the database lock, {:.2f} s waiting for the lock (write statements and '
+                          'failed attempts)'.format(retries, lock_wait))
+
+    def verify(self, rosters):
+        stale_teams = list(stats.stale_team_stats(list(rosters)))
+        stale_players = list(stats.stale_player_stats([player for roster in rosters.values() for player in roster]))
+        for stale in stale_teams + stale_players:
+            self.stderr.write('{} {}: total score {}, matches {}, average score {}, expected {}, {}, {}'.format(
+                type(stale).__name__, stale.id, stale.total_score, stale.matches, stale.average_score,
+                stale.expected_total_score, stale.expected_matches, stale.expected_average_score))
+        return len(stale_teams), len(stale_players)
+
+    def handle(self, *args, **options):
+        logger.info("Executing the stress_writes command")
+        if options['teams'] < 2 or options['players_per_team'] < 1:
+            raise CommandError('At least 2 teams with a player each are required.')
+        if min(options['processes'], options['threads'], options['matches'], options['match_players']) < 1:
+            raise CommandError('The numbers of processes, threads, matches and match players must be positive.')
+        # An existing user of the same name is not deleted afterwards
+        user, created = User.objects.get_or_create(username=STRESS_USER)
+        rosters = self.create_teams(options)
+        try:
+            results, elapsed = self.run(options, rosters, user)
+            self.report(results, elapsed)
+            # The stats pending in the deferred stats mode are rebuilt first
+            stats.flush_stats()
+            stale_teams, stale_players = self.verify(rosters)
+        finally:
+            if not options['keep']:
+                self.delete_teams(rosters)
+            if created:
+                user.delete()
+        if stale_teams or stale_players:
+            raise CommandError('The stats of {} teams and {} players do not match their recorded scores.'.format(
+                stale_teams, stale_players))
+        self.stdout.write('The stats of the teams and players match their recorded scores')
+        logger.info('Write stress test has successfully completed')
@@ -0,0 +1,47 @@
+# Generated by Django 3.0.8 on 2026-10-18 18:41
+
+from django.db import migrations, models
+from django.db.models import Count, F, Func, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def average_score(total, matches):
+    # The average score expression of tms_web.stats when this migration was written, rounded to the precision
+    # of the average_score column, 0 without matches
+    field = models.DecimalField(max_digits=4, decimal_places=2)
+    average = Cast(total, models.FloatField()) / NullIf(matches, Value(0))
+    rounded = Func(Cast(average, models.DecimalField(max_digits=12, decimal_places=4)), Value(2), function='ROUND',
+                   output_field=field)
+    return Coalesce(rounded, Value(0), output_field=field)
+
+
+def populate_team_score_totals(apps, schema_editor):
+    Team = apps.get_model('tms_web', 'Team')
+    MatchTeam = apps.get_model('tms_web', 'MatchTeam')
+    teams = Team.objects.using(schema_editor.connection.alias)
+    match_teams = MatchTeam.objects.using(schema_editor.connection.alias)
+    totals = match_teams.values('team').annotate(total=Sum('score'), matches=Count('id')).order_by()
+    for row in totals:
+        teams.filter(id=row['team']).update(total_score=row['total'], matches=row['matches'])
+    teams.update(average_score=average_score(F('total_score'), F('matches')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tms_web', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='team',
+            name='matches',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='team',
+            name='total_score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_team_score_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.0.8 on 2026-10-18 18:42
+
+from django.db import migrations, models
+from django.db.models import Count, F, Func, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def average_score(total, matches):
+    # The average score expression of tms_web.stats when this migration was written, rounded to the precision
+    # of the average_score column, 0 without matches
+    field = models.DecimalField(max_digits=4, decimal_places=2)
+    average = Cast(total, models.FloatField()) / NullIf(matches, Value(0))
+    rounded = Func(Cast(average, models.DecimalField(max_digits=12, decimal_places=4)), Value(2), function='ROUND',
+                   output_field=field)
+    return Coalesce(rounded, Value(0), output_field=field)
+
+
+def populate_player_score_totals(apps, schema_editor):
+    Player = apps.get_model('tms_web', 'Player')
+    MatchPlayer = apps.get_model('tms_web', 'MatchPlayer')
+    players = Player.objects.using(schema_editor.connection.alias)
+    match_players = MatchPlayer.objects.using(schema_editor.connection.alias)
+    totals = match_players.values('player').annotate(total=Sum('score'), matches=Count('id')).order_by()
+    for row in totals:
+        players.filter(id=row['player']).update(total_score=row['total'], matches=row['matches'])
+    players.update(average_score=average_score(F('total_score'), F('matches')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tms_web', '0002_team_score_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='total_score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_player_score_totals, migrations.RunPython.noop),
+    ]
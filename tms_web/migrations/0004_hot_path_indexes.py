@@ -0,0 +1,70 @@
+# Generated by Django 3.0.8 on 2026-10-18 18:54
+
+from django.db import migrations, models
+from django.db.models import Count, F, Func, Max, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def average_score(total, matches):
+    # The average score expression of tms_web.stats when this migration was written, rounded to the precision
+    # of the average_score column, 0 without matches
+    field = models.DecimalField(max_digits=4, decimal_places=2)
+    average = Cast(total, models.FloatField()) / NullIf(matches, Value(0))
+    rounded = Func(Cast(average, models.DecimalField(max_digits=12, decimal_places=4)), Value(2), function='ROUND',
+                   output_field=field)
+    return Coalesce(rounded, Value(0), output_field=field)
+
+
+def remove_duplicate_match_players(apps, schema_editor):
+    # Keep the latest MatchPlayer record of each (match, player) pair and recompute the stats of the
+    # players whose duplicates are removed, so that the unique constraint can be created.
+    players = apps.get_model('tms_web', 'Player').objects.using(schema_editor.connection.alias)
+    match_players = apps.get_model('tms_web', 'MatchPlayer').objects.using(schema_editor.connection.alias)
+    duplicates = match_players.values('match', 'player').annotate(latest=Max('id'), records=Count('id')) \
+        .filter(records__gt=1).order_by()
+    player_ids = set()
+    for row in duplicates:
+        match_players.filter(match=row['match'], player=row['player']).exclude(id=row['latest']).delete()
+        player_ids.add(row['player'])
+    if not player_ids:
+        return
+    totals = match_players.filter(player__in=player_ids).values('player') \
+        .annotate(total=Sum('score'), matches=Count('id')).order_by()
+    for row in totals:
+        players.filter(id=row['player']).update(total_score=row['total'], matches=row['matches'])
+    players.filter(id__in=player_ids).update(average_score=average_score(F('total_score'), F('matches')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tms_web', '0003_player_score_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['scheduled_date'], name='match_scheduled_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='match',
+            index=models.Index(fields=['round'], name='match_round_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchplayer',
+            index=models.Index(fields=['player', 'score'], name='match_player_player_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='matchteam',
+            index=models.Index(fields=['team', 'score'], name='match_team_team_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='player',
+            index=models.Index(fields=['team', '-average_score'], name='player_team_avg_score_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_match_players, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='matchplayer',
+            constraint=models.UniqueConstraint(fields=('match', 'player'), name='unique_match_player'),
+        ),
+    ]
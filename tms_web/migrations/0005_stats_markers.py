@@ -0,0 +1,25 @@
+# Generated by Django 3.0.8 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tms_web', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsMarker',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('team', 'Team'), ('player', 'Player')], max_length=6)),
+                ('object_id', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='statsmarker',
+            index=models.Index(fields=['kind', 'object_id'], name='stats_marker_kind_object_idx'),
+        ),
+    ]
@@ -4,10 +4,15 @@ This module defines the model objects.
 
 """
 
+import hashlib
+import secrets
+
+from django.conf import settings
 from django.db import models
 
 """
 Team model object defines a Basket ball team.
+The average score is derived from the running score total and the number of played matches.
 """
 
 
@@ -15,6 +20,8 @@ class Team(models.Model):
     id = models.BigAutoField(primary_key=True)
     name = models.CharField(max_length=100)
     average_score = models.DecimalField(default=0, decimal_places=2, max_digits=4)
+    total_score = models.IntegerField(default=0)
+    matches = models.IntegerField(default=0)
 
     def __str__(self):
         return "{}".format(self.name)
@@ -36,6 +43,7 @@ class Coach(models.Model):
 
 """
 Player model object defines a Basket ball player.
+The average score is derived from the running score total and the number of played matches.
 """
 
 
@@ -44,9 +52,16 @@ class Player(models.Model):
     name = models.CharField(max_length=200)
     height = models.DecimalField(default=0, decimal_places=2, max_digits=5)
     average_score = models.DecimalField(default=0, decimal_places=2, max_digits=4)
+    total_score = models.IntegerField(default=0)
     matches = models.IntegerField(default=0)
     team = models.ForeignKey(Team, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            # Top players of a team
+            models.Index(fields=['team', '-average_score'], name='player_team_avg_score_idx'),
+        ]
+
     def __str__(self):
         return "{}, Team: {}, Height: {}, Avg Score: {}, Matches: {}" \
             .format(self.name, self.team.name, self.height, self.average_score, self.matches)
@@ -86,6 +101,12 @@ class Match(models.Model):
     team1_score = models.PositiveIntegerField(default=0)
     team2_score = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['scheduled_date'], name='match_scheduled_date_idx'),
+            models.Index(fields=['round'], name='match_round_idx'),
+        ]
+
     def __str__(self):
         return "Match id: {}, Scheduled at: {}, Round: {}, Stadium: {}, Team1: {}, Team2: {}, Team1 Score: {}," \
                " Team2 Score : {}".format(self.id, self.scheduled_date, self.round, self.stadium,
@@ -102,6 +123,12 @@ class MatchTeam(models.Model):
     match = models.ForeignKey(Match, on_delete=models.CASCADE)
     score = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # Score aggregates of a team, covered by the index
+            models.Index(fields=['team', 'score'], name='match_team_team_score_idx'),
+        ]
+
     def __str__(self):
         return "{}, Team:{}, Score:{}".format(self.match, self.team.name, self.score)
 
@@ -116,5 +143,65 @@ class MatchPlayer(models.Model):
     match = models.ForeignKey(Match, on_delete=models.CASCADE)
     score = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['match', 'player'], name='unique_match_player'),
+        ]
+        indexes = [
+            # Score aggregates of a player, covered by the index
+            models.Index(fields=['player', 'score'], name='match_player_player_score_idx'),
+        ]
+
     def __str__(self):
         return "{}, Match:{}, Score:{}".format(self.player.name, self.match.id, self.score)
+
+
+"""
+StatsMarker model object marks the stats of a team or player to be recomputed from its recorded scores, in the
+deferred stats mode (see tms_web.stats).
+"""
+
+
+class StatsMarker(models.Model):
+    TEAM = 'team'
+    PLAYER = 'player'
+    KIND_CHOICES = [
+        (TEAM, 'Team'),
+        (PLAYER, 'Player'),
+    ]
+    kind = models.CharField(max_length=6, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            # Markers of given teams or players, deleted once their stats are rebuilt
+            models.Index(fields=['kind', 'object_id'], name='stats_marker_kind_object_idx'),
+        ]
+
+    def __str__(self):
+        return "{}:{}".format(self.kind, self.object_id)
+
+
+"""
+ApiToken model object defines an API token of a user (token authentication, see tms_web.authentication).
+Only the SHA-256 digest of a token is stored, the token itself is given to the user once when it is issued.
+"""
+
+
+class ApiToken(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, blank=True)
+    digest = models.CharField(max_length=64, unique=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def get_digest(key):
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user, name=''):
+        key = secrets.token_urlsafe(32)
+        return cls.objects.create(user=user, name=name, digest=cls.get_digest(key)), key
+
+    def __str__(self):
+        return "{}, User:{}".format(self.name or self.id, self.user)
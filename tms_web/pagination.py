@@ -0,0 +1,126 @@
+"""
+
+This module defines the pagination styles of the REST APIs.
+
+"""
+
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+
+PAGE_PAGINATION = 'page'
+CURSOR_PAGINATION = 'cursor'
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """
+    Cursor pagination keyed on the ordering of a view (its cursor_ordering attribute). Pages are fetched with
+    a range condition on the ordering instead of an offset, and no count query is executed.
+
+    The cursor pagination of DRF positions a page on the first ordering field only, and skips the records
+    sharing that value with an offset. The position of a page is the values of all of the ordering fields
+    here, which are unique when the ordering ends with the id, and compared as a row, ex:
+    name > 'Brazil' OR (name = 'Brazil' AND id > 12).
+    """
+
+    def get_ordering(self, request, queryset, view):
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor if self.cursor is not None else (0, False, None)
+        ordering = pagination._reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            try:
+                # The values of the position are validated against their fields by the lookups
+                queryset = queryset.filter(self.get_keyset_filter(ordering, current_position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        # An extra record tells whether a page follows this one
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        has_position = current_position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = has_position, following_position is not None
+            self.next_position, self.previous_position = current_position, following_position
+        else:
+            self.has_next, self.has_previous = following_position is not None, has_position
+            self.next_position, self.previous_position = following_position, current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    """
+    This method builds the condition selecting the records after a given position in the given ordering.
+    """
+
+    def get_keyset_filter(self, ordering, position):
+        values = json.loads(position)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise ValueError('Invalid position.')
+        keyset_filter = Q()
+        equal = Q()
+        for order, value in zip(ordering, values):
+            field = order.lstrip('-')
+            keyset_filter |= equal & Q(**{field + ('__lt' if order.startswith('-') else '__gt'): value})
+            equal &= Q(**{field: value})
+        return keyset_filter
+
+    def _get_position_from_instance(self, instance, ordering):
+        fields = [order.lstrip('-') for order in ordering]
+        values = [instance[field] if isinstance(instance, dict) else getattr(instance, field) for field in fields]
+        return json.dumps([str(value) for value in values], separators=(',', ':'))
+
+
+class PageNumberOrCursorPagination(pagination.BasePagination):
+    """
+    Paginates the views with page numbers, or with opaque cursors for views which define a cursor_ordering.
+    The style is selected per request with the 'pagination' query parameter (page or cursor), otherwise
+    a cursor query parameter selects the cursor style, otherwise the TMS_WEB_PAGINATION_MODE setting
+    selects the default style of such views.
+    """
+    mode_query_param = 'pagination'
+
+    def __init__(self):
+        self.paginator = pagination.PageNumberPagination()
+
+    def cursor_requested(self, request):
+        mode = request.query_params.get(self.mode_query_param)
+        if mode is None:
+            return KeysetPagination.cursor_query_param in request.query_params
+        return mode == CURSOR_PAGINATION
+
+    def use_cursor(self, request, view):
+        if getattr(view, 'cursor_ordering', None) is None:
+            return False
+        if self.mode_query_param in request.query_params or KeysetPagination.cursor_query_param in request.query_params:
+            return self.cursor_requested(request)
+        return getattr(settings, 'TMS_WEB_PAGINATION_MODE', PAGE_PAGINATION) == CURSOR_PAGINATION
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.use_cursor(request, view):
+            self.paginator = KeysetPagination()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
+
+    def to_html(self):
+        return self.paginator.to_html()
+
+    def get_results(self, data):
+        return data['results']
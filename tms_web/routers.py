@@ -0,0 +1,78 @@
+"""
+
+This module implements the database routing of the tournament management system.
+
+The safe (GET, HEAD and OPTIONS) requests of the tms_web views read from the read database, configured
+by the TMS_WEB_READ_DATABASE setting, while every write goes to the primary (default) database. Once a
+request writes, or opens a transaction on the primary database, the rest of its reads stick to the primary
+so that they observe the write.
+
+"""
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+VIEW_MODULE_PREFIX = 'tms_web.views.'
+
+_read_from_replica = ContextVar('tms_web_read_from_replica', default=False)
+
+
+def get_read_database():
+    return getattr(settings, 'TMS_WEB_READ_DATABASE', None)
+
+
+"""
+This method pins the reads of the current request to the primary database.
+"""
+
+
+def stick_to_primary():
+    _read_from_replica.set(False)
+
+
+class ReadReplicaRouter:
+    """
+    Routes the reads of the safe requests of the tms_web views to the read database.
+    """
+
+    def db_for_read(self, model, **hints):
+        read_database = get_read_database()
+        if read_database is None or not _read_from_replica.get():
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction of the primary database must observe its writes
+            return DEFAULT_DB_ALIAS
+        return read_database
+
+    def db_for_write(self, model, **hints):
+        stick_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != get_read_database()
+
+
+class ReadReplicaMiddleware:
+    """
+    Enables the read database for the safe requests of the tms_web views.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _read_from_replica.set(False)
+        try:
+            return self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in READ_METHODS and view_func.__module__.startswith(VIEW_MODULE_PREFIX):
+            _read_from_replica.set(True)
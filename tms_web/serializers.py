@@ -4,9 +4,13 @@ This module holds all the serializers used in the project.
 
 """
 
-from tms_web.models import Player, Coach, Team, Match, MatchPlayer
+import math
+
+from tms_web.models import Player, Coach, Team, Match, MatchPlayer, ApiToken
 from rest_framework import serializers
 
+import tms_web.constants as constants
+
 
 class CoachSerializer(serializers.ModelSerializer):
     team_name = serializers.ReadOnlyField(source='team.name')
@@ -55,3 +59,25 @@ class MatchPlayerSerializer(serializers.ModelSerializer):
         model = MatchPlayer
         fields = ['player', 'match', 'score', 'name']
         read_only_fields = ['name']
+
+
+class TopPlayersQuerySerializer(serializers.Serializer):
+    """
+    Validates the query parameters of the top-players APIs.
+    """
+    percentile = serializers.FloatField(min_value=0, max_value=100, default=constants.TOP_PLAYER_PERCENTILE)
+
+    def validate_percentile(self, value):
+        # NaN passes the range validators, as its comparisons are all false
+        if not math.isfinite(value):
+            raise serializers.ValidationError('A valid number is required.')
+        # The percentile is a key of the cached top-player cut-offs
+        return round(value, 2)
+
+
+class ApiTokenSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = ApiToken
+        fields = ['id', 'name', 'created']
+        read_only_fields = ['id', 'created']
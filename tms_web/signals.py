@@ -0,0 +1,49 @@
+"""
+
+This module defines the signal receivers of the tournament management system.
+
+"""
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from tms_web import leaderboard, stats
+from tms_web.models import Player
+
+"""
+Invalidates the cached top-player cut-offs of a team when one of its players is saved or deleted.
+"""
+
+
+@receiver([post_save, post_delete], sender=Player)
+def invalidate_team_top_players(sender, instance, **kwargs):
+    stats.invalidate_top_player_cutoffs([instance.team_id])
+
+
+"""
+Moves a player in the leaderboard when it is saved (ex: created or moved to another team), and removes a
+deleted player.
+"""
+
+
+@receiver([post_save, post_delete], sender=Player)
+def refresh_leaderboard(sender, instance, **kwargs):
+    leaderboard.refresh([instance.id])
+
+
+"""
+Applies the PRAGMA statements of the TMS_WEB_SQLITE_PRAGMAS setting (keyed by database alias) to every new
+SQLite connection, ex: WAL journal mode and busy timeout of the production profile.
+"""
+
+
+@receiver(connection_created)
+def set_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'TMS_WEB_SQLITE_PRAGMAS', {}).get(connection.alias, [])
+    with connection.cursor() as cursor:
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
@@ -0,0 +1,363 @@
+"""
+
+This module maintains the derived score statistics of teams and players.
+
+Each team and player keeps a running score total and a played match count, and its average score is
+derived from them inside the database. Match and match player writes apply deltas to these columns
+instead of re-aggregating the whole match history, and the rebuild functions reconcile the counters
+from the recorded match scores.
+
+In the deferred stats mode (TMS_WEB_DEFERRED_STATS setting), the writes only mark the stats of the teams and
+players as stale (StatsMarker records), and the stats worker rebuilds the marked teams and players in batches,
+each team or player once per batch however many writes marked it.
+
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Count, DecimalField, F, FloatField, Func, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from tms_web import caching, leaderboard
+from tms_web.models import Player, Team, Match, MatchPlayer, MatchTeam, StatsMarker
+
+_AVERAGE_SCORE_FIELD = DecimalField(max_digits=4, decimal_places=2)
+_AVERAGE_SCORE_PRECISION = 2
+_TOP_PLAYER_CUTOFFS_KEY = 'tms_web:top-player-cutoffs:{}:{}'
+_TOP_PLAYER_CUTOFFS_TIMEOUT = 300
+_MAX_TOP_PLAYER_CUTOFFS = 8
+STATS_BATCH_SIZE = 500
+_WRITE_STATS_SQL = ('UPDATE {table} SET total_score = CASE id {cases} END, matches = CASE id {cases} END '
+                    'WHERE id IN ({ids})')
+
+"""
+This method builds the database expression of an average score, rounded to the precision of the
+average_score columns. The average of a team or player without matches is 0.
+"""
+
+
+def average_score_expression(total, matches):
+    average = Cast(total, FloatField()) / NullIf(matches, Value(0))
+    rounded = Func(Cast(average, DecimalField(max_digits=12, decimal_places=4)), Value(_AVERAGE_SCORE_PRECISION),
+                   function='ROUND', output_field=_AVERAGE_SCORE_FIELD)
+    return Coalesce(rounded, Value(0), output_field=_AVERAGE_SCORE_FIELD)
+
+
+"""
+This method applies a score and match count delta to the stats of the objects of a given queryset
+with a single UPDATE statement, deriving the new average score from the updated counters.
+"""
+
+
+def apply_score_delta(queryset, score_delta, match_delta):
+    total = F('total_score') + score_delta
+    matches = F('matches') + match_delta
+    return queryset.update(total_score=total, matches=matches,
+                           average_score=average_score_expression(total, matches))
+
+
+"""
+This method adds (or removes, with a negative match delta) match scores to the stats of a given team, or
+marks them as stale in the deferred stats mode.
+"""
+
+
+def apply_team_score(team_id, score_delta, match_delta=1):
+    if defer_stats(team_ids=[team_id]):
+        return 0
+    return apply_score_delta(Team.objects.filter(id=team_id), score_delta, match_delta)
+
+
+"""
+This method adds a score (and optionally a played match) to the stats of a given player, invalidates the
+top-player cut-offs of the player's team and moves the player in the leaderboard, or marks the stats of the
+player as stale in the deferred stats mode.
+"""
+
+
+def apply_player_score(player, score_delta, match_delta=0):
+    if defer_stats(player_ids=[player.id]):
+        return 0
+    updated = apply_score_delta(Player.objects.filter(id=player.id), score_delta, match_delta)
+    invalidate_top_player_cutoffs([player.team_id])
+    leaderboard.refresh([player.id])
+    return updated
+
+
+def _aggregate_scores(source, key, aggregate):
+    scores = source.filter(**{key: OuterRef('pk')}).order_by().values(key).annotate(value=aggregate).values('value')
+    return Coalesce(Subquery(scores), Value(0))
+
+
+def _write_stats(model, stats_by_id, batch_size):
+    # bulk_update builds a searched CASE expression of every row, which is slow to compile and to evaluate, thus
+    # each batch is written with a simple CASE on the id. A row takes 5 parameters: its id and its two values
+    connection = connections[router.db_for_write(model)]
+    max_params = connection.features.max_query_params
+    batch_size = min(batch_size, max_params // 5) if max_params else batch_size
+    ids = list(stats_by_id)
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            cases = ' '.join(['WHEN %s THEN %s'] * len(batch))
+            cursor.execute(_WRITE_STATS_SQL.format(table=model._meta.db_table, cases=cases,
+                                                   ids=', '.join(['%s'] * len(batch))),
+                           [value for object_id in batch for value in (object_id, stats_by_id[object_id][0])] +
+                           [value for object_id in batch for value in (object_id, stats_by_id[object_id][1])] + batch)
+
+
+def _rebuild_stats(queryset, source, key, batch_size=STATS_BATCH_SIZE):
+    # Aggregate the recorded scores of the given objects in a single grouped query, and write them back in batches.
+    # The scores are read from the written database, ex: not from the read replica of a GET request
+    database = router.db_for_write(queryset.model)
+    queryset, source = queryset.using(database), source.using(database)
+    scores = source.filter(**{key + '__in': queryset.values('id')}).values(key) \
+        .annotate(total=Sum('score'), matches=Count('id')).order_by()
+    aggregates = {row[key]: (row['total'], row['matches']) for row in scores}
+    stats_by_id = {object_id: aggregates.get(object_id, (0, 0)) for object_id in queryset.values_list('id', flat=True)}
+    _write_stats(queryset.model, stats_by_id, batch_size)
+    queryset.update(average_score=average_score_expression(F('total_score'), F('matches')))
+    return len(stats_by_id)
+
+
+"""
+This method reconciles the score total, match count and average score of the given teams (all teams
+when no ids are given) with their MatchTeam records.
+"""
+
+
+def rebuild_team_stats(team_ids=None):
+    teams = Team.objects.all()
+    if team_ids is not None:
+        teams = teams.filter(id__in=team_ids)
+    return _rebuild_stats(teams, MatchTeam.objects.all(), 'team')
+
+
+"""
+This method reconciles the score total, match count and average score of the given players (all
+players when no ids are given) with their MatchPlayer records.
+"""
+
+
+def rebuild_player_stats(player_ids=None):
+    players = Player.objects.all()
+    if player_ids is not None:
+        players = players.filter(id__in=player_ids)
+    rebuilt = _rebuild_stats(players, MatchPlayer.objects.all(), 'player')
+    invalidate_top_player_cutoffs(set(players.values_list('team', flat=True)))
+    if player_ids is None:
+        leaderboard.invalidate()
+    else:
+        leaderboard.refresh(player_ids)
+    return rebuilt
+
+
+def _stale_stats(queryset, source, key):
+    queryset = queryset.annotate(expected_total_score=_aggregate_scores(source, key, Sum('score')),
+                                 expected_matches=_aggregate_scores(source, key, Count('id')))
+    queryset = queryset.annotate(expected_average_score=average_score_expression(F('expected_total_score'),
+                                                                                 F('expected_matches')))
+    return queryset.exclude(total_score=F('expected_total_score'), matches=F('expected_matches'),
+                            average_score=F('expected_average_score'))
+
+
+"""
+This method returns the given teams (all teams when no ids are given) whose score total, match count or
+average score differ from their MatchTeam records, annotated with the expected values (expected_total_score,
+expected_matches and expected_average_score).
+"""
+
+
+def stale_team_stats(team_ids=None):
+    teams = Team.objects.all()
+    if team_ids is not None:
+        teams = teams.filter(id__in=team_ids)
+    return _stale_stats(teams, MatchTeam.objects.all(), 'team')
+
+
+"""
+This method returns the given players (all players when no ids are given) whose score total, match count
+or average score differ from their MatchPlayer records, annotated with the expected values.
+"""
+
+
+def stale_player_stats(player_ids=None):
+    players = Player.objects.all()
+    if player_ids is not None:
+        players = players.filter(id__in=player_ids)
+    return _stale_stats(players, MatchPlayer.objects.all(), 'player')
+
+
+def is_deferred():
+    return getattr(settings, 'TMS_WEB_DEFERRED_STATS', False)
+
+
+"""
+This method marks the stats of the given teams and players as stale when the deferred stats mode is enabled,
+and returns whether it is.
+"""
+
+
+def defer_stats(team_ids=(), player_ids=()):
+    if not is_deferred():
+        return False
+    StatsMarker.objects.bulk_create([StatsMarker(kind=StatsMarker.TEAM, object_id=team_id) for team_id in team_ids] +
+                                    [StatsMarker(kind=StatsMarker.PLAYER, object_id=player_id)
+                                     for player_id in player_ids])
+    return True
+
+
+def get_pending_stats():
+    return {kind: StatsMarker.objects.filter(kind=kind).values('object_id').distinct().count()
+            for kind in (StatsMarker.TEAM, StatsMarker.PLAYER)}
+
+
+"""
+This method invalidates the cached responses of the given teams and players after their stats are rebuilt.
+"""
+
+
+def invalidate_stats(team_ids=(), player_ids=()):
+    if team_ids:
+        caching.invalidate(caching.TEAMS, *[caching.team(team_id) for team_id in team_ids])
+    if player_ids:
+        team_players = set(Player.objects.filter(id__in=player_ids).values_list('team', flat=True))
+        caching.invalidate(caching.PLAYERS, *[caching.player(player_id) for player_id in player_ids],
+                           *[caching.team_players(team_id) for team_id in team_players])
+
+
+"""
+This method recomputes the stats of the given teams and players from their recorded scores (or marks them as
+stale in the deferred stats mode), and invalidates their cached responses.
+"""
+
+
+def rebuild_stats(team_ids=(), player_ids=()):
+    if not defer_stats(team_ids=team_ids, player_ids=player_ids):
+        if team_ids:
+            rebuild_team_stats(team_ids)
+        if player_ids:
+            rebuild_player_stats(player_ids)
+    invalidate_stats(team_ids, player_ids)
+
+
+"""
+This method returns the ids of the teams and players whose stats include the scores of the given matches, to
+rebuild them once the matches are deleted. The stats are running totals, which the cascade deletes of the
+recorded scores do not update.
+"""
+
+
+def get_match_stats_ids(matches):
+    team_ids = {team_id for teams in Match.objects.filter(id__in=matches).values_list('team1', 'team2')
+                for team_id in teams}
+    player_ids = set(MatchPlayer.objects.filter(match__in=matches).values_list('player', flat=True))
+    return team_ids, player_ids
+
+
+"""
+This method returns the ids of the other teams and players whose stats include the scores of the matches of
+the given teams, which are deleted along with the teams.
+"""
+
+
+def get_team_stats_ids(teams):
+    matches = Match.objects.filter(Q(team1__in=teams) | Q(team2__in=teams))
+    team_ids = set(matches.exclude(team1__in=teams).values_list('team1', flat=True)) | \
+        set(matches.exclude(team2__in=teams).values_list('team2', flat=True))
+    player_ids = set(MatchPlayer.objects.filter(match__in=matches).exclude(player__team__in=teams)
+                     .values_list('player', flat=True))
+    return team_ids, player_ids
+
+
+"""
+This method rebuilds the stats of the teams and players of a batch of the oldest stats markers, in a
+transaction, and deletes their markers along with the other markers of the same teams and players (the writes
+marking them again afterwards are kept for the next batch). It returns the numbers of rebuilt teams and players.
+"""
+
+
+def process_stats_markers(batch_size=STATS_BATCH_SIZE):
+    with transaction.atomic():
+        markers = list(StatsMarker.objects.order_by('id').values_list('kind', 'object_id')[:batch_size])
+        team_ids = {object_id for kind, object_id in markers if kind == StatsMarker.TEAM}
+        player_ids = {object_id for kind, object_id in markers if kind == StatsMarker.PLAYER}
+        # The markers are read before the stats are rebuilt, thus the rebuild includes their writes
+        marker_ids = list(StatsMarker.objects.filter(kind=StatsMarker.TEAM, object_id__in=team_ids)
+                          .values_list('id', flat=True)) + \
+            list(StatsMarker.objects.filter(kind=StatsMarker.PLAYER, object_id__in=player_ids)
+                 .values_list('id', flat=True))
+        if team_ids:
+            rebuild_team_stats(team_ids)
+        if player_ids:
+            rebuild_player_stats(player_ids)
+        invalidate_stats(team_ids, player_ids)
+        for start in range(0, len(marker_ids), batch_size):
+            StatsMarker.objects.filter(id__in=marker_ids[start:start + batch_size]).delete()
+    return len(team_ids), len(player_ids)
+
+
+"""
+This method rebuilds the stats of all the marked teams and players, a batch at a time, and returns the numbers
+of rebuilt teams and players.
+"""
+
+
+def flush_stats(batch_size=STATS_BATCH_SIZE):
+    teams = players = 0
+    while True:
+        batch_teams, batch_players = process_stats_markers(batch_size)
+        if not batch_teams and not batch_players:
+            return teams, players
+        teams += batch_teams
+        players += batch_players
+
+
+"""
+This method returns the cache key of the top-player cut-offs of a given team, at the current version of the team
+players namespace (see caching), thus the cut-offs are invalidated along with the cached responses of the team
+players by the writes of any process sharing the cache. The key is computed once per request and given to both
+the get and the set of the cut-offs, so that a cut-off computed before a write is not stored as current.
+"""
+
+
+def get_top_player_cutoffs_key(team_id):
+    token, = caching.get_versions([caching.team_players(team_id)])
+    return _TOP_PLAYER_CUTOFFS_KEY.format(team_id, token)
+
+
+"""
+This method returns the cached top-player cut-off scores of a team, keyed by percentile, given the cache key
+of its cut-offs. A cut-off is the lowest average score of the top players of the team, or None when the team
+has no players.
+"""
+
+
+def get_top_player_cutoffs(key):
+    return cache.get(key, {})
+
+
+"""
+This method caches the top-player cut-off of a percentile under the given cache key of the cut-offs of a team.
+At most _MAX_TOP_PLAYER_CUTOFFS percentiles are kept per team, the oldest one is replaced by a new one.
+"""
+
+
+def set_top_player_cutoff(key, percentile, cutoff):
+    cutoffs = cache.get(key, {})
+    cutoffs.pop(percentile, None)
+    while len(cutoffs) >= _MAX_TOP_PLAYER_CUTOFFS:
+        del cutoffs[next(iter(cutoffs))]
+    cutoffs[percentile] = cutoff
+    cache.set(key, cutoffs, _TOP_PLAYER_CUTOFFS_TIMEOUT)
+
+
+"""
+This method invalidates the cached top-player cut-offs of the given teams, after the average scores or
+the rosters of the teams have changed.
+"""
+
+
+def invalidate_top_player_cutoffs(team_ids):
+    caching.invalidate(*[caching.team_players(team_id) for team_id in team_ids])
@@ -0,0 +1,88 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+from django.urls import reverse
+from model_bakery import baker
+
+from tms_web.handlers import ConcurrentReadASGIHandler
+from tms_web.models import Match, Player, Team
+import tms_web.constants as constants
+
+
+class ASGIHandlerTest(TransactionTestCase):
+    """
+    Drives the ASGI handler with concurrent requests. The requests of the thread pool use their own database
+    connections, thus the test data is committed (TransactionTestCase).
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.client.force_login(user=self.user)
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.cookie = '{}={}'.format(settings.SESSION_COOKIE_NAME, session_key)
+        self.handler = ConcurrentReadASGIHandler()
+
+    def tearDown(self):
+        self.handler.read_executor.shutdown()
+
+    async def request(self, path, method='GET'):
+        scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+                 'scheme': 'http', 'path': path, 'root_path': '', 'query_string': b'',
+                 'headers': [(b'host', b'testserver'), (b'cookie', self.cookie.encode())],
+                 'server': ('testserver', 80), 'client': ('127.0.0.1', 0)}
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        await self.handler(scope, receive, send)
+        body = b''.join(message.get('body', b'') for message in messages[1:])
+        return messages[0]['status'], body
+
+    def get_all(self, paths):
+        async def run():
+            return await asyncio.gather(*[self.request(path) for path in paths])
+        return asyncio.run(run())
+
+    def test_concurrent_reads(self):
+        teams = baker.make(Team, _quantity=3)
+        baker.make(Match, team1=teams[0], team2=teams[1])
+        paths = [reverse(constants.TEAMS_URL_NAME + '-list'), reverse(constants.MATCHES_URL_NAME + '-list'),
+                 reverse(constants.PLAYERS_URL_NAME), reverse(constants.TOP_PLAYERS_URL_NAME)] * 5
+        responses = self.get_all(paths)
+        self.assertEqual([status for status, _ in responses], [200] * len(paths))
+        self.assertEqual(json.loads(responses[0][1])['count'], 3)
+        self.assertEqual(json.loads(responses[1][1])['count'], 1)
+
+    def test_read_requests(self):
+        team = baker.make(Team)
+        requests = {
+            reverse(constants.TEAMS_URL_NAME + '-detail', args=[team.id]): True,
+            reverse(constants.TEAMS_URL_NAME + '-' + constants.TOP_PLAYERS_URL_SUFFIX, args=[team.id]): True,
+            reverse(constants.COACHES_URL_NAME): False,
+            '/tms_web/unknown/': False,
+        }
+        for path, concurrent in requests.items():
+            request = self.handler.request_class(
+                {'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'query_string': b'', 'headers': []},
+                None)
+            self.assertEqual(self.handler.is_concurrent_read(request), concurrent)
+
+    def test_streaming_response(self):
+        baker.make(Team, _quantity=2)
+        baker.make(Player, _quantity=3)
+        status, body = asyncio.run(self.request(reverse(constants.EXPORT_URL_NAME, args=['players', 'csv'])))
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body.decode().splitlines()), 1 + 3)
+
+    def test_write_request(self):
+        status, _ = asyncio.run(self.request(reverse(constants.TEAMS_URL_NAME + '-list'), method='POST'))
+        # The session authenticated write is rejected without a CSRF token by the default handler
+        self.assertEqual(status, 403)
+        self.assertEqual(Team.objects.count(), 0)
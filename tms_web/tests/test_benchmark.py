@@ -0,0 +1,52 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from tms_web.models import Match, Team
+
+
+class BenchmarkTest(TestCase):
+
+    def benchmark(self, sizes='4', **options):
+        out = StringIO()
+        call_command('benchmark', sizes=sizes, players_per_team=3, iterations=2, warmup=1, stdout=out, **options)
+        return json.loads(out.getvalue())
+
+    def test_benchmark(self):
+        team = Team.objects.create(name='Existing')
+        report = self.benchmark()
+        self.assertEqual(report['format'], 'tms-benchmark')
+        dataset = report['datasets'][0]
+        self.assertEqual(dataset['teams'], 4)
+        self.assertEqual(dataset['rows']['player'], 12)
+        names = [result['name'] for result in dataset['endpoints']]
+        self.assertIn('top players', names)
+        self.assertIn('match player create', names)
+        self.assertIn('team delete', names)
+        for result in dataset['endpoints']:
+            self.assertEqual(result['requests'], 2)
+            self.assertLessEqual(result['latency_ms']['p50'], result['latency_ms']['p99'])
+            self.assertGreater(result['queries']['mean'], 0)
+        # The generated data is rolled back
+        self.assertEqual(list(Team.objects.all()), [team])
+        self.assertEqual(Match.objects.count(), 0)
+
+    def test_benchmark_baseline(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'baseline.json')
+        with open(path, 'w') as baseline:
+            json.dump(self.benchmark(), baseline)
+        report = self.benchmark(baseline=path)
+        for result in report['datasets'][0]['endpoints']:
+            self.assertIn('p95_change', result['baseline'])
+
+    def test_benchmark_invalid_sizes(self):
+        with self.assertRaises(CommandError):
+            self.benchmark(sizes='4,x')
@@ -0,0 +1,74 @@
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+from model_bakery import baker
+
+from tms_web import stats
+from tms_web.management.commands.stress_writes import LockTimer, ignore_lock_errors, retry_on_lock, send_write
+from tms_web.models import Match, MatchPlayer, Player, Team
+import tms_web.constants as constants
+
+
+class ConcurrentScoresTest(TransactionTestCase):
+    """
+    The scorer threads use their own database connections, thus the test data is committed
+    (TransactionTestCase).
+    """
+
+    _MATCH_PLAYERS_API_NAME = constants.MATCHES_URL_NAME + '-' + constants.MATCH_PLAYERS_URL_NAME
+    _THREADS = 8
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.team, opponent = baker.make(Team, _quantity=2)
+        self.player = baker.make(Player, team=self.team, height=185)
+        self.matches = [baker.make(Match, team1=self.team, team2=opponent) for _ in range(self._THREADS)]
+
+    def send_concurrently(self, method, writes):
+        barrier = threading.Barrier(len(writes))
+
+        def send(write):
+            path, data = write
+            rng = random.Random(path + str(data))
+            timer = LockTimer()
+            client = Client(raise_request_exception=False)
+            try:
+                with connection.execute_wrapper(timer):
+                    retry_on_lock(rng, timer, lambda: client.force_login(self.user))
+                    # The writes start at the same moment
+                    barrier.wait()
+                    return send_write(client, rng, timer, method, path, data)[0].status_code
+            finally:
+                connection.close()
+
+        with ignore_lock_errors(), ThreadPoolExecutor(max_workers=len(writes)) as executor:
+            return list(executor.map(send, writes))
+
+    def assert_player_stats(self, total_score, matches):
+        self.player.refresh_from_db()
+        self.assertEqual((self.player.total_score, self.player.matches), (total_score, matches))
+        self.assertFalse(stats.stale_player_stats([self.player.id]).exists())
+
+    def test_concurrent_match_player_creates(self):
+        writes = [(reverse(self._MATCH_PLAYERS_API_NAME, args=[match.id]),
+                   {'match': match.id, 'player': self.player.id, 'score': index % 5})
+                  for index, match in enumerate(self.matches)]
+        self.assertEqual(self.send_concurrently('post', writes), [201] * self._THREADS)
+        # None of the score and match count increments is lost
+        self.assert_player_stats(sum(index % 5 for index in range(self._THREADS)), self._THREADS)
+
+    def test_concurrent_score_corrections(self):
+        match = self.matches[0]
+        baker.make(MatchPlayer, match=match, player=self.player, score=2)
+        stats.rebuild_player_stats([self.player.id])
+        path = reverse(self._MATCH_PLAYERS_API_NAME, args=[match.id])
+        writes = [(path, {'match': match.id, 'player': self.player.id, 'score': score})
+                  for score in range(self._THREADS)]
+        self.assertEqual(self.send_concurrently('put', writes), [200] * self._THREADS)
+        # The stats of the player follow the last correction of the score
+        self.assert_player_stats(MatchPlayer.objects.get(match=match, player=self.player).score, 1)
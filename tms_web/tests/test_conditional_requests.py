@@ -0,0 +1,97 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.http import http_date
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from tms_web.models import Coach, Match, Player, Team
+from tms_web.tests.test_match_api import MatchAPITest
+from tms_web.tests.test_team_api import TeamAPITest
+import tms_web.constants as constants
+
+
+@override_settings(TMS_WEB_CONDITIONAL_REQUESTS=True)
+class ConditionalRequestTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.client.force_login(user=self.user)
+        self.team = baker.make(Team, name='Brazil')
+        self.player = baker.make(Player, team=self.team)
+
+    def assert_not_modified(self, url, etag):
+        # A not modified response costs only the session authentication queries
+        with self.assertNumQueries(2):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp['ETag'], etag)
+
+    def test_not_modified(self):
+        urls = [reverse(constants.COACHES_URL_NAME), reverse(constants.PLAYERS_URL_NAME),
+                reverse(constants.PLAYER_URL_NAME, args=[self.player.id]), reverse(constants.TOP_PLAYERS_URL_NAME),
+                reverse(TeamAPITest._TEAMS_API_NAME), reverse(TeamAPITest._TEAM_API_NAME, args=[self.team.id]),
+                reverse(TeamAPITest._TEAM_PLAYERS_API_NAME, args=[self.team.id]),
+                reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[self.team.id]),
+                reverse(MatchAPITest._MATCHES_API_NAME)]
+        for url in urls:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assert_not_modified(url, resp['ETag'])
+
+    def test_modified_since_not_honoured(self):
+        # A date in seconds doesn't tell a write from a read of the same second
+        url = reverse(TeamAPITest._TEAMS_API_NAME)
+        resp = self.client.get(url)
+        self.assertNotIn('Last-Modified', resp)
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(resp.status_code, 200)
+
+    def test_collection_version_bumped_by_writes(self):
+        url = reverse(TeamAPITest._TEAMS_API_NAME)
+        match_url = reverse(MatchAPITest._MATCHES_API_NAME)
+        etag = self.client.get(url)['ETag']
+        match_etag = self.client.get(match_url)['ETag']
+        team2 = baker.make(Team, name='USA')
+        data = {'scheduled_date': '2020-08-31', 'stadium': 'Dallas', 'round': Match.QUALIFYING, 'team1': self.team.id,
+                'team2': team2.id, 'team1_score': 3, 'team2_score': 5}
+        self.client.post(match_url, data=data)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp['ETag'], etag)
+        self.assertEqual(self.client.get(match_url, HTTP_IF_NONE_MATCH=match_etag).status_code, 200)
+
+    def test_resource_version_bumped_by_writes(self):
+        url = reverse(constants.PLAYER_URL_NAME, args=[self.player.id])
+        other_player = baker.make(Player, team=self.team)
+        other_url = reverse(constants.PLAYER_URL_NAME, args=[other_player.id])
+        etag = self.client.get(url)['ETag']
+        other_etag = self.client.get(other_url)['ETag']
+        self.client.patch(url, data={'name': 'Ross'})
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assert_not_modified(other_url, other_etag)
+
+    def test_if_match(self):
+        coach = baker.make(Coach, team=self.team)
+        urls = [reverse(constants.PLAYER_URL_NAME, args=[self.player.id]),
+                reverse(TeamAPITest._TEAM_API_NAME, args=[self.team.id]),
+                reverse(constants.COACH_URL_NAME, args=[coach.id])]
+        for url in urls:
+            etag = self.client.get(url)['ETag']
+            resp = self.client.patch(url, data={'name': 'Ross'}, HTTP_IF_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotEqual(resp['ETag'], etag)
+            self.assertEqual(self.client.get(url)['ETag'], resp['ETag'])
+            resp = self.client.patch(url, data={'name': 'Mann'}, HTTP_IF_MATCH=etag)
+            self.assertEqual(resp.status_code, 412)
+            self.assertEqual(self.client.get(url).data['name'], 'Ross')
+
+    def test_conditional_requests_disabled(self):
+        url = reverse(constants.PLAYER_URL_NAME, args=[self.player.id])
+        etag = self.client.get(url)['ETag']
+        with self.settings(TMS_WEB_CONDITIONAL_REQUESTS=False):
+            resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn('ETag', resp)
+            resp = self.client.patch(url, data={'name': 'Ross'}, HTTP_IF_MATCH='"modified"')
+            self.assertEqual(resp.status_code, 200)
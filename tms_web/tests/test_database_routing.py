@@ -0,0 +1,59 @@
+from django.contrib.auth import views as auth_views
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from tms_web.models import Team
+from tms_web.routers import ReadReplicaMiddleware, ReadReplicaRouter
+from tms_web.views.team import TeamView
+
+
+@override_settings(TMS_WEB_READ_DATABASE='replica')
+class DatabaseRoutingTest(SimpleTestCase):
+    """
+    Asserts the databases chosen by the router while the middleware processes a request.
+    """
+
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, view_func, write=False):
+        routes = []
+
+        def get_response(request):
+            middleware.process_view(request, view_func, (), {})
+            routes.append(self.router.db_for_read(Team))
+            if write:
+                self.router.db_for_write(Team)
+                routes.append(self.router.db_for_read(Team))
+            return HttpResponse()
+
+        middleware = ReadReplicaMiddleware(get_response)
+        middleware(request)
+        return routes
+
+    def test_get_reads_from_replica(self):
+        view = TeamView.as_view({'get': 'list'})
+        self.assertEqual(self.route(self.factory.get('/tms_web/teams/'), view), ['replica'])
+        # The routing ends with the request
+        self.assertIsNone(self.router.db_for_read(Team))
+
+    def test_reads_after_write_stick_to_primary(self):
+        view = TeamView.as_view({'get': 'list'})
+        self.assertEqual(self.route(self.factory.get('/tms_web/teams/'), view, write=True), ['replica', None])
+
+    def test_post_reads_from_primary(self):
+        view = TeamView.as_view({'post': 'create'})
+        self.assertEqual(self.route(self.factory.post('/tms_web/teams/'), view), [None])
+
+    def test_other_views_read_from_primary(self):
+        self.assertEqual(self.route(self.factory.get('/admin/login/'), auth_views.LoginView.as_view()), [None])
+
+    @override_settings(TMS_WEB_READ_DATABASE=None)
+    def test_routing_disabled(self):
+        view = TeamView.as_view({'get': 'list'})
+        self.assertEqual(self.route(self.factory.get('/tms_web/teams/'), view), [None])
+
+    def test_replica_is_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'tms_web'))
+        self.assertTrue(self.router.allow_migrate('default', 'tms_web'))
@@ -0,0 +1,88 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from tms_web import stats
+from tms_web.models import Match, MatchPlayer, Player, StatsMarker, Team
+import tms_web.constants as constants
+
+
+@override_settings(TMS_WEB_DEFERRED_STATS=True)
+class DeferredStatsTest(APITestCase):
+    _MATCHES_API_NAME = constants.MATCHES_URL_NAME + '-list'
+    _MATCH_PLAYERS_API_NAME = constants.MATCHES_URL_NAME + '-' + constants.MATCH_PLAYERS_URL_NAME
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.client.force_login(user=self.user)
+        self.team1, self.team2 = baker.make(Team, _quantity=2)
+        self.player = baker.make(Player, team=self.team1, height=185)
+        self.match = baker.make(Match, team1=self.team1, team2=self.team2)
+
+    def post_match_player(self, score):
+        return self.client.post(reverse(self._MATCH_PLAYERS_API_NAME, args=[self.match.id]),
+                                {'match': self.match.id, 'player': self.player.id, 'score': score})
+
+    def test_deferred_match_player_stats(self):
+        resp = self.post_match_player(4)
+        self.assertEqual(resp.status_code, 201)
+        self.player.refresh_from_db()
+        self.assertEqual((self.player.total_score, self.player.matches), (0, 0))
+        resp = self.client.get(reverse(constants.STATS_FLUSH_URL_NAME))
+        self.assertEqual(resp.data, {'deferred': True, 'pending_teams': 0, 'pending_players': 1})
+        # The flush rebuilds the pending stats, for the clients reading their writes
+        resp = self.client.post(reverse(constants.STATS_FLUSH_URL_NAME))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, {'teams': 0, 'players': 1})
+        self.player.refresh_from_db()
+        self.assertEqual((self.player.total_score, self.player.matches), (4, 1))
+        self.assertFalse(StatsMarker.objects.exists())
+
+    def test_deferred_match_stats_worker(self):
+        resp = self.client.post(reverse(self._MATCHES_API_NAME), {
+            'scheduled_date': '2020-09-01', 'stadium': 'Maracana', 'round': Match.FINAL, 'team1': self.team1.id,
+            'team2': self.team2.id, 'team1_score': 80, 'team2_score': 75})
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(Team.objects.get(id=self.team1.id).matches, 0)
+        out = StringIO()
+        call_command('run_stats_worker', once=True, stdout=out)
+        self.assertIn('Rebuilt the stats of 2 teams and 0 players', out.getvalue())
+        self.assertEqual([(team.total_score, team.matches) for team in Team.objects.order_by('id')],
+                         [(80, 1), (75, 1)])
+
+    def test_stats_markers_coalesced(self):
+        self.post_match_player(1)
+        path = reverse(self._MATCH_PLAYERS_API_NAME, args=[self.match.id])
+        for score in (2, 3):
+            resp = self.client.put(path, {'match': self.match.id, 'player': self.player.id, 'score': score})
+            self.assertEqual(resp.status_code, 200)
+        self.assertEqual(StatsMarker.objects.count(), 3)
+        # The player is rebuilt once for its 3 markers
+        self.assertEqual(stats.process_stats_markers(batch_size=1), (0, 1))
+        self.assertFalse(StatsMarker.objects.exists())
+        self.player.refresh_from_db()
+        self.assertEqual((self.player.total_score, self.player.matches), (3, 1))
+        self.assertEqual(stats.process_stats_markers(), (0, 0))
+
+    def test_deferred_match_delete(self):
+        self.post_match_player(4)
+        stats.flush_stats()
+        resp = self.client.delete(reverse(constants.MATCHES_URL_NAME + '-detail', args=[self.match.id]))
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(stats.get_pending_stats(), {StatsMarker.TEAM: 2, StatsMarker.PLAYER: 1})
+        self.assertEqual(stats.flush_stats(), (2, 1))
+        self.player.refresh_from_db()
+        self.assertEqual((self.player.total_score, self.player.matches), (0, 0))
+
+    @override_settings(TMS_WEB_DEFERRED_STATS=False)
+    def test_immediate_stats(self):
+        self.post_match_player(4)
+        self.assertFalse(StatsMarker.objects.exists())
+        self.assertEqual(MatchPlayer.objects.get().player.total_score, 4)
+        resp = self.client.get(reverse(constants.STATS_FLUSH_URL_NAME))
+        self.assertEqual(resp.data, {'deferred': False, 'pending_teams': 0, 'pending_players': 0})
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from tms_web import exports
+from tms_web.models import Match, MatchPlayer, Player, Team
+import tms_web.constants as constants
+
+
+class ExportAPITest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.client.force_login(user=self.user)
+
+    def export(self, name, export_format):
+        resp = self.client.get(reverse(constants.EXPORT_URL_NAME, args=[name, export_format]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        return resp, b''.join(resp.streaming_content).decode()
+
+    def test_export_players_csv(self):
+        team = baker.make(Team, name='Brazil')
+        players = baker.make(Player, team=team, height=185, _quantity=3)
+        resp, content = self.export('players', 'csv')
+        self.assertEqual(resp['Content-Type'], 'text/csv')
+        self.assertEqual(resp['Content-Disposition'], 'attachment; filename="players.csv"')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([int(row['id']) for row in rows], [player.id for player in players])
+        self.assertEqual(rows[0]['name'], players[0].name)
+        self.assertEqual(rows[0]['team'], str(team.id))
+        self.assertEqual(rows[0]['average_score'], '0.00')
+
+    def test_export_matches_ndjson(self):
+        match = baker.make(Match, round=Match.FINAL, team1_score=5, team2_score=3)
+        resp, content = self.export('matches', 'ndjson')
+        self.assertEqual(resp['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in content.splitlines()], [{
+            'id': match.id, 'scheduled_date': str(match.scheduled_date), 'stadium': match.stadium,
+            'round': Match.FINAL, 'team1': match.team1_id, 'team2': match.team2_id, 'team1_score': 5,
+            'team2_score': 3}])
+
+    def test_export_match_players_in_chunks(self):
+        match = baker.make(Match)
+        players = baker.make(Player, _quantity=5)
+        for player in players:
+            baker.make(MatchPlayer, match=match, player=player, score=2)
+        chunk_size = exports.CHUNK_SIZE
+        exports.CHUNK_SIZE = 2
+        self.addCleanup(setattr, exports, 'CHUNK_SIZE', chunk_size)
+        _, content = self.export('match-players', 'csv')
+        lines = content.splitlines()
+        self.assertEqual(lines[0], 'id,match,player,score')
+        self.assertEqual([line.split(',')[2] for line in lines[1:]], [str(player.id) for player in players])
+
+    def test_export_unknown(self):
+        resp = self.client.get(reverse(constants.EXPORT_URL_NAME, args=['coaches', 'csv']))
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.get(reverse(constants.EXPORT_URL_NAME, args=['players', 'xml']))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_export_without_auth(self):
+        self.client.logout()
+        resp = self.client.get(reverse(constants.EXPORT_URL_NAME, args=['players', 'csv']))
+        self.assertEqual(resp.status_code, 403)
+
+    def test_export_command(self):
+        baker.make(Player, _quantity=2)
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'players.ndjson')
+        call_command('export', 'players', export_format='ndjson', output=path)
+        with open(path) as export:
+            self.assertEqual(len([json.loads(line) for line in export]), 2)
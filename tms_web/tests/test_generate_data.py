@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Count, Sum
+from django.test import TestCase
+
+from tms_web.models import Coach, Match, MatchPlayer, MatchTeam, Player, Team
+
+
+class GenerateDataTest(TestCase):
+
+    def generate(self, **options):
+        call_command('generate_data', seed=7, shared_password=True, **options)
+
+    def test_generate_data(self):
+        self.generate(teams=6, players_per_team=12, seasons=2)
+        self.assertEqual(Team.objects.count(), 6)
+        self.assertEqual(Coach.objects.count(), 6)
+        self.assertEqual(Player.objects.count(), 72)
+        # The league admin, coaches and players
+        self.assertEqual(User.objects.count(), 1 + 6 + 72)
+        self.assertTrue(User.objects.get(username='eric_matific').check_password('pwd'))
+        self.assertTrue(User.objects.exclude(username='eric_matific').first().check_password('pwd'))
+        # A knockout tournament of n teams has n - 1 matches
+        self.assertEqual(Match.objects.count(), 2 * 5)
+        self.assertEqual(Match.objects.filter(round=Match.FINAL).count(), 2)
+        self.assertEqual(MatchTeam.objects.count(), 2 * 5 * 2)
+        self.assertEqual(MatchPlayer.objects.count(), 2 * 5 * 2 * 10)
+
+    def test_generate_data_stats(self):
+        self.generate(teams=5, players_per_team=3, seasons=3)
+        for team in Team.objects.annotate(total=Sum('matchteam__score'), played=Count('matchteam')):
+            self.assertEqual((team.total_score, team.matches), (team.total or 0, team.played))
+        for player in Player.objects.annotate(total=Sum('matchplayer__score'), played=Count('matchplayer')):
+            self.assertEqual((player.total_score, player.matches), (player.total or 0, player.played))
+            self.assertAlmostEqual(float(player.average_score), player.total / player.played if player.played else 0,
+                                   delta=0.0051)
+
+    def test_generate_data_is_repeatable(self):
+        self.generate(teams=4, players_per_team=2)
+        first = list(MatchPlayer.objects.order_by('id').values_list('match', 'player', 'score'))
+        MatchPlayer.objects.all().delete()
+        Match.objects.all().delete()
+        Player.objects.all().delete()
+        Team.objects.all().delete()
+        User.objects.all().delete()
+        self.generate(teams=4, players_per_team=2)
+        offset = MatchPlayer.objects.order_by('id').first().match_id - first[0][0]
+        player_offset = MatchPlayer.objects.order_by('id').first().player_id - first[0][1]
+        self.assertEqual(list(MatchPlayer.objects.order_by('id').values_list('match', 'player', 'score')),
+                         [(match + offset, player + player_offset, score) for match, player, score in first])
+
+    def test_generate_data_with_workers(self):
+        self.generate(teams=9, players_per_team=3, seasons=2, chunk_size=2)
+        first = list(MatchPlayer.objects.order_by('id').values_list('id', 'match', 'player', 'score'))
+        names = list(Player.objects.order_by('id').values_list('name', flat=True))
+        for model in [MatchPlayer, Match, Player, Team, User]:
+            model.objects.all().delete()
+        self.generate(teams=9, players_per_team=3, seasons=2, chunk_size=2, workers=2)
+        offset = MatchPlayer.objects.order_by('id').first().id - first[0][0]
+        match_offset = MatchPlayer.objects.order_by('id').first().match_id - first[0][1]
+        player_offset = MatchPlayer.objects.order_by('id').first().player_id - first[0][2]
+        self.assertEqual(list(MatchPlayer.objects.order_by('id').values_list('id', 'match', 'player', 'score')),
+                         [(row_id + offset, match + match_offset, player + player_offset, score)
+                          for row_id, match, player, score in first])
+        self.assertEqual(list(Player.objects.order_by('id').values_list('name', flat=True)), names)
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from tms_web import imports, stats
+from tms_web.models import Coach, Match, MatchPlayer, Player, Team
+import tms_web.constants as constants
+
+
+class ImportAPITest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.client.force_login(user=self.user)
+
+    def post_import(self, kind, import_format, body, allow_partial=False):
+        url = reverse(constants.IMPORT_URL_NAME, args=[kind, import_format])
+        if allow_partial:
+            url += '?allow_partial=true'
+        return self.client.post(url, body, content_type='text/plain')
+
+    def test_import_players_csv(self):
+        team = baker.make(Team, name='Brazil')
+        resp = self.post_import('players', 'csv', 'name,height,team\nJohn,190,Brazil\nPaul,185,Brazil\n')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data, {'created': 2, 'rejected': []})
+        self.assertEqual(sorted(team.player_set.values_list('name', 'height')), [('John', 190), ('Paul', 185)])
+        # The primary key sequence continues after the imported ids
+        player = Player.objects.create(name='Peter', height=180, team=team)
+        self.assertEqual(player.id, Player.objects.order_by('id').values_list('id', flat=True)[2])
+
+    def test_import_players_top_players(self):
+        team = baker.make(Team, name='Brazil')
+        baker.make(Player, name='a', team=team, average_score=5)
+        url = reverse(constants.TEAMS_URL_NAME + '-' + constants.TOP_PLAYERS_URL_SUFFIX, args=[team.id])
+        self.assertEqual([player['name'] for player in self.client.get(url, {'percentile': 50}).data], ['a'])
+        resp = self.post_import('players', 'csv', 'name,height,team\nb,190,Brazil\nc,185,Brazil\nd,180,Brazil\n')
+        self.assertEqual(resp.status_code, 201)
+        # The cut-off of the team is computed again with the imported players (without matches)
+        self.assertEqual(sorted(player['name'] for player in self.client.get(url, {'percentile': 50}).data),
+                         ['a', 'b', 'c', 'd'])
+
+    def test_import_conflict(self):
+        baker.make(Team, name='Brazil')
+        with mock.patch.object(imports.LeagueImport, 'flush', side_effect=IntegrityError):
+            resp = self.post_import('players', 'csv', 'name,height,team\nJohn,190,Brazil\n')
+        self.assertEqual(resp.status_code, 409)
+        self.assertFalse(Player.objects.exists())
+
+    def test_import_matches_and_match_players_ndjson(self):
+        brazil, spain = baker.make(Team, name='Brazil'), baker.make(Team, name='Spain')
+        john = baker.make(Player, name='John', team=brazil, height=190)
+        match = {'scheduled_date': '2020-09-01', 'stadium': 'Maracana', 'round': Match.FINAL, 'team1': 'Brazil',
+                 'team2': 'Spain', 'team1_score': 80, 'team2_score': 75}
+        resp = self.post_import('matches', 'ndjson', json.dumps(match) + '\n')
+        self.assertEqual(resp.status_code, 201)
+        resp = self.post_import('match-players', 'ndjson', json.dumps({
+            'scheduled_date': '2020-09-01', 'team1': 'Brazil', 'team2': 'Spain', 'team': 'Brazil', 'player': 'John',
+            'score': 4}) + '\n')
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(MatchPlayer.objects.get().player, john)
+        brazil.refresh_from_db()
+        self.assertEqual((brazil.total_score, brazil.matches), (80, 1))
+        john.refresh_from_db()
+        self.assertEqual((john.total_score, john.matches), (4, 1))
+        self.assertFalse(stats.stale_team_stats().exists() or stats.stale_player_stats().exists())
+        self.assertEqual(spain.matches, 0)
+
+    def test_import_rejected_rows(self):
+        baker.make(Team, name='Brazil')
+        body = 'name,height,team\nJohn,190,Brazil\nPaul,tall,Brazil\nPeter,180,Spain\n'
+        resp = self.post_import('players', 'csv', body)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data['created'], 0)
+        self.assertEqual([rejected['line'] for rejected in resp.data['rejected']], [3, 4])
+        self.assertIn('height', resp.data['rejected'][0]['errors'])
+        self.assertEqual(resp.data['rejected'][1]['errors'], {'team': ['Unknown team "Spain".']})
+        self.assertFalse(Player.objects.exists())
+
+    def test_import_allow_partial(self):
+        baker.make(Team, name='Brazil')
+        resp = self.post_import('teams', 'ndjson', '{"name": "Spain"}\n{"name": "Brazil"}\n[]\n', allow_partial=True)
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp.data['created'], 1)
+        self.assertEqual([rejected['line'] for rejected in resp.data['rejected']], [2, 3])
+        self.assertEqual(sorted(Team.objects.values_list('name', flat=True)), ['Brazil', 'Spain'])
+
+    def test_import_unknown(self):
+        resp = self.post_import('users', 'csv', 'name\n')
+        self.assertEqual(resp.status_code, 404)
+        resp = self.post_import('teams', 'xml', 'name\n')
+        self.assertEqual(resp.status_code, 404)
+
+    def test_import_without_auth(self):
+        self.client.logout()
+        resp = self.post_import('teams', 'csv', 'name\nBrazil\n')
+        self.assertEqual(resp.status_code, 403)
+
+    def write_file(self, directory, name, content):
+        path = os.path.join(directory, name)
+        with open(path, 'w') as import_file:
+            import_file.write(content)
+        return path
+
+    def test_import_league_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        files = {
+            'teams': self.write_file(directory, 'teams.csv', 'name\nBrazil\nSpain\n'),
+            'coaches': self.write_file(directory, 'coaches.csv', 'name,team\nTite,Brazil\n'),
+            'players': self.write_file(directory, 'players.ndjson',
+                                       '{"name": "John", "height": 190, "team": "Brazil"}\n'
+                                       '{"name": "Pau", "height": 213, "team": "Spain"}\n'),
+            'matches': self.write_file(directory, 'matches.csv',
+                                       'scheduled_date,stadium,round,team1,team2,team1_score,team2_score\n'
+                                       '2020-09-01,Maracana,Final,Brazil,Spain,80,75\n'),
+            'match-players': self.write_file(directory, 'match-players.csv',
+                                             'scheduled_date,team1,team2,team,player,score\n'
+                                             '2020-09-01,Brazil,Spain,Spain,Pau,7\n'),
+        }
+        call_command('import_league', batch_size=1, **files)
+        self.assertEqual(Coach.objects.get().team.name, 'Brazil')
+        self.assertEqual(Player.objects.get(name='Pau').total_score, 7)
+        self.assertEqual(Team.objects.get(name='Spain').total_score, 75)
+        # A second import rejects the existing teams and rolls back
+        with self.assertRaises(CommandError):
+            call_command('import_league', teams=files['teams'], players=files['players'])
+        self.assertEqual(Player.objects.count(), 2)
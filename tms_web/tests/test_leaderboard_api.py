@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITransactionTestCase
+
+from tms_web import leaderboard
+from tms_web.models import Match, Player, Team
+import tms_web.constants as constants
+
+
+class LeaderboardAPITest(APITransactionTestCase):
+    """
+    The leaderboard is updated when the writes commit, thus the test data is committed (APITransactionTestCase).
+    """
+
+    _MATCH_PLAYERS_API_NAME = constants.MATCHES_URL_NAME + '-' + constants.MATCH_PLAYERS_URL_NAME
+
+    def setUp(self):
+        # The leaderboard of a previous test is loaded again
+        cache.clear()
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.client.force_login(user=self.user)
+        self.brazil, self.spain = baker.make(Team, name='Brazil'), baker.make(Team, name='Spain')
+        self.players = [baker.make(Player, team=team, height=185, average_score=score)
+                        for team, score in ((self.brazil, 3), (self.spain, 5), (self.brazil, 3), (self.spain, 1))]
+
+    def get_rank(self, player):
+        resp = self.client.get(reverse(constants.PLAYER_RANK_URL_NAME, args=[player.id]))
+        self.assertEqual(resp.status_code, 200)
+        return resp.data
+
+    def test_leaderboard(self):
+        resp = self.client.get(reverse(constants.LEADERBOARD_URL_NAME))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data['count'], 4)
+        # The players with the same average score share their rank and are ordered by id
+        self.assertEqual([(player['rank'], player['id']) for player in resp.data['results']],
+                         [(1, self.players[1].id), (2, self.players[0].id), (2, self.players[2].id),
+                          (4, self.players[3].id)])
+        self.assertEqual(resp.data['results'][0]['team_name'], 'Spain')
+
+    def test_leaderboard_slice(self):
+        # A page starting within players of the same average score gives them their shared rank
+        self.assertEqual(leaderboard.LeaderboardPage()[2:4], [(2, self.players[2].id), (4, self.players[3].id)])
+        self.assertEqual(len(leaderboard.LeaderboardPage(self.brazil.id)), 2)
+
+    def test_team_leaderboard(self):
+        resp = self.client.get(reverse(constants.LEADERBOARD_URL_NAME), {'team': self.spain.id})
+        self.assertEqual([(player['rank'], player['id']) for player in resp.data['results']],
+                         [(1, self.players[1].id), (2, self.players[3].id)])
+        resp = self.client.get(reverse(constants.LEADERBOARD_URL_NAME), {'team': 'Spain'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_player_rank(self):
+        self.assertEqual(self.get_rank(self.players[2]), {
+            'player': self.players[2].id, 'team': self.brazil.id, 'average_score': '3.00', 'rank': 2, 'players': 4,
+            'team_rank': 1, 'team_players': 2})
+        resp = self.client.get(reverse(constants.PLAYER_RANK_URL_NAME, args=[0]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_rank_follows_writes(self):
+        player = self.players[3]
+        match = baker.make(Match, team1=self.spain, team2=self.brazil)
+        # The player has no match yet, its average score becomes its first score
+        resp = self.client.post(reverse(self._MATCH_PLAYERS_API_NAME, args=[match.id]),
+                                {'match': match.id, 'player': player.id, 'score': 4})
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual((self.get_rank(player)['rank'], self.get_rank(player)['team_rank']), (2, 2))
+        # A player moved to another team
+        resp = self.client.patch(reverse(constants.PLAYER_URL_NAME, args=[player.id]), {'team': self.brazil.id})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((self.get_rank(player)['team'], self.get_rank(player)['team_players']), (self.brazil.id, 3))
+        # A deleted player is not ranked anymore
+        deleted_id = self.players[1].id
+        self.players[1].delete()
+        self.assertEqual(self.get_rank(player)['rank'], 1)
+        resp = self.client.get(reverse(constants.PLAYER_RANK_URL_NAME, args=[deleted_id]))
+        self.assertEqual(resp.status_code, 404)
+
+    def test_leaderboard_reloaded_after_another_process(self):
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 4)
+        # The average score is changed without a refresh, as by another process
+        Player.objects.filter(id=self.players[3].id).update(average_score=9)
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 4)
+        leaderboard.invalidate()
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 1)
+
+    def test_refresh_without_database_reads(self):
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 4)
+        Player.objects.filter(id=self.players[3].id).update(average_score=9)
+        # The refresh of a commit only marks the player, which is moved by the next read without a reload
+        with self.assertNumQueries(0):
+            leaderboard._leaderboard.refresh([self.players[3].id])
+        with mock.patch.object(leaderboard.Leaderboard, 'load') as load:
+            self.assertEqual(leaderboard.get_rank(self.players[3].id)['rank'], 1)
+        load.assert_not_called()
+
+    def test_leaderboard_reloaded_after_concurrent_write(self):
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 4)
+        # Another process changes a player and writes its version, then this process refreshes another player
+        Player.objects.filter(id=self.players[3].id).update(average_score=9)
+        cache.set(leaderboard._VERSION_KEY, 'another-process', None)
+        Player.objects.filter(id=self.players[0].id).update(average_score=0)
+        leaderboard._leaderboard.refresh([self.players[0].id])
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 1)
+        self.assertEqual(self.get_rank(self.players[0])['rank'], 4)
+
+    def test_leaderboard_follows_import(self):
+        self.assertEqual(self.get_rank(self.players[3])['players'], 4)
+        resp = self.client.post(reverse(constants.IMPORT_URL_NAME, args=['players', 'csv']),
+                                'name,height,team\nJohn,190,Brazil\n', content_type='text/plain')
+        self.assertEqual(resp.status_code, 201)
+        john = Player.objects.get(name='John')
+        self.assertEqual(self.get_rank(john), {
+            'player': john.id, 'team': self.brazil.id, 'average_score': '0.00', 'rank': 5, 'players': 5,
+            'team_rank': 3, 'team_players': 3})
+
+    def test_leaderboard_follows_generated_data(self):
+        self.assertEqual(len(leaderboard.LeaderboardPage()), 4)
+        call_command('generate_data', teams=2, players_per_team=2, seasons=0, seed=7, shared_password=True)
+        self.assertEqual(len(leaderboard.LeaderboardPage()), 8)
+
+    def test_leaderboard_follows_snapshot_restore(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'league.snapshot.gz')
+        call_command('snapshot', 'dump', path)
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 4)
+        Player.objects.filter(id=self.players[3].id).update(average_score=9)
+        leaderboard.invalidate()
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 1)
+        call_command('snapshot', 'restore', path)
+        self.client.force_login(user=self.user)
+        self.assertEqual(self.get_rank(self.players[3])['rank'], 4)
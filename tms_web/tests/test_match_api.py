@@ -1,8 +1,11 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import User
 from model_bakery import baker
 from rest_framework.test import APITestCase
 from django.urls import reverse
 
+from tms_web import stats
 from tms_web.models import Match, Team, MatchTeam, Player, MatchPlayer
 import tms_web.constants as constants
 from tms_web.tests.test_team_api import TeamAPITest
@@ -14,6 +17,7 @@ class MatchAPITest(APITestCase):
     _MATCH_API_NAME = constants.MATCHES_URL_NAME + '-detail'
     _MATCH_TEAMS_API_NAME = constants.MATCHES_URL_NAME + '-' + constants.MATCH_TEAMS_URL_NAME
     _MATCH_PLAYERS_API_NAME = constants.MATCHES_URL_NAME + '-' + constants.MATCH_PLAYERS_URL_NAME
+    _MATCHES_BULK_API_NAME = constants.MATCHES_URL_NAME + '-' + constants.BULK_URL_SUFFIX
 
     @staticmethod
     def create_test_match():
@@ -94,12 +98,70 @@ class MatchAPITest(APITestCase):
         match_id = resp.data['id']
         self.assertIsNotNone(match_id)
         self.assertEqual(len(MatchTeam.objects.all().filter(match=match_id)), 2)
+        team1 = Team.objects.get(id=data['team1'])
+        self.assertEqual(team1.total_score, 3)
+        self.assertEqual(team1.matches, 1)
+        self.assertEqual(team1.average_score, 3)
+
+    def test_match_create_updates_team_average(self):
+        data = self._get_match_data()
+        self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=data)
+        data['team1_score'] = 4
+        self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=data)
+        data['team1_score'] = 4
+        self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=data)
+        team1 = Team.objects.get(id=data['team1'])
+        self.assertEqual(team1.total_score, 11)
+        self.assertEqual(team1.matches, 3)
+        self.assertEqual(team1.average_score, Decimal('3.67'))
 
     def test_match_create_without_auth(self):
         self.client.logout()
         resp = self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=self._get_match_data())
         self.assertEqual(resp.status_code, 403)
 
+    def test_match_bulk_create(self):
+        data = self._get_match_data()
+        round_data = [data, dict(data, team1_score=7, team2_score=1),
+                      dict(data, team1=data['team2'], team2=data['team1'])]
+        resp = self.client.post(reverse(MatchAPITest._MATCHES_BULK_API_NAME), data=round_data)
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(len(resp.data['created']), 3)
+        self.assertEqual(resp.data['errors'], [])
+        for resp_data, item in zip(resp.data['created'], round_data):
+            self.assert_match_response(resp_data=resp_data, data=item)
+            self.assertEqual(len(MatchTeam.objects.filter(match=resp_data['id'])), 2)
+        self.assertEqual(Match.objects.count(), 3)
+        team1 = Team.objects.get(id=data['team1'])
+        self.assertEqual(team1.total_score, 15)
+        self.assertEqual(team1.matches, 3)
+        self.assertEqual(team1.average_score, 5)
+        self.assertEqual(Team.objects.get(id=data['team2']).average_score, 3)
+
+    def test_match_bulk_create_invalid_item(self):
+        data = self._get_match_data()
+        resp = self.client.post(reverse(MatchAPITest._MATCHES_BULK_API_NAME), data=[data, dict(data, team1=9999)])
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(len(resp.data['errors']), 1)
+        self.assertEqual(resp.data['errors'][0]['index'], 1)
+        self.assertEqual(Match.objects.count(), 0)
+
+    def test_match_bulk_create_allow_partial(self):
+        data = self._get_match_data()
+        url = reverse(MatchAPITest._MATCHES_BULK_API_NAME) + '?allow_partial=true'
+        resp = self.client.post(url, data=[dict(data, round='Unknown'), data])
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(len(resp.data['created']), 1)
+        self.assertEqual(resp.data['errors'][0]['index'], 0)
+        self.assertIn('round', resp.data['errors'][0]['errors'])
+        self.assertEqual(Match.objects.count(), 1)
+        self.assertEqual(Team.objects.get(id=data['team2']).matches, 1)
+
+    def test_match_bulk_create_without_auth(self):
+        self.client.logout()
+        resp = self.client.post(reverse(MatchAPITest._MATCHES_BULK_API_NAME), data=[self._get_match_data()])
+        self.assertEqual(resp.status_code, 403)
+
     def test_match_delete(self):
         match = MatchAPITest.create_test_match()
         resp = self.client.delete(reverse(MatchAPITest._MATCH_API_NAME, args=[match.id]))
@@ -107,6 +169,96 @@ class MatchAPITest(APITestCase):
         self.assertEqual(Match.objects.count(), 0)
         self.assertEqual(len(MatchTeam.objects.all().filter(match=match.id)), 0)
 
+    def test_match_delete_updates_team_average(self):
+        data = self._get_match_data()
+        self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=data)
+        data['team1_score'] = 8
+        resp = self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=data)
+        self.assertEqual(Team.objects.get(id=data['team1']).average_score, Decimal('5.5'))
+        self.client.delete(reverse(MatchAPITest._MATCH_API_NAME, args=[resp.data['id']]))
+        team1 = Team.objects.get(id=data['team1'])
+        self.assertEqual(team1.total_score, 3)
+        self.assertEqual(team1.matches, 1)
+        self.assertEqual(team1.average_score, 3)
+        resp = self.client.get(reverse(MatchAPITest._MATCHES_API_NAME))
+        self.client.delete(reverse(MatchAPITest._MATCH_API_NAME, args=[resp.data['results'][0]['id']]))
+        team1 = Team.objects.get(id=data['team1'])
+        self.assertEqual(team1.matches, 0)
+        self.assertEqual(team1.average_score, 0)
+
+    def test_match_delete_updates_player_stats(self):
+        data = self._get_match_data()
+        players = [baker.make(Player, team_id=data['team1'], height=185) for _ in range(2)]
+        match_ids = [self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=data).data['id']
+                     for _ in range(2)]
+        for match_id, player, score in ((match_ids[0], players[0], 4), (match_ids[0], players[1], 2),
+                                        (match_ids[1], players[0], 1)):
+            resp = self.client.post(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match_id]),
+                                    {'match': match_id, 'player': player.id, 'score': score})
+            self.assertEqual(resp.status_code, 201)
+        resp = self.client.delete(reverse(MatchAPITest._MATCH_API_NAME, args=[match_ids[0]]))
+        self.assertEqual(resp.status_code, 204)
+        self.assertFalse(MatchPlayer.objects.filter(match=match_ids[0]).exists())
+        self.assertEqual([(player.total_score, player.matches, player.average_score)
+                          for player in Player.objects.order_by('id')], [(1, 1, 1), (0, 0, 0)])
+        self.assertEqual(Team.objects.get(id=data['team1']).matches, 1)
+        self.assertFalse(stats.stale_player_stats().exists() or stats.stale_team_stats().exists())
+
+    def record_match(self, data, scores):
+        match_id = self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=data).data['id']
+        for player, score in scores:
+            resp = self.client.post(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match_id]),
+                                    {'match': match_id, 'player': player.id, 'score': score})
+            self.assertEqual(resp.status_code, 201)
+        return match_id
+
+    def test_team_delete_updates_opponent_stats(self):
+        data = self._get_match_data()
+        player1, player2 = [baker.make(Player, team_id=team_id, height=185)
+                            for team_id in (data['team1'], data['team2'])]
+        self.record_match(data, [(player1, 4), (player2, 8)])
+        third = baker.make(Team, name='Spain')
+        self.record_match(dict(data, team1=third.id, team2_score=1), [(player2, 2)])
+        resp = self.client.delete(reverse(TeamAPITest._TEAM_API_NAME, args=[data['team1']]))
+        self.assertEqual(resp.status_code, 204)
+        # The opponent and its player keep the stats of their remaining match only
+        team2 = Team.objects.get(id=data['team2'])
+        self.assertEqual((team2.total_score, team2.matches, team2.average_score), (1, 1, 1))
+        player2.refresh_from_db()
+        self.assertEqual((player2.total_score, player2.matches, player2.average_score), (2, 1, 2))
+        self.assertFalse(stats.stale_player_stats().exists() or stats.stale_team_stats().exists())
+
+    def test_admin_delete_updates_stats(self):
+        data = self._get_match_data()
+        player = baker.make(Player, team_id=data['team1'], height=185)
+        match_ids = [self.record_match(data, [(player, score)]) for score in (4, 2, 6)]
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        resp = self.client.post(reverse('admin:tms_web_match_delete', args=[match_ids[0]]), {'post': 'yes'},
+                                format='multipart')
+        self.assertEqual(resp.status_code, 302)
+        match_player = MatchPlayer.objects.get(match=match_ids[1])
+        resp = self.client.post(reverse('admin:tms_web_matchplayer_changelist'),
+                                {'action': 'delete_selected', '_selected_action': [match_player.id], 'post': 'yes'},
+                                format='multipart')
+        self.assertEqual(resp.status_code, 302)
+        player.refresh_from_db()
+        self.assertEqual((player.total_score, player.matches, player.average_score), (6, 1, 6))
+        self.assertEqual(Team.objects.get(id=data['team1']).matches, 2)
+        self.assertFalse(stats.stale_player_stats().exists() or stats.stale_team_stats().exists())
+
+    def test_rebuild_team_stats(self):
+        match = MatchAPITest.create_test_match()
+        baker.make(MatchTeam, match=match, team=match.team1, score=5)
+        baker.make(MatchTeam, match=match, team=match.team1, score=2)
+        baker.make(MatchTeam, match=match, team=match.team2, score=3)
+        stats.rebuild_team_stats()
+        team1 = Team.objects.get(id=match.team1.id)
+        self.assertEqual(team1.total_score, 7)
+        self.assertEqual(team1.matches, 2)
+        self.assertEqual(team1.average_score, Decimal('3.5'))
+        self.assertEqual(Team.objects.get(id=match.team2.id).average_score, 3)
+
     def test_match_delete_without_auth(self):
         match = MatchAPITest.create_test_match()
         self.client.logout()
@@ -122,6 +274,18 @@ class MatchAPITest(APITestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertIsNotNone(resp.data)
 
+    def test_match_players_get_with_cursor(self):
+        match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        for player in baker.make(Player, team=team, _quantity=12):
+            baker.make(MatchPlayer, player=player, match=match, score=4)
+        resp = self.client.get(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), {'pagination': 'cursor'})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.data['results']), 10)
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual(len(resp.data['results']), 2)
+        self.assertIsNone(resp.data['next'])
+
     def test_match_players_get_without_auth(self):
         match = MatchAPITest.create_test_match()
         team = baker.make(Team, name='Brazil', average_score=0)
@@ -143,6 +307,70 @@ class MatchAPITest(APITestCase):
         self.assertEqual(Player.objects.get(id=player.id).average_score, 4)
         self.assertEqual(Player.objects.get(id=player.id).matches, 1)
 
+    def test_match_player_create_duplicate(self):
+        match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        player = baker.make(Player, team=team)
+        data = {'match': match.id, 'player': player.id, 'score': 4}
+        self.client.post(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), data=data)
+        resp = self.client.post(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), data=data)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(MatchPlayer.objects.count(), 1)
+        self.assertEqual(Player.objects.get(id=player.id).matches, 1)
+
+    def test_match_players_bulk_upsert(self):
+        match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        players = baker.make(Player, team=team, _quantity=3)
+        other_match = MatchAPITest.create_test_match()
+        baker.make(MatchPlayer, player=players[0], match=other_match, score=6)
+        baker.make(MatchPlayer, player=players[1], match=match, score=1)
+        data = [{'match': match.id, 'player': player.id, 'score': score} for player, score in zip(players, [2, 3, 4])]
+        resp = self.client.post(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), data=data)
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(len(resp.data), 3)
+        self.assertEqual(MatchPlayer.objects.filter(match=match).count(), 3)
+        self.assertEqual(MatchPlayer.objects.get(match=match, player=players[1]).score, 3)
+        player = Player.objects.get(id=players[0].id)
+        self.assertEqual(player.matches, 2)
+        self.assertEqual(player.average_score, 4)
+        player = Player.objects.get(id=players[1].id)
+        self.assertEqual(player.matches, 1)
+        self.assertEqual(player.average_score, 3)
+
+    def test_match_players_bulk_upsert_invalid(self):
+        match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        player = baker.make(Player, team=team)
+        data = [{'match': match.id, 'player': player.id, 'score': 2}, {'match': match.id, 'player': 999, 'score': 1}]
+        resp = self.client.put(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), data=data)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(MatchPlayer.objects.count(), 0)
+
+    def test_match_players_bulk_upsert_order(self):
+        match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        players = baker.make(Player, team=team, _quantity=3)
+        baker.make(MatchPlayer, player=players[0], match=match, score=1)
+        data = [{'match': match.id, 'player': player.id, 'score': 2} for player in reversed(players)]
+        resp = self.client.put(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), data=data)
+        self.assertEqual(resp.status_code, 200)
+        # The updated and created records are returned in the order of the request
+        self.assertEqual([item['player'] for item in resp.data], [player.id for player in reversed(players)])
+
+    def test_match_players_bulk_upsert_other_match(self):
+        match = MatchAPITest.create_test_match()
+        other_match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        players = baker.make(Player, team=team, _quantity=2)
+        data = [{'match': match.id, 'player': players[0].id, 'score': 2},
+                {'match': other_match.id, 'player': players[1].id, 'score': 3}]
+        resp = self.client.put(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), data=data)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.data[0], {})
+        self.assertIn('match', resp.data[1])
+        self.assertFalse(MatchPlayer.objects.exists())
+
     def test_match_player_create_without_auth(self):
         match = MatchAPITest.create_test_match()
         team = baker.make(Team, name='Brazil', average_score=0)
@@ -154,8 +382,8 @@ class MatchAPITest(APITestCase):
     def test_match_player_update(self):
         match = MatchAPITest.create_test_match()
         team = baker.make(Team, name='Brazil', average_score=0)
-        player = baker.make(Player, team=team)
-        baker.make(MatchPlayer, player=player, match=match)
+        player = baker.make(Player, team=team, matches=1)
+        baker.make(MatchPlayer, player=player, match=match, score=0)
         data = {'match': match.id, 'player': player.id, 'score': 4}
         resp = self.client.put(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), data=data)
         self.assertEqual(resp.status_code, 200)
@@ -163,6 +391,79 @@ class MatchAPITest(APITestCase):
         self.assertEqual(Player.objects.get(id=player.id).average_score, 4)
         self.assertEqual(Player.objects.get(id=player.id).matches, 1)
 
+    def test_match_player_update_duplicate(self):
+        match = MatchAPITest.create_test_match()
+        other_match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        player = baker.make(Player, team=team)
+        baker.make(MatchPlayer, player=player, match=match, score=2)
+        baker.make(MatchPlayer, player=player, match=other_match, score=4)
+        # The record of the match is moved to a match for which the player is already recorded
+        data = {'match': other_match.id, 'player': player.id, 'score': 6}
+        resp = self.client.put(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]), data=data)
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn('non_field_errors', resp.data)
+        self.assertEqual(sorted(MatchPlayer.objects.values_list('score', flat=True)), [2, 4])
+
+    def test_match_player_create_and_update_running_totals(self):
+        match1 = MatchAPITest.create_test_match()
+        match2 = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        player = baker.make(Player, team=team)
+        self.client.post(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match1.id]),
+                         data={'match': match1.id, 'player': player.id, 'score': 4})
+        self.client.post(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match2.id]),
+                         data={'match': match2.id, 'player': player.id, 'score': 3})
+        player = Player.objects.get(id=player.id)
+        self.assertEqual(player.total_score, 7)
+        self.assertEqual(player.matches, 2)
+        self.assertEqual(player.average_score, Decimal('3.5'))
+        resp = self.client.put(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match2.id]),
+                               data={'match': match2.id, 'player': player.id, 'score': 6})
+        self.assertEqual(resp.status_code, 200)
+        player = Player.objects.get(id=player.id)
+        self.assertEqual(player.total_score, 10)
+        self.assertEqual(player.matches, 2)
+        self.assertEqual(player.average_score, 5)
+
+    def test_rebuild_player_stats(self):
+        match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        player = baker.make(Player, team=team, average_score=9, matches=7)
+        baker.make(MatchPlayer, player=player, match=match, score=2)
+        baker.make(MatchPlayer, player=player, match=MatchAPITest.create_test_match(), score=1)
+        stats.rebuild_player_stats([player.id])
+        player = Player.objects.get(id=player.id)
+        self.assertEqual(player.total_score, 3)
+        self.assertEqual(player.matches, 2)
+        self.assertEqual(player.average_score, Decimal('1.5'))
+
+    def test_rebuild_player_stats_in_batches(self):
+        match = MatchAPITest.create_test_match()
+        team = baker.make(Team, name='Brazil', average_score=0)
+        players = baker.make(Player, team=team, average_score=9, matches=7, _quantity=5)
+        for score, player in enumerate(players[:4]):
+            baker.make(MatchPlayer, player=player, match=match, score=score)
+        # The stats are written back 2 players at a time
+        self.assertEqual(stats._rebuild_stats(Player.objects.all(), MatchPlayer.objects.all(), 'player', 2), 5)
+        self.assertEqual(list(Player.objects.order_by('id').values_list('total_score', 'matches')),
+                         [(0, 1), (1, 1), (2, 1), (3, 1), (0, 0)])
+        self.assertFalse(stats.stale_player_stats().exists())
+
+    def test_stale_stats(self):
+        match = MatchAPITest.create_test_match()
+        player = baker.make(Player, team=match.team1, average_score=9, matches=7)
+        baker.make(MatchPlayer, player=player, match=match, score=2)
+        baker.make(MatchTeam, match=match, team=match.team1, score=5)
+        stale = stats.stale_player_stats([player.id]).get()
+        self.assertEqual((stale.expected_total_score, stale.expected_matches, stale.expected_average_score),
+                         (2, 1, 2))
+        self.assertIn(match.team1.id, [team.id for team in stats.stale_team_stats()])
+        stats.rebuild_player_stats()
+        stats.rebuild_team_stats()
+        self.assertFalse(stats.stale_player_stats().exists())
+        self.assertFalse(stats.stale_team_stats().exists())
+
     def test_match_player_update_without_auth(self):
         match = MatchAPITest.create_test_match()
         team = baker.make(Team, name='Brazil', average_score=0)
@@ -1,9 +1,14 @@
+import random
+
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from model_bakery import baker
 from rest_framework.test import APITestCase
 from django.urls import reverse
 
-from tms_web.models import Player
+from tms_web.models import Player, Team
 from tms_web.tests.test_team_api import TeamAPITest
 import tms_web.constants as constants
 
@@ -136,3 +141,80 @@ class PlayerAPITest(APITestCase):
         self.client.logout()
         resp = self.client.delete(reverse(constants.PLAYER_URL_NAME, args=[player.id]))
         self.assertEqual(resp.status_code, 403)
+
+    def _create_league(self, teams=12):
+        rng = random.Random(teams)
+        league = []
+        for i in range(teams):
+            team = baker.make(Team, name='Team {:02d}'.format(i))
+            for _ in range(rng.randint(0, 8)):
+                baker.make(Player, team=team, average_score=rng.choice([0, 1, 3.5, 4, 6, 8.25, 10]))
+            league.append(team)
+        return league
+
+    def test_top_players(self):
+        league = self._create_league()
+        for percentile in [50, 90]:
+            top_teams = []
+            url = reverse(constants.TOP_PLAYERS_URL_NAME) + '?percentile={}'.format(percentile)
+            while url:
+                resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 200)
+                top_teams.extend(resp.data['results'])
+                url = resp.data['next']
+            for team in league:
+                team_resp = self.client.get(reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[team.id]),
+                                            {'percentile': percentile})
+                expected = sorted(player['id'] for player in team_resp.data)
+                actual = [sorted(player['id'] for player in top_team['players'])
+                          for top_team in top_teams if top_team['team'] == team.id]
+                self.assertEqual(actual, [expected] if expected else [])
+            self.assertEqual([top_team['team_name'] for top_team in top_teams],
+                             sorted(top_team['team_name'] for top_team in top_teams))
+
+    def test_top_players_team_filter(self):
+        league = self._create_league(teams=4)
+        baker.make(Player, team=league[1], average_score=5)
+        baker.make(Player, team=league[3], average_score=5)
+        team_filter = '{},{}'.format(league[1].id, league[3].id)
+        resp = self.client.get(reverse(constants.TOP_PLAYERS_URL_NAME), {'team': team_filter})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([top_team['team'] for top_team in resp.data['results']], [league[1].id, league[3].id])
+
+    def test_top_players_invalid_team_filter(self):
+        resp = self.client.get(reverse(constants.TOP_PLAYERS_URL_NAME), {'team': 'Brazil'})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_top_players_invalid_percentile(self):
+        for percentile in ['nan', '-inf', 101]:
+            resp = self.client.get(reverse(constants.TOP_PLAYERS_URL_NAME), {'percentile': percentile})
+            self.assertEqual(resp.status_code, 400)
+
+    def test_top_players_without_auth(self):
+        self.client.logout()
+        resp = self.client.get(reverse(constants.TOP_PLAYERS_URL_NAME))
+        self.assertEqual(resp.status_code, 403)
+
+    def test_get_player_list_with_cursor(self):
+        players = [PlayerAPITest.create_test_player() for _ in range(25)]
+        url = reverse(constants.PLAYERS_URL_NAME) + '?pagination=cursor'
+        ids = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn('count', resp.data)
+            self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+            ids.extend(player['id'] for player in resp.data['results'])
+            url = resp.data['next']
+        self.assertEqual(ids, [player.id for player in players])
+
+    @override_settings(TMS_WEB_PAGINATION_MODE='cursor')
+    def test_get_player_list_with_cursor_by_default(self):
+        PlayerAPITest.create_test_player()
+        resp = self.client.get(reverse(constants.PLAYERS_URL_NAME))
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('count', resp.data)
+        self.assertEqual(len(resp.data['results']), 1)
+        resp = self.client.get(reverse(constants.PLAYERS_URL_NAME), {'pagination': 'page'})
+        self.assertEqual(resp.data['count'], 1)
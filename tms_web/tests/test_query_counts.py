@@ -0,0 +1,95 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from tms_web.models import Coach, Match, MatchPlayer, Player, Team
+import tms_web.constants as constants
+
+
+class QueryCountTest(APITestCase):
+    """
+    Asserts that the number of queries of every read API is independent from the size of the page and
+    the data set. The session authentication of each request costs two queries.
+    """
+
+    _DATA_SET_SIZES = [1, 12]
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.client.force_login(user=self.user)
+
+    def create_data_set(self, size):
+        cache.clear()
+        teams = baker.make(Team, _quantity=size)
+        for team in teams:
+            baker.make(Coach, team=team)
+            baker.make(Player, team=team, _quantity=size)
+        matches = [baker.make(Match, team1=teams[i], team2=teams[(i + 1) % size]) for i in range(size)]
+        for player in Player.objects.filter(team=teams[0]):
+            baker.make(MatchPlayer, match=matches[0], player=player)
+        return teams[0], matches[0]
+
+    def assert_num_queries(self, expected, get_url):
+        for size in QueryCountTest._DATA_SET_SIZES:
+            team, match = self.create_data_set(size)
+            url = get_url(team, match)
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(len(queries), expected, '{} with {} rows: {}'.format(
+                url, size, [query['sql'] for query in queries.captured_queries]))
+
+    def test_coach_list(self):
+        self.assert_num_queries(4, lambda team, match: reverse(constants.COACHES_URL_NAME))
+
+    def test_coach_detail(self):
+        self.assert_num_queries(3, lambda team, match: reverse(constants.COACH_URL_NAME, args=[team.coach.id]))
+
+    def test_player_list(self):
+        self.assert_num_queries(4, lambda team, match: reverse(constants.PLAYERS_URL_NAME))
+
+    def test_player_detail(self):
+        self.assert_num_queries(3, lambda team, match: reverse(constants.PLAYER_URL_NAME,
+                                                              args=[team.player_set.first().id]))
+
+    def test_top_players(self):
+        self.assert_num_queries(5, lambda team, match: reverse(constants.TOP_PLAYERS_URL_NAME))
+
+    def test_team_list(self):
+        self.assert_num_queries(4, lambda team, match: reverse(constants.TEAMS_URL_NAME + '-list'))
+
+    def test_team_detail(self):
+        self.assert_num_queries(3, lambda team, match: reverse(constants.TEAMS_URL_NAME + '-detail', args=[team.id]))
+
+    def test_team_players(self):
+        self.assert_num_queries(4, lambda team, match: reverse(
+            constants.TEAMS_URL_NAME + '-' + constants.TEAM_PLAYERS_URL_SUFFIX, args=[team.id]))
+
+    def test_team_top_players(self):
+        self.assert_num_queries(4, lambda team, match: reverse(
+            constants.TEAMS_URL_NAME + '-' + constants.TOP_PLAYERS_URL_SUFFIX, args=[team.id]))
+
+    def test_match_list(self):
+        self.assert_num_queries(4, lambda team, match: reverse(constants.MATCHES_URL_NAME + '-list'))
+
+    def test_match_detail(self):
+        self.assert_num_queries(3, lambda team, match: reverse(constants.MATCHES_URL_NAME + '-detail',
+                                                              args=[match.id]))
+
+    def test_match_players(self):
+        self.assert_num_queries(3, lambda team, match: reverse(
+            constants.MATCHES_URL_NAME + '-' + constants.MATCH_PLAYERS_URL_NAME, args=[match.id]))
+
+    def test_match_delete(self):
+        # The number of statements of a match deletion does not depend on its number of match players
+        for size in QueryCountTest._DATA_SET_SIZES:
+            _, match = self.create_data_set(size)
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.delete(reverse(constants.MATCHES_URL_NAME + '-detail', args=[match.id]))
+            self.assertEqual(resp.status_code, 204)
+            self.assertEqual(len(queries), 19, '{} match players: {}'.format(
+                size, [query['sql'] for query in queries.captured_queries]))
@@ -0,0 +1,51 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase
+from model_bakery import baker
+
+from tms_web import stats
+from tms_web.models import Match, MatchPlayer, MatchTeam, Player, Team
+
+
+class RebuildStatsTest(TestCase):
+
+    def setUp(self):
+        self.team1, self.team2 = baker.make(Team, _quantity=2)
+        self.players = baker.make(Player, team=self.team1, height=185, _quantity=3)
+        match = baker.make(Match, team1=self.team1, team2=self.team2, team1_score=6, team2_score=4)
+        baker.make(MatchTeam, match=match, team=self.team1, score=6)
+        baker.make(MatchTeam, match=match, team=self.team2, score=4)
+        for score, player in enumerate(self.players):
+            baker.make(MatchPlayer, match=match, player=player, score=score + 1)
+        stats.rebuild_team_stats()
+        stats.rebuild_player_stats()
+        # Drift the stats of a team and two players
+        Team.objects.filter(id=self.team2.id).update(matches=3)
+        Player.objects.filter(id__in=[player.id for player in self.players[1:]]).update(
+            total_score=F('total_score') + 5)
+
+    def rebuild_stats(self, **options):
+        out = StringIO()
+        call_command('rebuild_stats', stdout=out, **options)
+        return out.getvalue()
+
+    def test_check(self):
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, 'Found 1 teams and 2 players with drifted stats.'):
+            call_command('rebuild_stats', check=True, stdout=out)
+        self.assertIn('Team {}: total score 4, matches 3, average score 4.00, expected 4, 1, 4.00'.format(
+            self.team2.id), out.getvalue())
+        self.assertIn('Player {}: total score 7, matches 1'.format(self.players[1].id), out.getvalue())
+        # Nothing is written
+        self.assertEqual(Team.objects.get(id=self.team2.id).matches, 3)
+
+    def test_rebuild(self):
+        self.assertIn('Rebuilt 1 teams and 2 players with drifted stats', self.rebuild_stats(batch_size=1))
+        self.assertEqual([(player.total_score, player.matches) for player in Player.objects.order_by('id')],
+                         [(1, 1), (2, 1), (3, 1)])
+        self.assertEqual(Team.objects.get(id=self.team2.id).matches, 1)
+        self.assertIn('The stats of the teams and players match their recorded scores',
+                      self.rebuild_stats(check=True))
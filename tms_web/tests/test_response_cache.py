@@ -0,0 +1,97 @@
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from model_bakery import baker
+from rest_framework.test import APITestCase
+
+from tms_web import caching
+from tms_web.models import Match, Player, Team
+from tms_web.tests.test_match_api import MatchAPITest
+from tms_web.tests.test_team_api import TeamAPITest
+import tms_web.constants as constants
+
+
+@override_settings(TMS_WEB_RESPONSE_CACHE=True)
+class ResponseCacheTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        self.client.force_login(user=self.user)
+        self.team = baker.make(Team, name='Brazil')
+        self.player = baker.make(Player, team=self.team, average_score=0)
+
+    def assert_cached(self, url):
+        self.client.get(url)
+        stats = caching.get_stats()
+        # A cached response costs only the session authentication queries
+        with self.assertNumQueries(2):
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(caching.get_stats()['hits'], stats['hits'] + 1)
+        return resp
+
+    def test_cached_responses(self):
+        self.assert_cached(reverse(TeamAPITest._TEAMS_API_NAME))
+        self.assert_cached(reverse(TeamAPITest._TEAM_PLAYERS_API_NAME, args=[self.team.id]))
+        self.assert_cached(reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[self.team.id]))
+        self.assert_cached(reverse(constants.PLAYER_URL_NAME, args=[self.player.id]))
+
+    @override_settings(TMS_WEB_RESPONSE_CACHE=False)
+    def test_disabled_cache(self):
+        url = reverse(TeamAPITest._TEAMS_API_NAME)
+        self.client.get(url)
+        with self.assertNumQueries(4):
+            self.client.get(url)
+
+    def test_match_create_invalidates_teams(self):
+        url = reverse(TeamAPITest._TEAMS_API_NAME)
+        self.assert_cached(url)
+        team2 = baker.make(Team, name='USA')
+        data = {'scheduled_date': '2020-08-31', 'stadium': 'Dallas', 'round': Match.QUALIFYING, 'team1': self.team.id,
+                'team2': team2.id, 'team1_score': 3, 'team2_score': 5}
+        self.client.post(reverse(MatchAPITest._MATCHES_API_NAME), data=data)
+        resp = self.client.get(url)
+        self.assertEqual([team['average_score'] for team in resp.data['results']], [3, 5])
+
+    def test_match_player_create_invalidates_players(self):
+        player_url = reverse(constants.PLAYER_URL_NAME, args=[self.player.id])
+        team_players_url = reverse(TeamAPITest._TEAM_PLAYERS_API_NAME, args=[self.team.id])
+        self.assert_cached(player_url)
+        self.assert_cached(team_players_url)
+        match = MatchAPITest.create_test_match()
+        self.client.post(reverse(MatchAPITest._MATCH_PLAYERS_API_NAME, args=[match.id]),
+                         data={'match': match.id, 'player': self.player.id, 'score': 4})
+        self.assertEqual(self.client.get(player_url).data['average_score'], 4)
+        self.assertEqual(self.client.get(team_players_url).data[0]['matches'], 1)
+
+    def test_team_update_invalidates_team_names(self):
+        player_url = reverse(constants.PLAYER_URL_NAME, args=[self.player.id])
+        self.assert_cached(player_url)
+        self.client.patch(reverse(TeamAPITest._TEAM_API_NAME, args=[self.team.id]), data={'name': 'Chile'})
+        self.assertEqual(self.client.get(player_url).data['team_name'], 'Chile')
+
+    def test_player_update_invalidates_team_players(self):
+        team2 = baker.make(Team, name='USA')
+        team_players_url = reverse(TeamAPITest._TEAM_PLAYERS_API_NAME, args=[self.team.id])
+        team2_players_url = reverse(TeamAPITest._TEAM_PLAYERS_API_NAME, args=[team2.id])
+        self.assert_cached(team_players_url)
+        self.assert_cached(team2_players_url)
+        self.client.patch(reverse(constants.PLAYER_URL_NAME, args=[self.player.id]), data={'team': team2.id})
+        self.assertEqual(self.client.get(team_players_url).data, [])
+        self.assertEqual(len(self.client.get(team2_players_url).data), 1)
+
+    def test_player_delete_invalidates_player(self):
+        player_url = reverse(constants.PLAYER_URL_NAME, args=[self.player.id])
+        self.assert_cached(player_url)
+        self.client.delete(player_url)
+        self.assertEqual(self.client.get(player_url).status_code, 404)
+
+    def test_file_based_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            file_cache = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+            with override_settings(CACHES={'default': file_cache}):
+                self.assert_cached(reverse(TeamAPITest._TEAMS_API_NAME))
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from tms_web.models import Coach, Match, MatchPlayer, MatchTeam, Player, Team
+
+
+class SnapshotTest(TestCase):
+
+    _MODELS = [User, Team, Coach, Player, Match, MatchTeam, MatchPlayer]
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, 'league.snapshot.gz')
+        self.addCleanup(shutil.rmtree, directory)
+
+    def get_data(self):
+        return {model: list(model.objects.order_by('id').values()) for model in SnapshotTest._MODELS}
+
+    def test_dump_and_restore(self):
+        call_command('generate_data', teams=4, players_per_team=3, seasons=2, seed=3, shared_password=True)
+        data = self.get_data()
+        call_command('snapshot', 'dump', self.path)
+        Team.objects.filter(id=Team.objects.first().id).delete()
+        Player.objects.update(average_score=0)
+        User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        call_command('snapshot', 'restore', self.path)
+        self.assertEqual(self.get_data(), data)
+        self.assertTrue(User.objects.get(username='eric_matific').check_password('pwd'))
+        # The sequences continue after the restored primary keys
+        self.assertGreater(Team.objects.create(name='Peru').id, max(team['id'] for team in data[Team]))
+
+    def test_restore_invalid_file(self):
+        with open(self.path, 'wb') as snapshot:
+            snapshot.write(b'[]')
+        with self.assertRaises(CommandError):
+            call_command('snapshot', 'restore', self.path)
@@ -0,0 +1,39 @@
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from tms_web.models import Match, MatchPlayer, Team
+
+
+class StressWritesTest(TransactionTestCase):
+    """
+    The scorer threads use their own database connections, thus the stress data is committed
+    (TransactionTestCase).
+    """
+
+    def test_stress_writes(self):
+        out = StringIO()
+        call_command('stress_writes', teams=3, players_per_team=3, threads=3, matches=2, match_players=2, stdout=out)
+        # 3 scorers, 2 matches each: a match, 2 players of each team and a correction
+        self.assertIn('36 writes', out.getvalue())
+        self.assertIn('The stats of the teams and players match their recorded scores', out.getvalue())
+        # The stress data and user are deleted
+        self.assertEqual(Team.objects.count(), 0)
+        self.assertEqual(Match.objects.count(), 0)
+        self.assertEqual(MatchPlayer.objects.count(), 0)
+        self.assertFalse(User.objects.filter(username='tms_stress').exists())
+
+    def test_stress_writes_existing_user(self):
+        user = User.objects.create_user(username='tms_stress', password='pwd')
+        call_command('stress_writes', teams=2, players_per_team=2, threads=2, matches=1, match_players=1,
+                     stdout=StringIO())
+        self.assertTrue(User.objects.filter(id=user.id).exists())
+
+    def test_stress_writes_keep(self):
+        call_command('stress_writes', teams=2, players_per_team=2, threads=2, matches=1, match_players=1, keep=True,
+                     stdout=StringIO())
+        self.assertEqual(Team.objects.count(), 2)
+        self.assertEqual(Match.objects.count(), 2)
+        self.assertEqual(MatchPlayer.objects.count(), 2 * 2)
@@ -1,9 +1,19 @@
+import base64
+import random
+from unittest import mock
+from urllib.parse import urlencode
+
+import numpy as np
 from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from model_bakery import baker
 from rest_framework.test import APITestCase
 from django.urls import reverse
 
+from tms_web import stats
 from tms_web.models import Team, Player
+from tms_web.views.team import TeamView
 import tms_web.constants as constants
 
 
@@ -69,6 +79,46 @@ class TeamAPITest(APITestCase):
         self.assert_team_response(resp_data=resp.data['results'][0], team=team1)
         self.assert_team_response(resp_data=resp.data['results'][1], team=team2)
 
+    def test_get_team_list_with_cursor(self):
+        teams = [baker.make(Team, name=name) for name in ['USA', 'Brazil', 'Chile', 'Brazil'] * 4]
+        url = reverse(TeamAPITest._TEAMS_API_NAME) + '?pagination=cursor'
+        ids = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertNotIn('count', resp.data)
+            ids.extend(team['id'] for team in resp.data['results'])
+            url = resp.data['next']
+        self.assertEqual(ids, [team.id for team in sorted(teams, key=lambda team: (team.name, team.id))])
+
+    def test_team_list_cursor_keyset(self):
+        teams = [baker.make(Team, name=name) for name in ['Brazil'] * 25 + ['Argentina', 'USA']]
+        expected = [team.id for team in sorted(teams, key=lambda team: (team.name, team.id))]
+        url = reverse(TeamAPITest._TEAMS_API_NAME) + '?pagination=cursor'
+        pages = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(url)
+            # The pages within the teams of the same name are positioned by name and id, without an offset
+            self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+            pages.append([team['id'] for team in resp.data['results']])
+            url = resp.data['next']
+        self.assertEqual([team for page in pages for team in page], expected)
+        # Back to the first page
+        previous_pages = []
+        url = resp.data['previous']
+        while url:
+            resp = self.client.get(url)
+            previous_pages.insert(0, [team['id'] for team in resp.data['results']])
+            url = resp.data['previous']
+        self.assertEqual(previous_pages, pages[:-1])
+
+    def test_team_list_invalid_cursor(self):
+        url = reverse(TeamAPITest._TEAMS_API_NAME)
+        for position in ['abc', '["Brazil"]', '["Brazil","abc"]']:
+            cursor = base64.b64encode(urlencode({'p': position}).encode()).decode()
+            self.assertEqual(self.client.get(url, {'cursor': cursor}).status_code, 404)
+
     def test_team_update(self):
         team = TeamAPITest.create_test_team()
         new_name = 'Russia'
@@ -124,6 +174,93 @@ class TeamAPITest(APITestCase):
         self.assertIsNotNone(resp.data)
         self.assertEqual(len(resp.data), 1)
 
+    def assert_top_players_match_percentile(self, percentile):
+        rng = random.Random(percentile)
+        for _ in range(5):
+            team = TeamAPITest.create_test_team()
+            scores = [rng.choice([1, 2, 2.5, 4, 6, 7.25, 9]) for _ in range(rng.randint(1, 15))]
+            for score in scores:
+                baker.make(Player, team=team, average_score=score)
+            cutoff = np.percentile(np.array(scores), percentile)
+            resp = self.client.get(reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[team.id]),
+                                   {'percentile': percentile})
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(sorted(float(player['average_score']) for player in resp.data),
+                             sorted(score for score in scores if score >= cutoff))
+
+    def test_top_player_percentile(self):
+        for percentile in [0, 25, 50, 90, 100]:
+            self.assert_top_players_match_percentile(percentile)
+
+    def test_top_player_percentile_without_window_functions(self):
+        with mock.patch.object(connection.features, 'supports_over_clause', False):
+            for percentile in [0, 50, 90]:
+                self.assert_top_players_match_percentile(percentile)
+
+    def test_top_player_invalid_percentile(self):
+        team = TeamAPITest.create_test_team()
+        for percentile in ['abc', 101, -1, 'nan', 'inf']:
+            resp = self.client.get(reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[team.id]),
+                                   {'percentile': percentile})
+            self.assertEqual(resp.status_code, 400)
+
+    def get_top_player_cutoffs(self, team):
+        return stats.get_top_player_cutoffs(stats.get_top_player_cutoffs_key(team.id))
+
+    def test_top_player_cutoff_of_concurrent_write(self):
+        team = TeamAPITest.create_test_team()
+        baker.make(Player, team=team, average_score=9)
+        get_top_players_queryset = TeamView.get_top_players_queryset
+
+        def write_players(view, team_id, percentile):
+            # A write of the team players commits while the cut-off is computed
+            players = list(get_top_players_queryset(view, team_id, percentile))
+            stats.invalidate_top_player_cutoffs([team_id])
+            return players
+
+        with mock.patch.object(TeamView, 'get_top_players_queryset', write_players):
+            resp = self.client.get(reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[team.id]))
+        self.assertEqual(resp.status_code, 200)
+        # The cut-off computed before the write is not cached as current
+        self.assertEqual(self.get_top_player_cutoffs(team), {})
+
+    def test_top_player_without_players(self):
+        team = TeamAPITest.create_test_team()
+        resp = self.client.get(reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[team.id]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, [])
+
+    def test_top_player_cutoff_cache(self):
+        team = TeamAPITest.create_test_team()
+        player = baker.make(Player, team=team, average_score=9)
+        baker.make(Player, team=team, average_score=1)
+        url = reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[team.id])
+        self.assertEqual([p['id'] for p in self.client.get(url).data], [player.id])
+        self.assertEqual(self.get_top_player_cutoffs(team)[90.0], 9)
+        with self.assertNumQueries(4):
+            self.assertEqual([p['id'] for p in self.client.get(url).data], [player.id])
+        top_player = baker.make(Player, team=team, average_score=10)
+        self.assertEqual(self.get_top_player_cutoffs(team), {})
+        self.assertEqual([p['id'] for p in self.client.get(url).data], [top_player.id])
+
+    def test_top_player_percentile_normalized(self):
+        team = TeamAPITest.create_test_team()
+        baker.make(Player, team=team, average_score=9)
+        url = reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[team.id])
+        for percentile in ['50', '50.001', '49.999']:
+            self.assertEqual(self.client.get(url, {'percentile': percentile}).status_code, 200)
+        self.assertEqual(list(self.get_top_player_cutoffs(team)), [50.0])
+
+    def test_top_player_cutoff_cache_bounded(self):
+        team = TeamAPITest.create_test_team()
+        baker.make(Player, team=team, average_score=9)
+        url = reverse(TeamAPITest._TEAM_TOP_PLAYERS_API_NAME, args=[team.id])
+        for percentile in range(20):
+            self.assertEqual(self.client.get(url, {'percentile': percentile}).status_code, 200)
+        # Only the latest percentiles are kept
+        self.assertEqual(list(self.get_top_player_cutoffs(team)),
+                         [float(percentile) for percentile in range(12, 20)])
+
     def test_team_players(self):
         team = TeamAPITest.create_test_team()
         team1 = baker.make(Team, name='USA', average_score=7)
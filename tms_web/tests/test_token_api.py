@@ -0,0 +1,87 @@
+import base64
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import authentication
+from rest_framework.test import APITestCase
+
+from tms_web import authentication as tms_authentication
+from tms_web.models import ApiToken
+import tms_web.constants as constants
+
+
+class TokenAPITest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='matific', email='matific@tms.com', password='pwd')
+        tms_authentication.clear_credentials()
+
+    def basic_auth(self, password='pwd'):
+        credentials = base64.b64encode('matific:{}'.format(password).encode()).decode()
+        return 'Basic ' + credentials
+
+    def get_teams(self, auth):
+        return self.client.get(reverse(constants.TEAMS_URL_NAME + '-list'), HTTP_AUTHORIZATION=auth)
+
+    def issue_token(self, name='ci'):
+        resp = self.client.post(reverse(constants.TOKENS_URL_NAME), {'name': name},
+                                HTTP_AUTHORIZATION=self.basic_auth())
+        self.assertEqual(resp.status_code, 201)
+        return resp.data
+
+    def test_token_issue(self):
+        token = self.issue_token()
+        self.assertEqual(token['name'], 'ci')
+        # Only the digest of the token is stored
+        self.assertEqual(ApiToken.objects.get().digest, ApiToken.get_digest(token['token']))
+        self.assertEqual(self.get_teams('Token ' + token['token']).status_code, 200)
+        resp = self.client.get(reverse(constants.TOKENS_URL_NAME), HTTP_AUTHORIZATION='Token ' + token['token'])
+        self.assertEqual([(item['id'], item['name']) for item in resp.data['results']], [(token['id'], 'ci')])
+        self.assertNotIn('token', resp.data['results'][0])
+
+    def test_token_revoke(self):
+        token = self.issue_token()
+        resp = self.client.delete(reverse(constants.TOKEN_URL_NAME, args=[token['id']]),
+                                  HTTP_AUTHORIZATION=self.basic_auth())
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(self.get_teams('Token ' + token['token']).status_code, 403)
+
+    def test_token_of_another_user(self):
+        token = self.issue_token()
+        User.objects.create_user(username='eric', password='pwd')
+        self.client.login(username='eric', password='pwd')
+        resp = self.client.delete(reverse(constants.TOKEN_URL_NAME, args=[token['id']]))
+        self.assertEqual(resp.status_code, 404)
+        self.assertTrue(ApiToken.objects.exists())
+
+    def test_invalid_token(self):
+        self.assertEqual(self.get_teams('Token invalid').status_code, 403)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_teams('Token ' + ApiToken.issue(self.user)[1]).status_code, 403)
+
+    def test_token_without_auth(self):
+        resp = self.client.post(reverse(constants.TOKENS_URL_NAME), {'name': 'ci'})
+        self.assertEqual(resp.status_code, 403)
+
+    @override_settings(TMS_WEB_BASIC_AUTH_CACHE_TIMEOUT=60)
+    def test_cached_basic_auth(self):
+        with mock.patch.object(authentication, 'authenticate', wraps=authentication.authenticate) as authenticate:
+            self.assertEqual(self.get_teams(self.basic_auth()).status_code, 200)
+            self.assertEqual(self.get_teams(self.basic_auth()).status_code, 200)
+            # The password is verified once, and a wrong password is not served from the cache
+            self.assertEqual(authenticate.call_count, 1)
+            self.assertEqual(self.get_teams(self.basic_auth('wrong')).status_code, 403)
+            # The cached credentials of a changed password are verified again
+            self.user.set_password('new')
+            self.user.save()
+            self.assertEqual(self.get_teams(self.basic_auth()).status_code, 403)
+            self.assertEqual(self.get_teams(self.basic_auth('new')).status_code, 200)
+
+    def test_uncached_basic_auth(self):
+        with mock.patch.object(authentication, 'authenticate', wraps=authentication.authenticate) as authenticate:
+            self.assertEqual(self.get_teams(self.basic_auth()).status_code, 200)
+            self.assertEqual(self.get_teams(self.basic_auth()).status_code, 200)
+            self.assertEqual(authenticate.call_count, 2)
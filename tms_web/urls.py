@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from tms_web.views import team, match, player, coach
+from tms_web.views import team, match, player, coach, export, league_import, stats, token
 import tms_web.constants as constants
 
 router = routers.DefaultRouter()
@@ -13,6 +13,15 @@ urlpatterns = [
     path('coaches/', coach.CoachList.as_view(), name=constants.COACHES_URL_NAME),
     path('coaches/<int:pk>/', coach.CoachDetail.as_view(), name=constants.COACH_URL_NAME),
     path('players/', player.PlayerList.as_view(), name=constants.PLAYERS_URL_NAME),
+    path('players/top/', player.TopPlayerList.as_view(), name=constants.TOP_PLAYERS_URL_NAME),
+    path('players/leaderboard/', player.PlayerLeaderboard.as_view(), name=constants.LEADERBOARD_URL_NAME),
     path('players/<int:pk>/', player.PlayerDetail.as_view(), name=constants.PLAYER_URL_NAME),
+    path('players/<int:pk>/rank/', player.PlayerRank.as_view(), name=constants.PLAYER_RANK_URL_NAME),
+    path('exports/<slug:name>.<slug:export_format>', export.ExportView.as_view(), name=constants.EXPORT_URL_NAME),
+    path('imports/<slug:kind>.<slug:import_format>', league_import.ImportView.as_view(),
+         name=constants.IMPORT_URL_NAME),
+    path('stats/flush/', stats.StatsFlush.as_view(), name=constants.STATS_FLUSH_URL_NAME),
+    path('tokens/', token.TokenList.as_view(), name=constants.TOKENS_URL_NAME),
+    path('tokens/<int:pk>/', token.TokenDetail.as_view(), name=constants.TOKEN_URL_NAME),
     path('api-auth/', include('rest_framework.urls', namespace='rest_framework'))
 ]
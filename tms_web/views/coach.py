@@ -7,6 +7,7 @@ This module consists of REST API views of the Coach model.
 from rest_framework import generics
 from rest_framework import permissions
 
+from tms_web import caching
 from tms_web.models import Coach
 from tms_web.serializers import CoachSerializer
 
@@ -17,13 +18,38 @@ class CoachList(generics.ListCreateAPIView):
     """
     Lists and creates **Coach** resources.
     """
-    queryset = Coach.objects.all().order_by('id')
+    queryset = Coach.objects.select_related('team').order_by('id')
     serializer_class = CoachSerializer
 
+    @caching.versioned_response(caching.COACHES, caching.TEAM_NAMES)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        caching.invalidate(caching.COACHES)
+
 
 class CoachDetail(generics.RetrieveUpdateDestroyAPIView):
     """
     Lists, updates (full and partial) and deletes a given **Coach** resource.
     """
-    queryset = Coach.objects.all()
-    serializer_class = CoachSerializer
\ No newline at end of file
+    queryset = Coach.objects.select_related('team')
+    serializer_class = CoachSerializer
+
+    @caching.versioned_response(caching.coach('{pk}'), caching.TEAM_NAMES)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @caching.conditional_update(caching.coach('{pk}'), caching.TEAM_NAMES)
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        caching.invalidate(caching.COACHES, caching.coach(serializer.instance.id))
+
+    def perform_destroy(self, instance):
+        namespaces = (caching.COACHES, caching.coach(instance.id))
+        super().perform_destroy(instance)
+        caching.invalidate(*namespaces)
@@ -0,0 +1,28 @@
+"""
+
+This view module consists of the REST API streaming the exports of the players, matches and match players.
+
+"""
+
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from tms_web import exports
+
+permissions = permissions.IsAuthenticated
+
+
+class ExportView(APIView):
+    """
+    Streams all the **Player**, **Match** or **MatchPlayer** resources (players, matches and match-players
+    exports) as CSV or NDJSON, ex: exports/players.csv or exports/match-players.ndjson.
+    """
+
+    def get(self, request, name, export_format):
+        if name not in exports.EXPORTS or export_format not in exports.CONTENT_TYPES:
+            raise Http404
+        response = StreamingHttpResponse(exports.stream(name, export_format),
+                                         content_type=exports.CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(name, export_format)
+        return response
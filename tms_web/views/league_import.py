@@ -0,0 +1,55 @@
+"""
+
+This view module consists of the REST API importing the teams, coaches, players, matches or match players of
+a league from CSV or NDJSON (see tms_web.imports).
+
+"""
+
+import logging
+
+from django.db import IntegrityError, transaction
+from django.http import Http404
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from tms_web import imports
+
+permissions = permissions.IsAuthenticated
+logger = logging.getLogger('django.tms_web.ImportViewLogger')
+
+
+class ImportView(APIView):
+    """
+    Creates **Team**, **Coach**, **Player**, **Match** or **MatchPlayer** resources (teams, coaches, players,
+    matches and match-players imports) from the CSV or NDJSON rows of the request body, ex: imports/players.csv.
+    The teams, players and matches are referred to by name. The whole import is rejected if any of the rows is
+    invalid, unless the allow_partial query parameter is true, in which case the valid rows are created and the
+    rejected rows are reported by line number.
+    """
+
+    def post(self, request, kind, import_format):
+        if kind not in imports.KINDS or import_format not in imports.FORMATS:
+            raise Http404
+        allow_partial = request.query_params.get('allow_partial', 'false').lower() == 'true'
+        # The body is read a line at a time, instead of being loaded in memory
+        lines = (line.decode('utf-8') for line in request.stream or [])
+        league_import = imports.LeagueImport()
+        try:
+            with transaction.atomic():
+                league_import.import_rows(kind, imports.read_rows(lines, import_format))
+                rejected = league_import.rejected[kind]
+                if rejected and not allow_partial:
+                    transaction.set_rollback(True)
+                    return Response({'created': 0, 'rejected': rejected}, status=status.HTTP_400_BAD_REQUEST)
+                league_import.finish()
+        except UnicodeDecodeError:
+            return Response({'non_field_errors': ['The body is not UTF-8 encoded.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            # The tables are locked by the import where the database supports it (see LeagueImport.lock_table)
+            logger.exception("Exception occurred while importing the %s of a league.", kind)
+            return Response({'non_field_errors': ['The import conflicted with concurrent writes, please retry.']},
+                            status=status.HTTP_409_CONFLICT)
+        return Response({'created': league_import.created[kind], 'rejected': rejected},
+                        status=status.HTTP_201_CREATED)
@@ -5,16 +5,14 @@ This view module consists of REST API views of the Match model.
 """
 
 import logging
-from decimal import Decimal
-
-from django.db import transaction, IntegrityError
-from django.db.models import Avg
+from django.db import connection, transaction, IntegrityError
 from django.http import Http404
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from tms_web.models import Player, Team, Match, MatchPlayer, MatchTeam
+from tms_web import caching, stats
+from tms_web.models import Team, Match, MatchPlayer, MatchTeam
 from tms_web.serializers import MatchSerializer, MatchPlayerSerializer
 import tms_web.constants as constants
 
@@ -26,8 +24,17 @@ class MatchView(viewsets.ModelViewSet):
     """
     List, create, and delete **Match** resources.
     """
-    queryset = Match.objects.all().order_by('id')
+    queryset = Match.objects.select_related('team1', 'team2').order_by('id')
     serializer_class = MatchSerializer
+    cursor_ordering = ('id',)
+
+    @caching.versioned_response(caching.MATCHES, caching.TEAM_NAMES)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @caching.versioned_response(caching.match('{pk}'), caching.TEAM_NAMES)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def update(self, request, *args, **kwargs):
         return Response("Update Match operation is not supported.", status=status.HTTP_501_NOT_IMPLEMENTED)
@@ -50,6 +57,7 @@ class MatchView(viewsets.ModelViewSet):
                     # Insert MatchTeam records
                     self.insert_match_team_records(match=match_id, team1=team1, team2=team2,
                                                    score1=team1_score, score2=team2_score)
+                    caching.invalidate(caching.MATCHES)
                     return Response(serializer.data, status=status.HTTP_201_CREATED)
             except IntegrityError:
                 logger.exception("Exception occurred while creating a Match resource.")
@@ -60,76 +68,120 @@ class MatchView(viewsets.ModelViewSet):
         instance = self.get_object()
         match_id = instance.id
         logger.debug("Request received to delete a Match record, Match id= [%s]", match_id)
-        team1 = instance.team1.id
-        team2 = instance.team2.id
         try:
             with transaction.atomic():
+                # The teams and players whose stats include the match, collected before its records are deleted
+                team_ids = {instance.team1_id, instance.team2_id}
+                player_ids = set(MatchPlayer.objects.filter(match=match_id).values_list('player', flat=True))
+                # The MatchTeam and MatchPlayer records of the match have no signal receivers nor related records,
+                # thus the cascade deletes them with a single statement each, without fetching them
                 instance.delete()
-                # Delete MatchTeam records
-                self.delete_match_team_records(match=match_id, team1=team1, team2=team2)
+                stats.rebuild_stats(team_ids, player_ids)
+                caching.invalidate(caching.MATCHES, caching.match(match_id), caching.match_players(match_id))
                 return Response(status=status.HTTP_204_NO_CONTENT)
         except IntegrityError:
             logger.exception("Exception occurred while deleting the Match id: [%s]", match_id)
             return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    def insert_match_team_records(self, match, team1, team2, score1, score2):
-        # Insert match team records
-        match = Match.objects.get(id=match)
-        team_ins1 = Team.objects.get(id=team1)
-        team_ins2 = Team.objects.get(id=team2)
-        MatchTeam.objects.create(match=match, team=team_ins1, score=score1)
-        MatchTeam.objects.create(match=match, team=team_ins2, score=score2)
-        # Update the average score of the team
-        self.update_team_average(team1)
-        self.update_team_average(team2)
+    """
+    Creates a list of **Match** resources in a single transaction.
+    When the allow_partial query parameter is true, the valid matches are created and the errors of the
+    invalid ones are reported by their index, instead of rejecting the whole batch.
+    """
 
-    def delete_match_team_records(self, match, team1, team2):
-        # Delete match team records
-        MatchTeam.objects.filter(match=match).delete()
-        # Update the average score of the team
-        self.update_team_average(team1)
-        self.update_team_average(team2)
+    @action(methods=['post'], detail=False, url_path=constants.BULK_URL_SUFFIX, url_name=constants.BULK_URL_SUFFIX)
+    def bulk_create(self, request):
+        logger.debug("Request received to create a batch of Matches, data= [%s]", request.data)
+        allow_partial = request.query_params.get('allow_partial', 'false').lower() == 'true'
+        serializer = MatchSerializer(data=request.data, many=True)
+        errors = []
+        if not serializer.is_valid():
+            if not allow_partial or not isinstance(serializer.errors, list):
+                return Response({'created': [], 'errors': self.get_bulk_errors(serializer.errors)},
+                                status=status.HTTP_400_BAD_REQUEST)
+            errors = self.get_bulk_errors(serializer.errors)
+            failed = {error['index'] for error in errors}
+            serializer = MatchSerializer(data=[item for index, item in enumerate(request.data) if index not in failed],
+                                         many=True)
+            serializer.is_valid(raise_exception=True)
+        try:
+            with transaction.atomic():
+                matches = self.bulk_insert_matches(serializer.validated_data)
+                caching.invalidate(caching.MATCHES)
+                created = MatchSerializer(matches, many=True).data
+        except IntegrityError:
+            logger.exception("Exception occurred while creating a batch of Match resources.")
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response({'created': created, 'errors': errors}, status=status.HTTP_201_CREATED)
 
     """
-    This method updates the average score of a given team.
+    This method converts the errors of a list serializer into a list of per item errors.
     """
 
-    def update_team_average(self, team):
-        team_ins = Team.objects.get(id=team)
-        team_ins.average_score = self.get_team_average(team)
-        team_ins.save()
+    def get_bulk_errors(self, errors):
+        if not isinstance(errors, list):
+            return [{'index': None, 'errors': errors}]
+        return [{'index': index, 'errors': item_errors} for index, item_errors in enumerate(errors) if item_errors]
 
     """
-    This method calculates the average score of a given team.
+    This method inserts a list of validated matches and their MatchTeam records with bulk inserts, and
+    updates the average score of each affected team once.
     """
 
-    def get_team_average(self, team):
-        score = MatchTeam.objects.filter(team=team).aggregate(avg=Avg('score'))
-        if score['avg'] is not None:
-            return Decimal(score['avg'])
+    def bulk_insert_matches(self, validated_data):
+        matches = [Match(**attrs) for attrs in validated_data]
+        if connection.features.can_return_rows_from_bulk_insert:
+            Match.objects.bulk_create(matches)
+        elif connection.vendor == 'sqlite':
+            Match.objects.bulk_create(matches)
+            # SQLite holds the write lock of the transaction, thus the latest ids are the inserted ones.
+            ids = Match.objects.order_by('-id').values_list('id', flat=True)[:len(matches)]
+            for match, match_id in zip(matches, reversed(list(ids))):
+                match.id = match_id
         else:
-            return 0
+            for match in matches:
+                match.save()
+        match_teams = []
+        team_scores = {}
+        for match in matches:
+            for team, score in ((match.team1_id, match.team1_score), (match.team2_id, match.team2_score)):
+                match_teams.append(MatchTeam(match=match, team_id=team, score=score))
+                total, count = team_scores.get(team, (0, 0))
+                team_scores[team] = (total + score, count + 1)
+        MatchTeam.objects.bulk_create(match_teams)
+        # Update the average score of each team
+        for team, (total, count) in team_scores.items():
+            self.update_team_average(team, total, match_delta=count)
+        return matches
+
+    def insert_match_team_records(self, match, team1, team2, score1, score2):
+        # Insert match team records
+        match = Match.objects.get(id=match)
+        team_ins1 = Team.objects.get(id=team1)
+        team_ins2 = Team.objects.get(id=team2)
+        MatchTeam.objects.create(match=match, team=team_ins1, score=score1)
+        MatchTeam.objects.create(match=match, team=team_ins2, score=score2)
+        # Update the average score of the team
+        self.update_team_average(team1, score1)
+        self.update_team_average(team2, score2)
 
     """
-    This method updates the average score of a given player.
+    This method updates the score total, played match count and average score of a given team
+    in place, by the score of a created (or deleted) match.
     """
 
-    def update_player(self, player_id):
-        player = Player.objects.get(id=player_id)
-        player.average_score = self.get_player_average(player_id)
-        player.matches = MatchPlayer.objects.filter(player=player_id).count()
-        player.save()
+    def update_team_average(self, team, score, match_delta=1):
+        stats.apply_team_score(team, score, match_delta)
+        caching.invalidate(caching.TEAMS, caching.team(team))
 
     """
-    This method calculates the average score of a given player.
+    This method updates the score total, played match count and average score of a given player
+    in place, by the score difference of a created or updated MatchPlayer record.
     """
 
-    def get_player_average(self, player_id):
-        score = MatchPlayer.objects.filter(player=player_id).aggregate(avg=Avg('score'))
-        if score['avg'] is not None:
-            return Decimal(score['avg'])
-        else:
-            return 0
+    def update_player(self, player, score_delta, match_delta=0):
+        stats.apply_player_score(player, score_delta, match_delta)
+        caching.invalidate(caching.PLAYERS, caching.player(player.id), caching.team_players(player.team_id))
 
     def get_match_team(self, match_id, team):
         try:
@@ -137,9 +189,10 @@ class MatchView(viewsets.ModelViewSet):
         except MatchTeam.DoesNotExist:
             raise Http404
 
-    def get_match_player(self, match_id, player_id):
+    def get_match_player(self, match_id, player_id, for_update=False):
+        match_players = MatchPlayer.objects.select_for_update() if for_update else MatchPlayer.objects.all()
         try:
-            return MatchPlayer.objects.get(match=match_id, player=player_id)
+            return match_players.get(match=match_id, player=player_id)
         except MatchPlayer.DoesNotExist:
             raise Http404
 
@@ -148,46 +201,135 @@ class MatchView(viewsets.ModelViewSet):
     """
 
     @action(detail=True, url_path='players', url_name=constants.MATCH_PLAYERS_URL_NAME)
+    @caching.versioned_response(caching.match_players('{pk}'), caching.PLAYER_NAMES)
     def match_players(self, request, pk):
-        match_players = MatchPlayer.objects.filter(match=pk)
+        match_players = MatchPlayer.objects.select_related('player').only('match', 'score', 'player__name') \
+            .filter(match=pk)
+        if self.paginator.cursor_requested(request):
+            page = self.paginate_queryset(match_players)
+            return self.get_paginated_response(MatchPlayerSerializer(page, many=True).data)
         serializer = MatchPlayerSerializer(match_players, many=True)
         return Response(serializer.data)
 
     @match_players.mapping.post
     def post_match_player(self, request, pk=None):
+        if isinstance(request.data, list):
+            return self.upsert_match_players(request, pk, status.HTTP_201_CREATED)
         logger.debug("Request received to create a MatchPlayer record. data = [%s]", request.data)
         serializer = MatchPlayerSerializer(data=request.data)
         if serializer.is_valid():
-            player_id = request.data['player']
             try:
                 with transaction.atomic():
-                    serializer.save()
+                    match_player = serializer.save()
                     # Update the average score and played match count of the player
-                    self.update_player(player_id)
+                    self.update_player(match_player.player, match_player.score, match_delta=1)
+                    caching.invalidate(caching.match_players(match_player.match_id))
                     return Response(serializer.data, status=status.HTTP_201_CREATED)
             except IntegrityError:
+                if self.is_recorded(serializer.validated_data):
+                    return self.get_recorded_response()
                 logger.exception("Exception occurred while creating a MatchPlayer resource.")
                 return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @match_players.mapping.put
     def put_match_player(self, request, pk):
+        if isinstance(request.data, list):
+            return self.upsert_match_players(request, pk, status.HTTP_200_OK)
         player_id = request.data['player']
         logger.debug("Request received to update a MatchPlayer record. data = [%s]", request.data)
-        match_player = self.get_match_player(match_id=pk, player_id=player_id)
-        serializer = MatchPlayerSerializer(match_player, data=request.data)
-        if serializer.is_valid():
-            try:
-                with transaction.atomic():
-                    serializer.save()
-                    # Update the average score and played match count of the player
-                    self.update_player(player_id)
-                    return Response(serializer.data, status=status.HTTP_200_OK)
-            except IntegrityError:
-                logger.exception("Exception occurred while updating a MatchPlayer resource Match-id: [%s], "
-                                 "Player-id: [%s]", pk, player_id)
-                return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer = None
+        try:
+            with transaction.atomic():
+                # The previous score is read in the transaction of the update, with a lock of the row, so that
+                # concurrent updates of the score apply their score differences one after the other
+                match_player = self.get_match_player(match_id=pk, player_id=player_id, for_update=True)
+                previous_score = match_player.score
+                serializer = MatchPlayerSerializer(match_player, data=request.data)
+                if not serializer.is_valid():
+                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                match_player = serializer.save()
+                # Update the average score of the player
+                self.update_player(match_player.player, match_player.score - previous_score)
+                caching.invalidate(caching.match_players(pk), caching.match_players(match_player.match_id))
+                return Response(serializer.data, status=status.HTTP_200_OK)
+        except IntegrityError:
+            # The record may have been moved to another match, for which the player is already recorded
+            if serializer is not None and self.is_recorded(serializer.validated_data):
+                return self.get_recorded_response()
+            logger.exception("Exception occurred while updating a MatchPlayer resource Match-id: [%s], "
+                             "Player-id: [%s]", pk, player_id)
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    """
+    This method tells whether the player of a validated MatchPlayer is already recorded for its match, ie. the
+    write violated the unique match player constraint.
+    """
+
+    def is_recorded(self, validated_data):
+        return MatchPlayer.objects.filter(match=validated_data['match'], player=validated_data['player']).exists()
+
+    def get_recorded_response(self):
+        return Response({'non_field_errors': ['The player is already recorded for the match.']},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    """
+    Creates or updates a list of **MatchPlayer** resources (ie. the box score of a match) in a single
+    transaction, keyed by match and player.
+    """
+
+    def upsert_match_players(self, request, pk, success_status):
+        logger.debug("Request received to create or update MatchPlayer records. Match-id: [%s], data = [%s]",
+                     pk, request.data)
+        serializer = MatchPlayerSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # The box score of a match only records the players of the match in the path
+        errors = [{'match': ['The match must be the match of the path.']} if str(attrs['match'].id) != str(pk) else {}
+                  for attrs in serializer.validated_data]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                match_players = self.bulk_upsert_match_players(serializer.validated_data)
+                return Response(MatchPlayerSerializer(match_players, many=True).data, status=success_status)
+        except IntegrityError:
+            logger.exception("Exception occurred while creating or updating MatchPlayer resources of Match-id: [%s]",
+                             pk)
+            return Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    """
+    This method inserts the new and updates the existing MatchPlayer records of a list of validated
+    match players with bulk statements, and recomputes the stats of every affected player at once.
+    The records are returned in the order of the list, a player given more than once is recorded with
+    its last score.
+    """
+
+    def bulk_upsert_match_players(self, validated_data):
+        scores = {(attrs['match'].id, attrs['player'].id): attrs for attrs in validated_data}
+        keys = list(scores)
+        existing = MatchPlayer.objects.select_related('player') \
+            .filter(match__in={match for match, _ in scores}, player__in={player for _, player in scores})
+        updated = []
+        for match_player in existing:
+            attrs = scores.pop((match_player.match_id, match_player.player_id), None)
+            if attrs is not None:
+                match_player.score = attrs.get('score', 0)
+                updated.append(match_player)
+        created = [MatchPlayer(**attrs) for attrs in scores.values()]
+        MatchPlayer.objects.bulk_update(updated, ['score'])
+        MatchPlayer.objects.bulk_create(created)
+        # Update the average score and played match count of the players
+        players = {match_player.player for match_player in updated + created}
+        player_ids = {player.id for player in players}
+        if not stats.defer_stats(player_ids=player_ids):
+            stats.rebuild_player_stats(player_ids)
+        caching.invalidate(caching.PLAYERS, *[caching.player(player.id) for player in players],
+                           *{caching.team_players(player.team_id) for player in players},
+                           *{caching.match_players(match_player.match_id) for match_player in updated + created})
+        match_players = {(match_player.match_id, match_player.player_id): match_player
+                         for match_player in updated + created}
+        return [match_players[key] for key in keys]
 
     @match_players.mapping.delete
     def delete_match_player(self, request):
@@ -1,14 +1,20 @@
 """
 
-This module consists of REST API views of the Player model.
+This module consists of REST API views of the Player model and the implementation of the league-wide
+top-players and leaderboard APIs.
 
 """
 
-from rest_framework import generics
+import numpy as np
+from django.db.models import Exists, OuterRef
+from rest_framework import generics, status
 from rest_framework import permissions
+from rest_framework.views import APIView
+from rest_framework.response import Response
 
-from tms_web.models import Player
-from tms_web.serializers import PlayerSerializer
+from tms_web import caching, leaderboard, stats
+from tms_web.models import Player, Team
+from tms_web.serializers import PlayerSerializer, TopPlayersQuerySerializer
 
 permissions = permissions.IsAuthenticated
 
@@ -17,13 +23,137 @@ class PlayerList(generics.ListCreateAPIView):
     """
     Lists and creates **Player** resources.
     """
-    queryset = Player.objects.all().order_by('id')
+    queryset = Player.objects.select_related('team').order_by('id')
     serializer_class = PlayerSerializer
+    cursor_ordering = ('id',)
+
+    @caching.versioned_response(caching.PLAYERS, caching.TEAM_NAMES)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        caching.invalidate(caching.PLAYERS, caching.team_players(serializer.instance.team_id))
 
 
 class PlayerDetail(generics.RetrieveUpdateDestroyAPIView):
     """
     Lists, updates (full and partial) and deletes a given **Player** resource.
     """
-    queryset = Player.objects.all().order_by('id')
+    queryset = Player.objects.select_related('team').order_by('id')
     serializer_class = PlayerSerializer
+
+    @caching.versioned_response(caching.player('{pk}'), caching.TEAM_NAMES, cache_response=True)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @caching.conditional_update(caching.player('{pk}'), caching.TEAM_NAMES)
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        previous_team = serializer.instance.team_id
+        super().perform_update(serializer)
+        # The player may have moved from another team
+        stats.invalidate_top_player_cutoffs([previous_team])
+        caching.invalidate(caching.PLAYERS, caching.PLAYER_NAMES, caching.player(serializer.instance.id),
+                           caching.team_players(previous_team), caching.team_players(serializer.instance.team_id))
+
+    def perform_destroy(self, instance):
+        namespaces = (caching.PLAYERS, caching.PLAYER_NAMES, caching.player(instance.id),
+                      caching.team_players(instance.team_id))
+        super().perform_destroy(instance)
+        caching.invalidate(*namespaces)
+
+
+class TopPlayerList(generics.GenericAPIView):
+    """
+    Lists the top-players of every **Team** of the league (or of the teams given by the team query parameter),
+    grouped by team and paginated by team.
+    """
+    queryset = Team.objects.all().order_by('name')
+
+    @caching.versioned_response(caching.PLAYERS, caching.TEAM_NAMES)
+    def get(self, request):
+        params = TopPlayersQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        team_ids = [team for value in request.query_params.getlist('team') for team in value.split(',') if team]
+        teams = self.get_queryset()
+        if team_ids:
+            if not all(team.isdigit() for team in team_ids):
+                return Response({'team': ['A list of team ids is required.']}, status=status.HTTP_400_BAD_REQUEST)
+            teams = teams.filter(id__in=team_ids)
+        # The best players of a team are top players at any percentile, thus the teams with players are listed,
+        # and only the players of the teams of the page are read
+        page = self.paginate_queryset(teams.filter(Exists(Player.objects.filter(team=OuterRef('pk')))))
+        players = list(Player.objects.select_related('team').filter(team__in=[team.id for team in page])
+                       .order_by('-average_score'))
+        top_player_ids = self.get_top_player_ids([(player.id, player.team_id, player.average_score)
+                                                  for player in players], params.validated_data['percentile'])
+        top_players = [player for player in players if player.id in top_player_ids]
+        team_players = {team.id: [] for team in page}
+        for player in top_players:
+            team_players[player.team_id].append(player)
+        return self.get_paginated_response([
+            {'team': team.id, 'team_name': team.name,
+             'players': PlayerSerializer(team_players[team.id], many=True).data}
+            for team in page
+        ])
+
+    """
+    This method selects the top players of every team from (id, team, average score) rows in a single
+    vectorized pass. The rows are sorted by team and descending score, and a player is a top player when
+    the number of teammates with a higher average score is within (100 - percentile)% of the other players
+    of the team, the same rule as the top-players API of a team.
+    """
+
+    def get_top_player_ids(self, rows, percentile):
+        if not rows:
+            return set()
+        ids, teams, scores = (np.array(column) for column in zip(*rows))
+        scores = scores.astype(float)
+        order = np.lexsort((-scores, teams))
+        ids, teams, scores = ids[order], teams[order], scores[order]
+        index = np.arange(len(ids))
+        new_team = np.concatenate(([True], teams[1:] != teams[:-1]))
+        new_score = new_team | np.concatenate(([True], scores[1:] != scores[:-1]))
+        # Position of the first player of the team and of the first player with the same score
+        team_start = np.maximum.accumulate(np.where(new_team, index, 0))
+        score_start = np.maximum.accumulate(np.where(new_score, index, 0))
+        team_index = np.cumsum(new_team) - 1
+        team_size = np.bincount(team_index)[team_index]
+        higher = score_start - team_start
+        return set(ids[higher * 100 <= (100 - percentile) * (team_size - 1)].tolist())
+
+
+class PlayerLeaderboard(generics.GenericAPIView):
+    """
+    Lists the **Player** resources ranked by average score, league-wide or of the team given by the team query
+    parameter, paginated by rank. The players with the same average score share their rank.
+    """
+
+    @caching.versioned_response(caching.PLAYERS, caching.TEAM_NAMES)
+    def get(self, request):
+        team_id = request.query_params.get('team')
+        if team_id is not None and not team_id.isdigit():
+            return Response({'team': ['A valid team id is required.']}, status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(leaderboard.LeaderboardPage(team_id and int(team_id)))
+        players = Player.objects.select_related('team').in_bulk([player_id for _, player_id in page])
+        # A player deleted since the page was read is skipped
+        return self.get_paginated_response([
+            dict(PlayerSerializer(players[player_id]).data, rank=rank)
+            for rank, player_id in page if player_id in players
+        ])
+
+
+class PlayerRank(APIView):
+    """
+    Retrieves the league-wide and team ranks by average score of a given **Player** resource.
+    """
+
+    @caching.versioned_response(caching.PLAYERS)
+    def get(self, request, pk):
+        rank = leaderboard.get_rank(pk)
+        if rank is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(rank)
@@ -0,0 +1,30 @@
+"""
+
+This view module consists of the REST API flushing the deferred stats of the teams and players (see
+tms_web.stats).
+
+"""
+
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from tms_web import stats
+
+permissions = permissions.IsAuthenticated
+
+
+class StatsFlush(APIView):
+    """
+    Lists (GET) the numbers of **Team** and **Player** resources whose stats are pending in the deferred stats
+    mode, and rebuilds (POST) all the pending stats, ex: to read the stats of the previous writes.
+    """
+
+    def get(self, request):
+        pending = stats.get_pending_stats()
+        return Response({'deferred': stats.is_deferred(), 'pending_teams': pending['team'],
+                         'pending_players': pending['player']})
+
+    def post(self, request):
+        teams, players = stats.flush_stats()
+        return Response({'teams': teams, 'players': players})
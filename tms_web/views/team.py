@@ -4,49 +4,126 @@ This module consists of REST API views of the Team model and the implementation
 
 """
 
-import numpy as np
-from django.db.models import Q
+from django.db import connection, transaction
+from django.db.models import Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from tms_web import caching, stats
 from tms_web.models import Player, Team
-from tms_web.serializers import PlayerSerializer, TeamSerializer
+from tms_web.serializers import PlayerSerializer, TeamSerializer, TopPlayersQuerySerializer
 
 import tms_web.constants as constants
 
 permissions = permissions.IsAuthenticated
 
+"""
+Selects the ids of the top players of a team in a single pass using window functions. A player is a top
+player when the number of teammates with a higher average score is within (100 - percentile)% of the
+other players, which selects the same players as the linearly interpolated percentile of the scores.
+"""
+_TOP_PLAYERS_WINDOW_SQL = (
+    'SELECT ranked.id FROM ('
+    'SELECT id, RANK() OVER (ORDER BY average_score DESC) AS score_rank, COUNT(*) OVER () AS team_size '
+    'FROM {table} WHERE team_id = %s) ranked '
+    'WHERE (ranked.score_rank - 1) * 100 <= (100 - %s) * (ranked.team_size - 1)'
+).format(table=Player._meta.db_table)
+
 
 class TeamView(viewsets.ModelViewSet):
     """
     List, create, update (full and partial) and delete **Team** resources.
     """
-    _TOP_PLAYER_PERCENTILE = 90
-
-    queryset = Team.objects.all().order_by('name')
+    queryset = Team.objects.all().order_by('name', 'id')
     serializer_class = TeamSerializer
+    cursor_ordering = ('name', 'id')
+
+    @caching.versioned_response(caching.TEAMS, cache_response=True)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @caching.versioned_response(caching.team('{pk}'))
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @caching.conditional_update(caching.team('{pk}'))
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        caching.invalidate(caching.TEAMS)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        caching.invalidate(caching.TEAMS, caching.TEAM_NAMES, caching.team(serializer.instance.id))
+
+    def perform_destroy(self, instance):
+        # Players, coaches and matches of the team are deleted as well
+        namespaces = (caching.TEAMS, caching.TEAM_NAMES, caching.PLAYERS, caching.PLAYER_NAMES, caching.COACHES,
+                      caching.MATCHES, caching.team(instance.id))
+        with transaction.atomic():
+            # The opponents of the team and their players, whose stats include the scores of the deleted matches
+            team_ids, player_ids = stats.get_team_stats_ids([instance.id])
+            super().perform_destroy(instance)
+            stats.rebuild_stats(team_ids, player_ids)
+            caching.invalidate(*namespaces)
 
     """
-    Lists top-players of a given **Team**.
+    Lists top-players of a given **Team**, the players whose average score is at or above the given
+    percentile (90 by default) of the average scores of the team.
     """
     @action(methods=['get'], detail=True, url_path='top-players', url_name=constants.TOP_PLAYERS_URL_SUFFIX)
+    @caching.versioned_response(caching.team_players('{pk}'), caching.TEAM_NAMES, cache_response=True)
     def get_top_players(self, request, pk=None):
-        self.get_object()
-        score_set = Player.objects.values_list('average_score', flat=True).filter(team=pk)
-        scores = np.array(score_set)
-        percentile_score = np.percentile(scores.astype(np.float), TeamView._TOP_PLAYER_PERCENTILE)
-        queryset = Player.objects.all().filter(Q(average_score__gte=percentile_score) & Q(team=pk)).order_by(
-            '-average_score')
-        serializer = PlayerSerializer(queryset, many=True)
+        team = self.get_object()
+        params = TopPlayersQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        percentile = params.validated_data['percentile']
+        cutoffs_key = stats.get_top_player_cutoffs_key(team.id)
+        cutoffs = stats.get_top_player_cutoffs(cutoffs_key)
+        if percentile in cutoffs:
+            if cutoffs[percentile] is None:
+                return Response([])
+            top_players = list(Player.objects.select_related('team')
+                               .filter(team=team.id, average_score__gte=cutoffs[percentile])
+                               .order_by('-average_score'))
+        else:
+            top_players = list(self.get_top_players_queryset(team.id, percentile))
+            stats.set_top_player_cutoff(cutoffs_key, percentile,
+                                        top_players[-1].average_score if top_players else None)
+        serializer = PlayerSerializer(top_players, many=True)
         return Response(serializer.data)
 
+    """
+    This method builds the query of the top players of a given team, which selects the players above the
+    percentile cut-off in a single query. When the database doesn't support window functions, the number
+    of teammates with a higher average score is counted with correlated sub queries instead.
+    """
+
+    def get_top_players_queryset(self, team, percentile):
+        players = Player.objects.select_related('team').filter(team=team).order_by('-average_score')
+        if connection.features.supports_over_clause:
+            return players.filter(id__in=RawSQL(_TOP_PLAYERS_WINDOW_SQL, (team, percentile)))
+        teammates = Player.objects.filter(team=OuterRef('team')).order_by().values('team')
+        higher = teammates.filter(average_score__gt=OuterRef('average_score')).annotate(count=Count('id'))
+        team_size = teammates.annotate(count=Count('id'))
+        return players.annotate(higher=Coalesce(Subquery(higher.values('count')), 0),
+                                team_size=Subquery(team_size.values('count'))) \
+            .annotate(excess=ExpressionWrapper(F('higher') * 100 - (100 - percentile) * (F('team_size') - 1),
+                                               output_field=FloatField())) \
+            .filter(excess__lte=0)
+
     """
     Lists players of a given **Team**.
     """
     @action(methods=['get'], detail=True, url_path='players', url_name=constants.TEAM_PLAYERS_URL_SUFFIX)
+    @caching.versioned_response(caching.team_players('{pk}'), caching.TEAM_NAMES, cache_response=True)
     def get_team_players(self, request, pk=None):
         self.get_object()
-        queryset = Player.objects.all().filter(team=pk).order_by('team')
+        queryset = Player.objects.select_related('team').filter(team=pk).order_by('team')
         serializer = PlayerSerializer(queryset, many=True)
         return Response(serializer.data)
@@ -0,0 +1,42 @@
+"""
+
+This module consists of REST API views issuing and revoking the API tokens of the authenticated user (see
+tms_web.authentication).
+
+"""
+
+from rest_framework import generics, status
+from rest_framework import permissions
+from rest_framework.response import Response
+
+from tms_web.models import ApiToken
+from tms_web.serializers import ApiTokenSerializer
+
+permissions = permissions.IsAuthenticated
+
+
+class TokenList(generics.ListCreateAPIView):
+    """
+    Lists and issues the **ApiToken** resources of the authenticated user. The token of an issued ApiToken is
+    only given by the issue response, ex: to authenticate the next requests with 'Authorization: Token <token>'.
+    """
+    serializer_class = ApiTokenSerializer
+
+    def get_queryset(self):
+        return ApiToken.objects.filter(user=self.request.user).order_by('id')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, key = ApiToken.issue(request.user, serializer.validated_data.get('name', ''))
+        return Response(dict(ApiTokenSerializer(token).data, token=key), status=status.HTTP_201_CREATED)
+
+
+class TokenDetail(generics.RetrieveDestroyAPIView):
+    """
+    Retrieves and revokes (deletes) a given **ApiToken** resource of the authenticated user.
+    """
+    serializer_class = ApiTokenSerializer
+
+    def get_queryset(self):
+        return ApiToken.objects.filter(user=self.request.user)
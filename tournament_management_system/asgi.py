@@ -5,11 +5,13 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
+
+The read only APIs are served on a bounded thread pool (see tms_web.handlers).
 """
 
 import os
 
-from django.core.asgi import get_asgi_application
+from tms_web.handlers import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tournament_management_system.settings')
 
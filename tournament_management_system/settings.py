@@ -84,6 +84,45 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.0/topics/cache/
+
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tms_web',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('TMS_WEB_CACHE_LOCATION', os.path.join(BASE_DIR, 'django_cache')),
+    },
+}
+
+# The local memory cache is private to each process, the versions of the leaderboard and of the cached data are
+# only seen by the processes sharing the cache, thus several processes (servers, workers and the commands writing
+# the data) require a shared cache (TMS_WEB_CACHE_BACKEND=file)
+CACHES = {
+    'default': CACHE_BACKENDS[os.getenv('TMS_WEB_CACHE_BACKEND', 'locmem')],
+}
+
+# Conditional requests (ETag, If-None-Match and If-Match) of the APIs, whose versions are kept in the cache, thus the
+# cache must be shared by all of the processes writing to the database (TMS_WEB_CACHE_BACKEND=file)
+TMS_WEB_CONDITIONAL_REQUESTS = os.getenv('TMS_WEB_CONDITIONAL_REQUESTS', 'false').lower() == 'true'
+
+# Server side cache of the responses of the read heavy APIs (teams, team players, top-players and players)
+TMS_WEB_RESPONSE_CACHE = os.getenv('TMS_WEB_RESPONSE_CACHE', 'false').lower() == 'true'
+TMS_WEB_RESPONSE_CACHE_TIMEOUT = int(os.getenv('TMS_WEB_RESPONSE_CACHE_TIMEOUT', 300))
+
+# Deferred stats mode: the match and score writes mark the stats of the teams and players as stale, and the stats
+# are recomputed by the stats worker (run_stats_worker command) or the stats flush API, instead of in the request.
+# The worker invalidates the cached data of the servers through the cache, which must be shared (see CACHES)
+TMS_WEB_DEFERRED_STATS = os.getenv('TMS_WEB_DEFERRED_STATS', 'false').lower() == 'true'
+
+# Seconds the verified basic authentication credentials are kept in memory, 0 to verify the password of every
+# request (see tms_web.authentication)
+TMS_WEB_BASIC_AUTH_CACHE_TIMEOUT = int(os.getenv('TMS_WEB_BASIC_AUTH_CACHE_TIMEOUT', 0))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
 
@@ -103,14 +142,25 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'tms_web.pagination.PageNumberOrCursorPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'tms_web.authentication.TokenAuthentication',
+        'tms_web.authentication.CachedBasicAuthentication',
+    ],
     'TEST_REQUEST_DEFAULT_FORMAT': 'json'
 }
 
+# Number of threads serving the read only APIs of the ASGI application (see tms_web.handlers)
+TMS_WEB_ASGI_READ_THREADS = int(os.getenv('TMS_WEB_ASGI_READ_THREADS', 8))
+
+# Default pagination style (page or cursor) of the large collections (players, matches and teams)
+TMS_WEB_PAGINATION_MODE = os.getenv('TMS_WEB_PAGINATION_MODE', 'page')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
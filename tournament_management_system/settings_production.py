@@ -0,0 +1,59 @@
+"""
+Production settings for tournament_management_system project.
+
+Extends the development settings with a tuned SQLite database profile: WAL journal mode, so that readers
+are not blocked by the match writes, persistent connections, and a read database which serves the safe
+requests of the tms_web APIs.
+Enable it with DJANGO_SETTINGS_MODULE=tournament_management_system.settings_production.
+"""
+
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES, MIDDLEWARE
+
+DEBUG = os.getenv('DJANGO_DEBUG', 'false').lower() == 'true'
+
+ALLOWED_HOSTS = [host for host in os.getenv('DJANGO_ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',') if host]
+
+
+# Database
+# https://docs.djangoproject.com/en/3.0/ref/databases/#sqlite-notes
+
+DATABASE_NAME = os.getenv('TMS_WEB_DATABASE_NAME', os.path.join(BASE_DIR, 'db.sqlite3'))
+
+# Seconds a database connection is kept open between requests
+CONN_MAX_AGE = int(os.getenv('TMS_WEB_CONN_MAX_AGE', 60))
+
+DATABASES = {
+    'default': dict(DATABASES['default'], NAME=DATABASE_NAME, CONN_MAX_AGE=CONN_MAX_AGE),
+    # A read only connection to the primary database file by default, or to a replica of it
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('TMS_WEB_REPLICA_DATABASE_NAME', 'file:{}?mode=ro'.format(DATABASE_NAME)),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['tms_web.routers.ReadReplicaRouter']
+
+TMS_WEB_READ_DATABASE = 'replica'
+
+MIDDLEWARE = MIDDLEWARE + ['tms_web.routers.ReadReplicaMiddleware']
+
+# PRAGMA statements applied to each new SQLite connection (see tms_web.signals)
+TMS_WEB_SQLITE_PRAGMAS = {
+    'default': [
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('busy_timeout', int(os.getenv('TMS_WEB_BUSY_TIMEOUT', 5000))),
+        ('mmap_size', int(os.getenv('TMS_WEB_MMAP_SIZE', 256 * 1024 * 1024))),
+    ],
+    'replica': [
+        ('busy_timeout', int(os.getenv('TMS_WEB_BUSY_TIMEOUT', 5000))),
+        ('mmap_size', int(os.getenv('TMS_WEB_MMAP_SIZE', 256 * 1024 * 1024))),
+    ],
+}